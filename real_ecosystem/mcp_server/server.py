@@ -1,5 +1,16 @@
 import os
+import sys
+import copy
+import re
 import json
+import math
+import time
+import heapq
+import hashlib
+import unicodedata
+import threading
+import argparse
+import contextlib
 import uvicorn
 from mcp.server.fastmcp import FastMCP
 
@@ -36,169 +47,371 @@ def normalize_card_fields(card: dict) -> dict:
     
     return normalized
 
+CARDS_DIR = os.path.join(os.path.dirname(__file__), "../cards")
+
+# 参与检索的卡片字段及权重（BM25F：词频按字段权重累加）
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "description": 1.0,
+    "skill_name": 2.0,
+    "skill_description": 1.0,
+    "tags": 2.0,
+    "examples": 1.0,
+}
+
+# 查询扩展：查询中出现左侧关键词时，以较低权重追加右侧的相关词
+KEYWORD_MAPPING = {
+    "研究": ["researcher", "research", "调查", "信息"],
+    "写": ["writer", "write", "创作", "文章", "内容"],
+    "代码": ["coder", "code", "编程", "程序"],
+    "分析": ["analyst", "analyze", "数据", "统计"],
+    "审核": ["reviewer", "review", "检查", "质量"],
+    "翻译": ["translator", "translate", "语言"],
+}
+EXPANSION_WEIGHT = 0.5
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 英文/数字按单词切分，中文按二元组（单字片段保留单字）切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u3400-\u9fff]+")
+
+def tokenize(text: str) -> list:
+    """将文本切分为检索词项：英文单词 + 中文字符二元组"""
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if run.isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def card_fields(card: dict) -> dict:
+    """提取卡片中参与检索的各字段文本"""
+    skills = card.get("skills", []) or []
+    return {
+        "name": card.get("name", ""),
+        "description": card.get("description", ""),
+        "skill_name": " ".join(skill.get("name", "") for skill in skills),
+        "skill_description": " ".join(skill.get("description", "") for skill in skills),
+        "tags": " ".join(tag for skill in skills for tag in skill.get("tags", []) or []),
+        "examples": " ".join(ex for skill in skills for ex in skill.get("examples", []) or []),
+    }
+
+
+class CardEntry:
+    """一张已加载的卡片：规范化后的卡片、按字段加权的词频和文件签名"""
+
+    def __init__(self, filename: str, signature: tuple, card: dict):
+        self.filename = filename
+        self.signature = signature  # (st_mtime_ns, st_size)
+        self.card = normalize_card_fields(copy.deepcopy(card))
+        self.term_freqs = {}
+        for field, text in card_fields(self.card).items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                self.term_freqs[token] = self.term_freqs.get(token, 0.0) + weight
+        self.length = sum(self.term_freqs.values())
+        self.parsed = {}  # factory -> 由该卡片解析出的对象（如 AgentCard），首次使用时创建，解析失败记为 None
+
+
+class CardRegistry:
+    """
+    内存中的卡片注册表
+
+    - 卡片只在首次加载或文件变化时读取和解析，规范化卡片和词频预先计算
+    - 按 poll_interval 轮询目录 mtime/size，只重新加载新增或修改的文件，删除的文件移出索引
+    - list_all_agents 的 JSON 响应在注册表变化时序列化一次，之后直接返回
+    - 倒排索引 + BM25 排序：一次查询只遍历查询词项的倒排列表，与注册表规模无关
+    """
+
+    def __init__(self, cards_dir: str = CARDS_DIR, poll_interval: float = 2.0):
+        self.cards_dir = cards_dir
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._entries = {}  # filename -> CardEntry
+        self._last_poll = 0.0
+        self._ordered = []  # 按文件名排序的 CardEntry
+        self._cards = []
+        self._cards_json = "[]"
+        self._version = {"version": "", "count": 0}
+        # 倒排索引：term -> [(CardEntry, 加权词频)]，以及每个词项的 IDF
+        self._postings = {}
+        self._idf = {}
+        self._avg_length = 1.0
+        self.reloads = 0
+
+    def _scan(self) -> dict:
+        """列出卡片文件及其签名"""
+        signatures = {}
+        if not os.path.exists(self.cards_dir):
+            return signatures
+        for filename in os.listdir(self.cards_dir):
+            if filename.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(self.cards_dir, filename))
+                except OSError:
+                    continue
+                signatures[filename] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        检查卡片目录并增量重新加载
+
+        Returns:
+            注册表内容是否发生变化
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_poll and now - self._last_poll < self.poll_interval:
+                return False
+            self._last_poll = now
+
+            if not os.path.exists(self.cards_dir):
+                print(f"❌ [Real MCP Server] Cards directory not found: {self.cards_dir}")
+            signatures = self._scan()
+            changed = False
+            for filename in list(self._entries):
+                if filename not in signatures:
+                    del self._entries[filename]
+                    changed = True
+            for filename, signature in signatures.items():
+                entry = self._entries.get(filename)
+                if entry is not None and entry.signature == signature:
+                    continue
+                try:
+                    with open(os.path.join(self.cards_dir, filename), "r", encoding="utf-8") as f:
+                        card = json.load(f)
+                    self._entries[filename] = CardEntry(filename, signature, card)
+                except Exception as e:
+                    print(f"⚠️ Error reading card {filename}: {e}")
+                    # 保留旧版本（若有），下次文件变化时重试
+                    if entry is None:
+                        continue
+                changed = True
+
+            if changed or force:
+                self._rebuild(signatures)
+            return changed
+
+    def _rebuild(self, signatures: dict):
+        ordered = [self._entries[name] for name in sorted(self._entries)]
+        self._ordered = ordered
+        self._cards = [entry.card for entry in ordered]
+        self._cards_json = json.dumps(self._cards, ensure_ascii=False)
+        version_source = "\n".join(
+            f"{name}:{mtime}:{size}" for name, (mtime, size) in sorted(signatures.items())
+        )
+        self._version = {
+            "version": hashlib.sha256(version_source.encode("utf-8")).hexdigest()[:16],
+            "count": len(signatures)
+        }
+
+        # 重建倒排索引（词频已在 CardEntry 中预先计算）
+        postings = {}
+        for entry in ordered:
+            for term, tf in entry.term_freqs.items():
+                postings.setdefault(term, []).append((entry, tf))
+        total = len(ordered)
+        self._postings = postings
+        self._idf = {
+            term: math.log(1 + (total - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+        self._avg_length = (sum(entry.length for entry in ordered) / total) if total else 1.0
+
+        self.reloads += 1
+        print(f"✅ [Real MCP Server] Registry loaded: {len(self._cards)} agents (version {self._version['version']})")
+
+    def cards(self) -> list:
+        """所有卡片（字段已规范化为 snake_case）"""
+        self.refresh()
+        return self._cards
+
+    def cards_json(self) -> str:
+        """预先序列化的 list_all_agents 响应"""
+        self.refresh()
+        return self._cards_json
+
+    def version(self) -> dict:
+        self.refresh()
+        return dict(self._version)
+
+    @staticmethod
+    def parsed(entry: CardEntry, factory):
+        """卡片由 factory 解析出的对象：每个卡片文件版本只解析一次，文件变化后随新的 CardEntry 重新解析"""
+        if factory not in entry.parsed:
+            try:
+                entry.parsed[factory] = factory(**copy.deepcopy(entry.card))
+            except Exception as e:
+                print(f"⚠️ Invalid card {entry.filename}: {e}")
+                entry.parsed[factory] = None
+        return entry.parsed[factory]
+
+    def parsed_cards(self, factory) -> dict:
+        """所有卡片解析后的对象 {name: obj}（解析失败的卡片不包含在内）"""
+        self.refresh()
+        parsed = {}
+        for entry in self._ordered:
+            obj = self.parsed(entry, factory)
+            if obj is not None:
+                parsed[entry.card.get("name")] = obj
+        return parsed
+
+    @staticmethod
+    def _query_terms(query: str) -> dict:
+        """查询词项及权重（含关键词扩展）"""
+        terms = {}
+        for token in tokenize(query):
+            terms[token] = max(terms.get(token, 0.0), 1.0)
+        for cn_key, related_words in KEYWORD_MAPPING.items():
+            if cn_key in query:
+                for word in related_words:
+                    for token in tokenize(word):
+                        terms[token] = max(terms.get(token, 0.0), EXPANSION_WEIGHT)
+        return terms
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.0) -> list:
+        """
+        BM25 排序检索
+
+        Args:
+            query: 自然语言查询
+            top_k: 返回的最大候选数
+            min_score: 低于该得分的候选不返回
+
+        Returns:
+            [(score, card)]，按得分从高到低排列
+        """
+        return [(score, entry.card) for score, entry in self.search_entries(query, top_k, min_score)]
+
+    def search_entries(self, query: str, top_k: int = 5, min_score: float = 0.0) -> list:
+        """同 search，返回 [(score, CardEntry)]"""
+        self.refresh()
+        postings, idf, avg_length = self._postings, self._idf, self._avg_length
+        scores = {}
+        for term, query_weight in self._query_terms(query).items():
+            for entry, tf in postings.get(term, ()):
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * entry.length / avg_length)
+                score = query_weight * idf[term] * tf * (BM25_K1 + 1) / norm
+                scores[entry] = scores.get(entry, 0.0) + score
+        ranked = heapq.nlargest(max(1, top_k), scores.items(), key=lambda item: item[1])
+        return [(score, entry) for entry, score in ranked if score >= min_score]
+
+
+registry = CardRegistry(poll_interval=float(os.getenv("REGISTRY_POLL_INTERVAL", "2")))
+
+# find_agent 的默认最低得分：低于该值视为没有合适的Agent（返回 null），不再静默返回默认Agent
+DEFAULT_MIN_SCORE = float(os.getenv("REGISTRY_MIN_SCORE", "1.0"))
+
+def load_agent_cards() -> list:
+    """读取所有卡片（字段已规范化为 snake_case），返回副本，调用方修改不影响注册表"""
+    print(f"📋 [Real MCP Server] Listing all agents")
+    return copy.deepcopy(registry.cards())
+
+def load_agent_card_objects(factory) -> dict:
+    """
+    进程内调用方使用：所有卡片由 factory（如 AgentCard）解析后的对象 {name: obj}
+
+    对象在注册表中按卡片文件缓存、跨调用共享，不经过序列化也不重复校验，调用方只读使用
+    """
+    return registry.parsed_cards(factory)
+
+def search_agent_card_objects(
+    queries: list, factory, top_k: int = 1, min_score: float = DEFAULT_MIN_SCORE
+) -> list:
+    """进程内调用方使用：为多个查询检索，结果与 queries 一一对应 [[(score, obj)]]，对象同 load_agent_card_objects"""
+    print(f"🔎 [Real MCP Server] In-process search: {len(queries)} queries (top_k={top_k})")
+    results = []
+    for query in queries:
+        matches = []
+        for score, entry in registry.search_entries(query, top_k=top_k, min_score=min_score):
+            obj = registry.parsed(entry, factory)
+            if obj is not None:
+                matches.append((round(score, 4), obj))
+        results.append(matches)
+    return results
+
+def get_registry_version() -> dict:
+    """注册表版本：由卡片文件名、修改时间和大小计算，任一卡片变化时改变"""
+    return registry.version()
+
+def _ranked_matches(query: str, top_k: int, min_score: float) -> list:
+    return [
+        {"score": round(score, 4), "agent": copy.deepcopy(card)}
+        for score, card in registry.search(query, top_k=top_k, min_score=min_score)
+    ]
+
+def search_agent_cards(query: str, top_k: int = 5, min_score: float = DEFAULT_MIN_SCORE) -> list:
+    """按 BM25 得分返回前 top_k 个候选：[{"score": ..., "agent": card}]"""
+    print(f"🔎 [Real MCP Server] Received search_agents query: {query} (top_k={top_k})")
+    return _ranked_matches(query, top_k, min_score)
+
+def search_agent_cards_batch(queries: list, top_k: int = 1, min_score: float = DEFAULT_MIN_SCORE) -> list:
+    """为多个查询分别检索，结果与 queries 一一对应：[{"query": ..., "matches": [...]}]"""
+    print(f"🔎 [Real MCP Server] Received find_agents batch: {len(queries)} queries (top_k={top_k})")
+    return [{"query": query, "matches": _ranked_matches(query, top_k, min_score)} for query in queries]
+
+def search_agent_card(query: str, min_score: float = DEFAULT_MIN_SCORE):
+    """返回得分最高的卡片；没有候选达到 min_score 时返回 None"""
+    print(f"🔎 [Real MCP Server] Received find_agent query: {query}")
+    results = registry.search(query, top_k=1, min_score=min_score)
+    if not results:
+        print(f"❌ [Real MCP Server] No agent scored above {min_score} for: {query}")
+        return None
+    score, card = results[0]
+    print(f"✅ [Real MCP Server] Matched: {card['name']} (score: {score:.2f})")
+    return copy.deepcopy(card)
+
+# ==========================================
+# MCP tools
+# ==========================================
+
 @mcp.tool()
 def list_all_agents() -> str:
     """Lists all available agents with their capabilities."""
     print(f"📋 [Real MCP Server] Listing all agents")
-    
-    cards_dir = os.path.join(os.path.dirname(__file__), "../cards")
-    all_agents = []
-    
-    if not os.path.exists(cards_dir):
-        print(f"❌ [Real MCP Server] Cards directory not found: {cards_dir}")
-        return json.dumps([], ensure_ascii=False)
-    
-    for filename in os.listdir(cards_dir):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(cards_dir, filename), "r", encoding="utf-8") as f:
-                    card = json.load(f)
-                    normalized_card = normalize_card_fields(card)
-                    all_agents.append(normalized_card)
-            except Exception as e:
-                print(f"⚠️ Error reading card {filename}: {e}")
-    
-    print(f"✅ [Real MCP Server] Found {len(all_agents)} agents")
-    return json.dumps(all_agents, ensure_ascii=False)
+    return registry.cards_json()
 
 @mcp.tool()
-def find_agent(query: str) -> str:
-    """Finds an agent based on a natural language query."""
-    print(f"🔎 [Real MCP Server] Received find_agent query: {query}")
-    query_lower = query.lower()
-    
-    # Load all cards from real_ecosystem/cards
-    cards_dir = os.path.join(os.path.dirname(__file__), "../cards")
-    matched_card = None
-    
-    # Simple keyword matching logic
-    best_score = 0
-    
-    if not os.path.exists(cards_dir):
-        print(f"❌ [Real MCP Server] Cards directory not found: {cards_dir}")
-        # 返回默认的Researcher Agent（完整结构，使用snake_case）
-        default_card = {
-            "name": "Researcher Agent",
-            "description": "由Gemini驱动的智能研究助手",
-            "version": "2.0.0",
-            "url": "http://localhost:10001",
-            "capabilities": {
-                "streaming": True,
-                "pushNotifications": True,
-                "stateTransitionHistory": False
-            },
-            "default_input_modes": ["text", "text/plain"],
-            "default_output_modes": ["text", "text/plain"],
-            "skills": [
-                {
-                    "id": "research",
-                    "name": "研究调查",
-                    "description": "对给定主题进行全面研究",
-                    "tags": ["research", "analysis", "研究", "调查"],
-                    "examples": ["研究任何主题"]
-                }
-            ]
-        }
-        return json.dumps(default_card, ensure_ascii=False)
+def registry_version() -> str:
+    """Returns a version hash of the agent registry; changes whenever any card file changes."""
+    return json.dumps(get_registry_version())
 
-    for filename in os.listdir(cards_dir):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(cards_dir, filename), "r", encoding="utf-8") as f:
-                    card = json.load(f)
-                    score = 0
-                    
-                    # Construct searchable text from name, description, capabilities, and skills
-                    searchable_parts = [
-                        card.get("name", ""),
-                        card.get("description", ""),
-                        " ".join(card.get("capabilities", {}).keys())
-                    ]
-                    
-                    # Add skills info
-                    for skill in card.get("skills", []):
-                        searchable_parts.append(skill.get("name", ""))
-                        searchable_parts.append(skill.get("description", ""))
-                        searchable_parts.extend(skill.get("tags", []))
-                    
-                    # 支持中文搜索：不转小写，直接匹配
-                    text = " ".join(searchable_parts)
-                    text_lower = text.lower()
-                    
-                    # 中文关键词匹配（不分词，直接子串匹配）
-                    # 检查整个查询是否在文本中
-                    if query in text or query_lower in text_lower:
-                        score += 10  # 完整匹配得高分
-                    
-                    # 分词匹配（支持中英文）
-                    keywords = query.split()
-                    for kw in keywords:
-                        kw_lower = kw.lower()
-                        # 中文或英文关键词匹配
-                        if kw in text or kw_lower in text_lower:
-                            score += 2
-                    
-                    # 特殊关键词加权
-                    keyword_mapping = {
-                        "研究": ["researcher", "research", "调查", "信息"],
-                        "写": ["writer", "write", "创作", "文章", "内容"],
-                        "代码": ["coder", "code", "编程", "程序"],
-                        "分析": ["analyst", "analyze", "数据", "统计"],
-                        "审核": ["reviewer", "review", "检查", "质量"],
-                        "翻译": ["translator", "translate", "语言"],
-                    }
-                    
-                    for cn_key, related_words in keyword_mapping.items():
-                        if cn_key in query:
-                            for word in related_words:
-                                if word in text_lower:
-                                    score += 3
-                    
-                    if score > best_score:
-                        best_score = score
-                        matched_card = card
-            except Exception as e:
-                print(f"⚠️ Error reading card {filename}: {e}")
+@mcp.tool()
+def find_agent(query: str, min_score: float = DEFAULT_MIN_SCORE) -> str:
+    """Finds the best agent for a natural language query; returns null if no agent scores at least min_score."""
+    return json.dumps(search_agent_card(query, min_score=min_score), ensure_ascii=False)
 
-    if matched_card:
-        print(f"✅ [Real MCP Server] Matched: {matched_card['name']} (score: {best_score})")
-        # 转换字段名从camelCase到snake_case
-        normalized_card = normalize_card_fields(matched_card)
-        return json.dumps(normalized_card, ensure_ascii=False)
-    
-    # 如果没有匹配，返回默认的Researcher Agent（最通用）
-    print(f"❌ [Real MCP Server] No match found, returning default Researcher Agent")
-    default_card = {
-        "name": "Researcher Agent",
-        "description": "由Gemini驱动的智能研究助手",
-        "version": "2.0.0",
-        "url": "http://localhost:10001",
-        "capabilities": {
-            "streaming": True,
-            "pushNotifications": True,
-            "stateTransitionHistory": False
-        },
-        "default_input_modes": ["text", "text/plain"],
-        "default_output_modes": ["text", "text/plain"],
-        "skills": [
-            {
-                "id": "research",
-                "name": "研究调查",
-                "description": "对给定主题进行全面研究",
-                "tags": ["research", "analysis", "研究", "调查", "分析"],
-                "examples": ["研究任何主题", "分析信息", "收集数据"]
-            }
-        ]
-    }
-    return json.dumps(default_card, ensure_ascii=False)
+@mcp.tool()
+def search_agents(query: str, top_k: int = 5, min_score: float = DEFAULT_MIN_SCORE) -> str:
+    """Returns the top_k agents ranked by relevance to the query, as [{"score": float, "agent": card}]."""
+    return json.dumps(search_agent_cards(query, top_k=top_k, min_score=min_score), ensure_ascii=False)
+
+@mcp.tool()
+def find_agents(queries: list[str], top_k: int = 1, min_score: float = DEFAULT_MIN_SCORE) -> str:
+    """Ranks agents for several queries in one call; returns [{"query": str, "matches": [{"score": float, "agent": card}]}] in input order."""
+    return json.dumps(search_agent_cards_batch(queries, top_k=top_k, min_score=min_score), ensure_ascii=False)
 
-def run_mcp():
-    print("🚀 Starting Real MCP Server on port 10000 (SSE)...")
+def run_mcp(transport: str = "sse"):
+    """以 SSE（/sse）或 Streamable HTTP（/mcp）传输运行"""
+    label = "Streamable HTTP" if transport == "http" else "SSE"
+    print(f"🚀 Starting Real MCP Server on port 10000 ({label})...")
     from starlette.responses import JSONResponse
     from starlette.routing import Route
-    
-    # 获取MCP的SSE应用（已经是完整的Starlette应用）
-    app = mcp.sse_app()
+
+    if transport == "http":
+        # 无状态模式：每个请求独立处理、直接返回 JSON，可部署在普通 HTTP 负载均衡之后
+        mcp.settings.stateless_http = True
+        mcp.settings.json_response = True
+        app = mcp.streamable_http_app()
+    else:
+        # 获取MCP的SSE应用（已经是完整的Starlette应用）
+        app = mcp.sse_app()
     
     # 添加健康检查路由到现有应用
     async def health_check(request):
@@ -206,8 +419,8 @@ def run_mcp():
             "status": "healthy",
             "service": "Real MCP Server",
             "port": 10000,
-            "transport": "sse",
-            "tools": ["list_all_agents", "find_agent"]
+            "transport": transport,
+            "tools": ["list_all_agents", "find_agent", "find_agents", "search_agents", "registry_version"]
         })
     
     # 将健康检查路由添加到应用的路由列表开头
@@ -219,5 +432,31 @@ def run_mcp():
     
     uvicorn.run(app, host="0.0.0.0", port=10000)
 
+def run_stdio():
+    """以 stdio 传输运行（由编排器作为常驻子进程启动，无需开放端口）"""
+    import anyio
+    from io import TextIOWrapper
+    from mcp.server.stdio import stdio_server
+
+    async def _serve():
+        # stdout 是协议通道：先保留原始 stdout，再把工具中的 print 日志重定向到 stderr
+        protocol_out = anyio.wrap_file(TextIOWrapper(sys.stdout.buffer, encoding="utf-8"))
+        with contextlib.redirect_stdout(sys.stderr):
+            print("🚀 Starting Real MCP Server (stdio)...")
+            async with stdio_server(stdout=protocol_out) as (read_stream, write_stream):
+                await mcp._mcp_server.run(
+                    read_stream,
+                    write_stream,
+                    mcp._mcp_server.create_initialization_options(),
+                )
+
+    anyio.run(_serve)
+
 if __name__ == "__main__":
-    run_mcp()
+    parser = argparse.ArgumentParser(description="Real MCP Server")
+    parser.add_argument("--transport", choices=["sse", "http", "stdio"], default="sse")
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        run_stdio()
+    else:
+        run_mcp(args.transport)
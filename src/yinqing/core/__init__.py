@@ -11,6 +11,15 @@ YinQing Agent Core Module
 - reviewer: 审核层
 - snapshot: 快照管理器
 - mcp_client: MCP客户端
+- pool: 滑动窗口执行池
+- context: 单次执行（trace）的运行时状态
+- admission: 按Agent端点的准入控制
+- http_pool: 按Agent端点复用连接的HTTP连接池
+- resilience: 错误分类、指数退避重试、重试预算和按端点熔断
+- balancer: 同一Agent多个副本端点间的负载均衡
+- health: Agent端点的后台健康监测
+- singleflight: 并发相同Agent请求的合并
+- state_store: 工作流状态持久化（断点恢复）
 """
 
 from yinqing.core.types import (
@@ -22,6 +31,32 @@ from yinqing.core.types import (
 )
 
 from yinqing.core.workflow import WorkflowEngine
+from yinqing.core.pool import BoundedTaskPool
+from yinqing.core.context import ExecutionContext
+from yinqing.core.admission import (
+    AgentAdmissionController,
+    AdmissionTimeoutError,
+    get_admission_controller
+)
+from yinqing.core.http_pool import AgentHTTPPool
+from yinqing.core.resilience import (
+    ResilienceController,
+    CircuitOpenError,
+    get_resilience_controller
+)
+from yinqing.core.balancer import ReplicaBalancer, get_balancer
+from yinqing.core.health import (
+    AgentHealthMonitor,
+    AgentUnavailableError,
+    get_health_monitor
+)
+from yinqing.core.singleflight import SingleFlight, get_single_flight
+from yinqing.core.state_store import (
+    WorkflowState,
+    StateBackend,
+    SQLiteStateBackend,
+    create_state_backend
+)
 
 # 新增：增强版组件
 from yinqing.core.reviewer import (
@@ -52,6 +87,32 @@ __all__ = [
 
     # 基础引擎
     "WorkflowEngine",
+    "BoundedTaskPool",
+    "ExecutionContext",
+
+    # 准入控制
+    "AgentAdmissionController",
+    "AdmissionTimeoutError",
+    "get_admission_controller",
+    "AgentHTTPPool",
+
+    # 重试与熔断
+    "ResilienceController",
+    "CircuitOpenError",
+    "get_resilience_controller",
+    "ReplicaBalancer",
+    "get_balancer",
+    "AgentHealthMonitor",
+    "AgentUnavailableError",
+    "get_health_monitor",
+    "SingleFlight",
+    "get_single_flight",
+
+    # 状态存储
+    "WorkflowState",
+    "StateBackend",
+    "SQLiteStateBackend",
+    "create_state_backend",
 
     # 审核组件
     "ReviewerLayer",
@@ -0,0 +1,161 @@
+"""
+Agent准入控制 (Agent Admission Control)
+进程级别、按Agent端点限制同时在途的请求数，超出的请求进入等待队列，
+为下游Agent提供背压，而不是把所有并发工作流的请求同时压到同一个Agent上
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from yinqing.utils.config import AdmissionConfig, get_admission_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AdmissionTimeoutError(asyncio.TimeoutError):
+    """在等待队列中超时仍未获得执行槽位"""
+
+
+class _AgentQueue:
+    """单个Agent端点的在途计数和等待队列"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        # 堆元素: (排序键, 序号, future)
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+
+        # 统计
+        self.admitted = 0
+        self.timeouts = 0
+        self.queued_total = 0
+        self.max_queue_depth = 0
+        self.total_wait_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len([w for w in self.waiters if not w[2].done()])
+
+
+class AgentAdmissionController:
+    """
+    按Agent端点的准入控制器
+
+    - 每个端点最多 max_in_flight 个在途请求（可按端点覆盖）
+    - 超出时按 FIFO 或优先级排队，槽位释放后直接移交给队首请求
+    - 排队超过 queue_timeout 抛出 AdmissionTimeoutError
+    """
+
+    def __init__(self, config: AdmissionConfig = None):
+        self.config = config or get_admission_config()
+        self._queues: Dict[str, _AgentQueue] = {}
+        self._sequence = itertools.count()
+
+    def _get_queue(self, endpoint: str) -> _AgentQueue:
+        key = endpoint.rstrip("/")
+        if key not in self._queues:
+            limit = self.config.overrides.get(key, self.config.max_in_flight)
+            self._queues[key] = _AgentQueue(max(1, limit))
+        return self._queues[key]
+
+    async def acquire(self, endpoint: str, priority: int = 0, timeout: float = None):
+        """
+        获取端点的执行槽位
+
+        Args:
+            endpoint: Agent端点URL
+            priority: 优先级（priority策略下数值越大越先执行）
+            timeout: 排队超时秒数，None使用配置值
+        """
+        queue = self._get_queue(endpoint)
+        if queue.in_flight < queue.limit and not queue.queue_depth:
+            queue.in_flight += 1
+            queue.admitted += 1
+            return
+
+        timeout = self.config.queue_timeout if timeout is None else timeout
+        sort_key = -priority if self.config.policy == "priority" else 0
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (sort_key, next(self._sequence), future))
+        queue.queued_total += 1
+        queue.max_queue_depth = max(queue.max_queue_depth, queue.queue_depth)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            queue.timeouts += 1
+            logger.warning(
+                f"[Admission] Timed out after {timeout}s waiting for {endpoint} "
+                f"(in flight: {queue.in_flight}/{queue.limit}, queued: {queue.queue_depth})"
+            )
+            raise AdmissionTimeoutError(
+                f"Agent {endpoint} is saturated: waited {timeout}s for a slot"
+            )
+        except asyncio.CancelledError:
+            # 槽位已移交但调用方被取消：归还槽位
+            if future.done() and not future.cancelled():
+                self.release(endpoint)
+            raise
+        finally:
+            queue.total_wait_time += time.perf_counter() - started
+
+        queue.admitted += 1
+
+    def release(self, endpoint: str):
+        """释放槽位，直接移交给队列中下一个仍在等待的请求"""
+        queue = self._get_queue(endpoint)
+        while queue.waiters:
+            _, _, future = heapq.heappop(queue.waiters)
+            if not future.done():
+                # 在途数不变：槽位从当前请求移交给等待者
+                future.set_result(True)
+                return
+        queue.in_flight = max(0, queue.in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str, priority: int = 0, timeout: float = None):
+        """在准入控制下执行一次Agent调用"""
+        await self.acquire(endpoint, priority=priority, timeout=timeout)
+        try:
+            yield
+        finally:
+            self.release(endpoint)
+
+    def outstanding(self, endpoint: str) -> int:
+        """端点当前未完成的请求数（在途 + 排队），供负载均衡使用"""
+        queue = self._queues.get(endpoint.rstrip("/"))
+        return queue.in_flight + queue.queue_depth if queue else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各端点的在途数、队列深度和等待统计"""
+        return {
+            endpoint: {
+                "limit": queue.limit,
+                "in_flight": queue.in_flight,
+                "queue_depth": queue.queue_depth,
+                "max_queue_depth": queue.max_queue_depth,
+                "admitted": queue.admitted,
+                "queued_total": queue.queued_total,
+                "timeouts": queue.timeouts,
+                "avg_wait_time": round(queue.total_wait_time / queue.queued_total, 3)
+                if queue.queued_total else 0.0
+            }
+            for endpoint, queue in self._queues.items()
+        }
+
+
+_admission_controller: Optional[AgentAdmissionController] = None
+
+
+def get_admission_controller() -> AgentAdmissionController:
+    """获取进程级共享的准入控制器（所有引擎和工作流共用）"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AgentAdmissionController()
+    return _admission_controller
@@ -0,0 +1,136 @@
+"""
+Agent 副本负载均衡 (Replica Balancer)
+同一个 Agent 卡片可以列出多个端点（副本），每次调用前按策略选出一个：
+- least_outstanding: 选未完成请求（在途 + 排队）最少的副本
+- p2c: 随机取两个副本，选未完成请求较少的一个（power of two choices）
+熔断中或被标记为不健康的副本会被剔除，全部剔除时仍从全部副本中选择（由熔断器快速失败）
+"""
+
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+from yinqing.core.admission import AgentAdmissionController, get_admission_controller
+from yinqing.core.resilience import ResilienceController, get_resilience_controller
+from yinqing.utils.config import BalancerConfig, get_balancer_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _card_field(agent: Any, name: str) -> Any:
+    return agent.get(name) if isinstance(agent, dict) else getattr(agent, name, None)
+
+
+def agent_endpoints(agent: Any) -> List[str]:
+    """
+    Agent 卡片（AgentCard 或注册表返回的字典）的全部副本端点
+
+    主端点（config.http_url，其次 url）在前，随后是 config.http_urls 列表
+    和 interaction_endpoints 中的 HTTP 端点，按出现顺序去重
+    """
+    config = _card_field(agent, 'config') or {}
+    urls = [config.get('http_url') or _card_field(agent, 'url')]
+    urls.extend(config.get('http_urls') or [])
+    for endpoint in _card_field(agent, 'interaction_endpoints') or []:
+        if isinstance(endpoint, dict):
+            if endpoint.get('type', 'http') == 'http':
+                urls.append(endpoint.get('url'))
+        else:
+            urls.append(getattr(endpoint, 'url', None))
+    return list(dict.fromkeys(url.rstrip("/") for url in urls if url))
+
+
+class ReplicaBalancer:
+    """
+    按Agent副本的负载均衡器
+
+    未完成请求数来自准入控制器（跨工作流共享），副本是否可用参考熔断器状态
+    和 mark_down()/mark_up() 设置的健康状态
+    """
+
+    def __init__(
+        self,
+        config: BalancerConfig = None,
+        admission: AgentAdmissionController = None,
+        resilience: ResilienceController = None
+    ):
+        self.config = config or get_balancer_config()
+        self.admission = admission or get_admission_controller()
+        self.resilience = resilience or get_resilience_controller()
+        self._down: Dict[str, str] = {}  # 端点 -> 不健康原因
+        self._picks: Dict[str, int] = {}
+        self.ejected_picks = 0  # 因剔除而绕开某些副本的选择次数
+
+    @staticmethod
+    def _key(endpoint: str) -> str:
+        return endpoint.rstrip("/")
+
+    def mark_down(self, endpoint: str, reason: str = ""):
+        """将副本标记为不健康（不再分配请求）"""
+        key = self._key(endpoint)
+        if key not in self._down:
+            logger.warning(f"[Balancer] Ejecting {key}: {reason or 'unhealthy'}")
+        self._down[key] = reason
+
+    def mark_up(self, endpoint: str):
+        """恢复副本"""
+        if self._down.pop(self._key(endpoint), None) is not None:
+            logger.info(f"[Balancer] {self._key(endpoint)} is back in rotation")
+
+    def is_available(self, endpoint: str) -> bool:
+        """副本是否可以分配请求（未被标记为不健康且未熔断）"""
+        key = self._key(endpoint)
+        return key not in self._down and not self.resilience.is_open(key)
+
+    def pick(self, replicas: Iterable[str], exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        为一次调用选择副本
+
+        Args:
+            replicas: 该Agent的全部端点
+            exclude: 本次调用已经失败过的端点（重试时尽量换一个副本）
+        """
+        replicas = list(dict.fromkeys(self._key(url) for url in replicas if url))
+        if not replicas:
+            return None
+        if len(replicas) == 1:
+            choice = replicas[0]
+        else:
+            excluded = {self._key(url) for url in exclude}
+            candidates = [url for url in replicas if self.is_available(url) and url not in excluded]
+            if not candidates:
+                candidates = [url for url in replicas if self.is_available(url)] or replicas
+            if len(candidates) < len(replicas):
+                self.ejected_picks += 1
+            choice = self._choose(candidates)
+        self._picks[choice] = self._picks.get(choice, 0) + 1
+        return choice
+
+    def _choose(self, candidates: List[str]) -> str:
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.config.policy == "p2c":
+            candidates = random.sample(candidates, 2)
+        else:
+            # 打乱后取最小值，未完成请求数相同时随机分配
+            candidates = random.sample(candidates, len(candidates))
+        return min(candidates, key=self.admission.outstanding)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.config.policy,
+            "picks": dict(self._picks),
+            "ejected_picks": self.ejected_picks,
+            "down": dict(self._down)
+        }
+
+
+_balancer: Optional[ReplicaBalancer] = None
+
+
+def get_balancer() -> ReplicaBalancer:
+    """获取进程级共享的副本负载均衡器"""
+    global _balancer
+    if _balancer is None:
+        _balancer = ReplicaBalancer()
+    return _balancer
@@ -0,0 +1,83 @@
+"""
+执行上下文 (Execution Context)
+保存单次工作流执行（一个trace）的全部运行时状态，
+使同一个引擎实例可以同时运行多个工作流而互不干扰
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from yinqing.core.types import ExecutionPlan, ParallelConfig, TaskStep
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ExecutionContext:
+    """
+    单个trace的执行状态
+
+    引擎实例只持有可共享的组件（parser、matcher、executor、reviewer等），
+    上下文、步骤状态、重试计数和本次执行的配置都放在这里，每次 stream() 创建一份。
+    """
+
+    def __init__(
+        self,
+        trace_id: str,
+        query: str,
+        parallel_config: ParallelConfig,
+        review_config: Any = None,
+        reviewer: Any = None
+    ):
+        """
+        Args:
+            trace_id: 任务追踪ID
+            query: 用户查询
+            parallel_config: 本次执行使用的并行配置
+            review_config: 本次执行使用的审核配置（仅增强版引擎）
+            reviewer: 绑定了 review_config 的审核层（仅增强版引擎）
+        """
+        self.trace_id = trace_id
+        self.query = query
+        self.parallel_config = parallel_config
+        self.review_config = review_config
+        self.reviewer = reviewer
+
+        # 运行时上下文
+        self.global_context: Dict[str, Any] = {"user_query": query, "trace_id": trace_id}
+        self.plan: Optional[ExecutionPlan] = None
+
+        # 重试计数器 {step_id: retry_count}
+        self.retry_counters: Dict[int, int] = {}
+
+        self.status = "running"  # running/completed/failed/cancelled
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def step_states(self) -> Dict[int, TaskStep]:
+        """当前计划中所有步骤的状态 {step_id: step}"""
+        return self.plan.step_map if self.plan else {}
+
+    def finish(self, status: str):
+        """标记执行结束"""
+        self.status = status
+        self.finished_at = datetime.now()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """获取执行摘要（用于状态查询和监控）"""
+        steps = list(self.step_states.values())
+        return {
+            "trace_id": self.trace_id,
+            "query": self.query,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total_steps": len(steps),
+            "completed_steps": len([s for s in steps if s.status == "success"]),
+            "failed_steps": len([s for s in steps if s.status == "failed"]),
+            "steps": {
+                step.step_id: {"name": step.name, "status": step.status}
+                for step in steps
+            }
+        }
@@ -1,35 +1,234 @@
 import json
 import uuid
+import hashlib
 import asyncio
-import httpx
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Iterable, List, Optional
 from datetime import datetime
 from a2a.client import A2AClient
 from a2a.types import SendMessageRequest, MessageSendParams, Message, Role, TextPart, Task
 from yinqing.core.types import TaskStep
+from yinqing.core.admission import AgentAdmissionController, get_admission_controller
+from yinqing.core.balancer import ReplicaBalancer, agent_endpoints, get_balancer
+from yinqing.core.health import AgentHealthMonitor, AgentUnavailableError, get_health_monitor
+from yinqing.core.http_pool import AgentHTTPPool
+from yinqing.core.resilience import CircuitOpenError, ResilienceController, get_resilience_controller
+from yinqing.core.singleflight import SingleFlight, get_single_flight
 from yinqing.utils.logger import get_logger
-from yinqing.utils.common import RETRY_TIMES, RETRY_DELAY, clean_response_str
+from yinqing.utils.cache import TTLCache, create_cache
+from yinqing.utils.config import (
+    ResultCacheConfig,
+    SingleFlightConfig,
+    get_result_cache_config,
+    get_single_flight_config
+)
+from yinqing.utils.common import clean_response_str
 
 logger = get_logger(__name__)
 
 class TaskExecutorLayer:
     """工头：负责最底层的 A2A 调用、重试和脏数据清洗"""
+
+    def __init__(
+        self,
+        admission: AgentAdmissionController = None,
+        result_cache: TTLCache = None,
+        cache_config: ResultCacheConfig = None,
+        http_pool: AgentHTTPPool = None,
+        resilience: ResilienceController = None,
+        balancer: ReplicaBalancer = None,
+        health: AgentHealthMonitor = None,
+        single_flight: SingleFlight = None,
+        single_flight_config: SingleFlightConfig = None
+    ):
+        # 进程级共享的按Agent准入控制，跨工作流限制每个Agent的在途请求数
+        self.admission = admission or get_admission_controller()
+
+        # 执行器持有的HTTP连接池：按Agent端点复用keep-alive连接
+        self.http_pool = http_pool or AgentHTTPPool()
+
+        # 进程级共享的重试与熔断控制：指数退避、全局重试预算、按Agent端点熔断
+        self.resilience = resilience or get_resilience_controller()
+
+        # 同一Agent有多个副本端点时按负载选择（进程级共享，跨工作流统计未完成请求）
+        self.balancer = balancer or get_balancer()
+
+        # 进程级共享的后台健康监测：全部副本都不健康的Agent直接快速失败
+        self.health = health or get_health_monitor()
+
+        # 进程级共享的请求合并：并发的相同请求（同一Agent + 相同内容）只发出一次
+        self.single_flight = single_flight or get_single_flight()
+        self.single_flight_config = single_flight_config or get_single_flight_config()
+
+        # 步骤结果缓存：相同Agent + 相同描述 + 相同输入上下文直接复用结果（仅限声明为幂等的Agent）
+        self.cache_config = cache_config or get_result_cache_config()
+        self.result_cache = result_cache
+        if self.result_cache is None and self.cache_config.enabled:
+            self.result_cache = create_cache(
+                backend=self.cache_config.backend,
+                namespace="step_results",
+                max_entries=self.cache_config.max_entries,
+                ttl=self.cache_config.ttl,
+                path=self.cache_config.path
+            )
     
-    async def _retry_async(self, func, *args, **kwargs):
-        for attempt in range(RETRY_TIMES):
-            try:
-                return await func(*args, **kwargs)
-            except Exception as e:
-                if attempt == RETRY_TIMES - 1:
-                    raise e
-                logger.warning(f"Attempt {attempt+1} failed: {e}, retrying in {RETRY_DELAY}s...")
-                await asyncio.sleep(RETRY_DELAY)
-        return None
-
-    async def execute_step(self, step: TaskStep, context: Dict[str, Any], trace_id: str) -> Tuple[TaskStep, str]:
-        """执行单个步骤，返回步骤对象和结果"""
+    async def _call_replicas(self, func, replicas: List[str]):
+        """在Agent的副本间调用 func(url)：每次尝试前由负载均衡器选择副本，重试优先换一个副本"""
+        return await self.resilience.call(
+            func,
+            choose_endpoint=lambda failed: self.balancer.pick(replicas, exclude=failed)
+        )
+
+    def _resolve_agent_url(self, agent) -> Optional[str]:
+        """从 AgentCard 中解析 HTTP 端点"""
+        # 优先尝试从 config 获取 URL
+        target_url = None
+
+        # 安全地访问 config 属性
+        agent_config = getattr(agent, 'config', {})
+        if agent_config and 'http_url' in agent_config:
+            target_url = agent_config['http_url']
+
+        # 尝试从 url 属性获取 (直接属性)
+        if not target_url and hasattr(agent, 'url'):
+             target_url = agent.url
+
+        # 如果 config 中没有，尝试解析 interaction_endpoints (如果存在)
+        if not target_url and hasattr(agent, 'interaction_endpoints'):
+            # 假设 interaction_endpoints 是个列表，取第一个
+            endpoints = agent.interaction_endpoints
+            if endpoints:
+                target_url = endpoints[0].get('url') if isinstance(endpoints[0], dict) else getattr(endpoints[0], 'url', None)
+
+        if not target_url:
+            # 最后的尝试：有些 AgentCard 可能把 url 直接放在根级别，但通过 dict 访问
+            if hasattr(agent, 'dict'):
+                agent_dict = agent.dict()
+                target_url = agent_dict.get('url')
+            elif isinstance(agent, dict):
+                target_url = agent.get('url')
+
+        return target_url
+
+    def _resolve_agent_urls(self, agent) -> List[str]:
+        """解析 Agent 的全部副本端点（主端点在前，见 balancer.agent_endpoints）"""
+        return list(dict.fromkeys(
+            url.rstrip("/") for url in [self._resolve_agent_url(agent), *agent_endpoints(agent)] if url
+        ))
+
+    def _filter_context(self, step: TaskStep, context: Dict[str, Any], warn: bool = True) -> Dict[str, Any]:
+        """按 context_keys 筛选步骤需要的上下文"""
+        filtered_context = {}
+        for key in step.context_keys:
+            if key in context:
+                filtered_context[key] = context[key]
+            elif warn:
+                logger.warning(f"  ⚠️ Context key '{key}' not found for step {step.step_id}")
+        return filtered_context
+
+    def _is_cacheable(self, agent) -> bool:
+        """
+        Agent是否允许缓存结果
+
+        缓存需要显式开启：只有 config.cacheable=true 或列在 STEP_CACHE_AGENTS 中的幂等Agent才缓存，
+        config.cacheable=false 或列在 STEP_CACHE_DISABLED_AGENTS 中的Agent始终不缓存
+        """
+        if self.result_cache is None or agent is None:
+            return False
+        agent_config = getattr(agent, 'config', None) or {}
+        names = {getattr(agent, 'name', None), (self._resolve_agent_url(agent) or "").rstrip("/")}
+        if agent_config.get('cacheable') is False or names & set(self.cache_config.disabled_agents):
+            return False
+        if agent_config.get('cacheable') is True:
+            return True
+        cached = self.cache_config.cached_agents
+        return "*" in cached or bool(names & set(cached))
+
+    def _is_coalescable(self, agent) -> bool:
+        """Agent是否允许合并并发的相同请求（可通过配置或 config.coalesce=false 关闭）"""
+        if not self.single_flight_config.enabled or agent is None:
+            return False
+        agent_config = getattr(agent, 'config', None) or {}
+        if agent_config.get('coalesce') is False:
+            return False
+        disabled = self.single_flight_config.disabled_agents
+        url = (self._resolve_agent_url(agent) or "").rstrip("/")
+        return getattr(agent, 'name', None) not in disabled and url not in disabled
+
+    def _cache_key(self, step: TaskStep, filtered_context: Dict[str, Any]) -> str:
+        """步骤结果的内容寻址键：Agent + 描述 + 输入上下文"""
+        agent = step.assigned_agent
+        content = json.dumps({
+            "agent": getattr(agent, 'name', None),
+            "url": self._resolve_agent_url(agent),
+            "description": step.description,
+            "context": filtered_context
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def invalidate_cached_result(self, step: TaskStep, context: Dict[str, Any]):
+        """删除步骤在当前输入下的缓存结果（审核不通过或回溯重做时调用）"""
+        if not self._is_cacheable(step.assigned_agent):
+            return
+        self.result_cache.delete(self._cache_key(step, self._filter_context(step, context, warn=False)))
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """步骤结果缓存的命中统计，未启用缓存时返回None"""
+        return self.result_cache.get_stats() if self.result_cache is not None else None
+
+    def prewarm(self, steps: Iterable[TaskStep]):
+        """为已分配Agent的步骤提前建立HTTP连接并纳入健康监测（后台进行，不阻塞执行）"""
+        urls = [
+            url for step in steps if step.assigned_agent
+            for url in self._resolve_agent_urls(step.assigned_agent)
+        ]
+        self.health.watch(urls)
+        self.health.start()
+        self.http_pool.prewarm(urls)
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        """HTTP连接池统计"""
+        return self.http_pool.get_stats()
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """重试预算、各端点熔断器状态和副本负载均衡统计"""
+        stats = self.resilience.get_stats()
+        stats["balancer"] = self.balancer.get_stats()
+        return stats
+
+    def get_coalesce_stats(self) -> Dict[str, Any]:
+        """请求合并统计（实际发出的请求数与合并次数）"""
+        stats = self.single_flight.get_stats()
+        stats["enabled"] = self.single_flight_config.enabled
+        return stats
+
+    def get_health_stats(self) -> Dict[str, Any]:
+        """各Agent端点的健康状态和延迟"""
+        return self.health.get_stats()
+
+    async def aclose(self):
+        """关闭HTTP连接池并停止健康监测"""
+        await self.http_pool.aclose()
+        await self.health.aclose()
+
+    async def execute_step(
+        self,
+        step: TaskStep,
+        context: Dict[str, Any],
+        trace_id: str,
+        use_cache: bool = True
+    ) -> Tuple[TaskStep, str]:
+        """
+        执行单个步骤，返回步骤对象和结果
+
+        Args:
+            step: 要执行的步骤
+            context: 全局上下文（按 step.context_keys 筛选后发送给Agent）
+            trace_id: 任务追踪ID
+            use_cache: 是否读取结果缓存（重试时应跳过缓存，成功的新结果仍会写入）
+        """
         step.status = "running"
         step.start_time = datetime.now()
+        step.cache_hit = False
         
         # 详细日志：开始执行
         logger.info(f"  [cyan]Step {step.step_id} Started[/cyan]: Invoking Agent '{step.assigned_agent.name if step.assigned_agent else 'None'}'")
@@ -42,47 +241,41 @@ class TaskExecutorLayer:
             return step, "Error: No agent assigned to this step."
 
         # 筛选上下文
-        filtered_context = {}
-        for key in step.context_keys:
-            if key in context:
-                filtered_context[key] = context[key]
-            else:
-                logger.warning(f"  ⚠️ Context key '{key}' not found for step {step.step_id}")
-        
+        filtered_context = self._filter_context(step, context)
+
+        # 查询结果缓存
+        cache_key = None
+        if self._is_cacheable(step.assigned_agent):
+            cache_key = self._cache_key(step, filtered_context)
+            cached = self.result_cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                step.status = "success"
+                step.result = cached
+                step.error = None
+                step.cache_hit = True
+                step.end_time = datetime.now()
+                logger.info(f"  [green]Step {step.step_id} Cache Hit[/green]: Reusing result of '{step.assigned_agent.name}'")
+                return step, cached
+
         payload = {
             "task_description": step.description,
             "context": filtered_context
         }
         query_str = json.dumps(payload)
+        replicas = self._resolve_agent_urls(step.assigned_agent)
+        if not self.health.any_healthy(replicas):
+            # 健康检查已判定全部副本不可用，不再等待调用超时
+            error = AgentUnavailableError(
+                f"Agent {step.assigned_agent.name} is unhealthy: all endpoints failed health checks ({', '.join(replicas)})"
+            )
+            step.status = "failed"
+            step.result = f"Execution Error: {error}"
+            step.error = str(error)
+            step.end_time = datetime.now()
+            logger.error(f"  [red]Step {step.step_id} Skipped[/red]: {error}")
+            return step, step.result
 
-        async def _call_agent():
-            # 优先尝试从 config 获取 URL
-            target_url = None
-            
-            # 安全地访问 config 属性
-            agent_config = getattr(step.assigned_agent, 'config', {})
-            if agent_config and 'http_url' in agent_config:
-                target_url = agent_config['http_url']
-            
-            # 尝试从 url 属性获取 (直接属性)
-            if not target_url and hasattr(step.assigned_agent, 'url'):
-                 target_url = step.assigned_agent.url
-                 
-            # 如果 config 中没有，尝试解析 interaction_endpoints (如果存在)
-            if not target_url and hasattr(step.assigned_agent, 'interaction_endpoints'):
-                # 假设 interaction_endpoints 是个列表，取第一个
-                endpoints = step.assigned_agent.interaction_endpoints
-                if endpoints:
-                    target_url = endpoints[0].get('url') if isinstance(endpoints[0], dict) else getattr(endpoints[0], 'url', None)
-
-            if not target_url:
-                # 最后的尝试：有些 AgentCard 可能把 url 直接放在根级别，但通过 dict 访问
-                if hasattr(step.assigned_agent, 'dict'):
-                    agent_dict = step.assigned_agent.dict()
-                    target_url = agent_dict.get('url')
-                elif isinstance(step.assigned_agent, dict):
-                    target_url = step.assigned_agent.get('url')
-
+        async def _call_agent(target_url: Optional[str]):
             if not target_url:
                 raise ValueError(f"Could not find HTTP URL for agent {step.assigned_agent.name}. Card data: {step.assigned_agent}")
 
@@ -101,9 +294,10 @@ class TaskExecutorLayer:
             }
             
             # 使用 httpx 直接发送请求，绕过 a2a 库的严格 Pydantic 校验
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            # 准入控制：后继越多的步骤优先级越高（在priority策略下生效）
+            async with self.admission.slot(target_url, priority=len(step.successors)):
                 # logger.info(f"  [Executor] POST {target_url}")
-                response = await client.post(target_url, json=raw_payload)
+                response = await self.http_pool.post(target_url, json=raw_payload)
                 response.raise_for_status()
                 response_json = response.json()
                 
@@ -128,7 +322,14 @@ class TaskExecutorLayer:
                     return clean_response_str(str(response_json))
 
         try:
-            result = await self._retry_async(_call_agent)
+            if self._is_coalescable(step.assigned_agent) and replicas:
+                # 以主端点 + 请求内容哈希为键：并发的相同请求共享一次调用（副本由负载均衡在调用内选择）
+                payload_hash = hashlib.sha256(query_str.encode("utf-8")).hexdigest()
+                result = await self.single_flight.do(
+                    replicas[0], payload_hash, lambda: self._call_replicas(_call_agent, replicas)
+                )
+            else:
+                result = await self._call_replicas(_call_agent, replicas)
             step.status = "success" if not result.startswith("Error") else "failed"
             step.result = result
             step.error = result if result.startswith("Error") else None
@@ -136,10 +337,19 @@ class TaskExecutorLayer:
             # 日志：执行结果
             if step.status == "success":
                 # logger.info(f"  [green]Step {step.step_id} Success[/green]")
-                pass
+                if cache_key:
+                    self.result_cache.set(cache_key, result)
             else:
                 logger.error(f"  [red]Step {step.step_id} Failed[/red]: {step.error}")
 
+        except CircuitOpenError as e:
+            # 端点熔断中：快速失败，由上层决定改派或跳过
+            result = f"Execution Error: {e}"
+            step.status = "failed"
+            step.result = result
+            step.error = str(e)
+            logger.error(f"  [red]Step {step.step_id} Skipped[/red]: {e}")
+
         except Exception as e:
             result = f"Execution Error: {e}"
             step.status = "failed"
@@ -0,0 +1,206 @@
+"""
+Agent 健康监测 (Health Monitor)
+后台按固定间隔并发请求各 Agent 端点的 /health，记录延迟和 up/down 状态：
+- 连续失败 unhealthy_threshold 次标记为 down，负载均衡器不再分配请求
+- 连续成功 healthy_threshold 次恢复为 up
+匹配器和执行器据此避开不健康的 Agent，而不是等到调用超时才发现
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+from yinqing.core.balancer import ReplicaBalancer, agent_endpoints, get_balancer
+from yinqing.utils.config import HealthConfig, get_health_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AgentUnavailableError(Exception):
+    """Agent 的全部端点都未通过健康检查，调用被直接拒绝"""
+
+
+class _EndpointHealth:
+    """单个端点的健康状态"""
+
+    def __init__(self):
+        self.status = "unknown"  # unknown / up / down
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.latency: Optional[float] = None  # 最近一次成功检查的耗时（秒）
+        self.avg_latency: Optional[float] = None  # 指数加权平均延迟
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.checks = 0
+        self.failures = 0
+
+
+class AgentHealthMonitor:
+    """
+    进程级的Agent健康监测器
+
+    - watch()/watch_agents() 登记要监测的端点，start() 在当前事件循环上启动后台轮询（可重复调用）
+    - 未检查过的端点视为健康，避免监测启动前误拒请求
+    """
+
+    def __init__(self, config: HealthConfig = None, balancer: ReplicaBalancer = None):
+        self.config = config or get_health_config()
+        self.balancer = balancer or get_balancer()
+        self._endpoints: Dict[str, _EndpointHealth] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def _key(endpoint: str) -> str:
+        return endpoint.rstrip("/")
+
+    def watch(self, urls: Iterable[str]):
+        """登记要监测的端点"""
+        for url in urls:
+            if url:
+                self._endpoints.setdefault(self._key(url), _EndpointHealth())
+
+    def watch_agents(self, agents: Iterable[Any]):
+        """登记Agent卡片（AgentCard 或注册表返回的字典）的全部端点"""
+        for agent in agents:
+            self.watch(agent_endpoints(agent))
+
+    def start(self):
+        """在当前事件循环上启动后台轮询（已在运行时不重复启动）"""
+        if not self.config.enabled:
+            return
+        self._bind_loop()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll(), name="agent-health-monitor")
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧循环上的客户端和任务已不可用
+            self._loop = loop
+            self._client = None
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.warning(f"[Health] Health check round failed: {e}")
+            await asyncio.sleep(self.config.interval)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.config.timeout)
+        return self._client
+
+    async def check(self, endpoint: str) -> bool:
+        """检查单个端点，更新其状态并返回本次是否健康"""
+        key = self._key(endpoint)
+        health = self._endpoints.setdefault(key, _EndpointHealth())
+        started = time.perf_counter()
+        try:
+            response = await self._get_client().get(key + self.config.path)
+            response.raise_for_status()
+        except Exception as e:
+            self._record_failure(key, health, f"{type(e).__name__}: {e}")
+            return False
+        self._record_success(key, health, time.perf_counter() - started)
+        return True
+
+    async def check_all(self) -> Dict[str, bool]:
+        """并发检查全部已登记的端点"""
+        endpoints = list(self._endpoints)
+        results = await asyncio.gather(*(self.check(url) for url in endpoints))
+        return dict(zip(endpoints, results))
+
+    def _record_success(self, key: str, health: _EndpointHealth, latency: float):
+        health.checks += 1
+        health.last_checked = time.time()
+        health.last_error = None
+        health.latency = latency
+        health.avg_latency = latency if health.avg_latency is None else 0.8 * health.avg_latency + 0.2 * latency
+        health.consecutive_failures = 0
+        health.consecutive_successes += 1
+        if health.status != "up" and (
+            health.status == "unknown" or health.consecutive_successes >= self.config.healthy_threshold
+        ):
+            if health.status == "down":
+                logger.info(f"[Health] {key} is up again ({latency * 1000:.0f}ms)")
+            health.status = "up"
+            self.balancer.mark_up(key)
+
+    def _record_failure(self, key: str, health: _EndpointHealth, error: str):
+        health.checks += 1
+        health.failures += 1
+        health.last_checked = time.time()
+        health.last_error = error
+        health.consecutive_successes = 0
+        health.consecutive_failures += 1
+        if health.status != "down" and health.consecutive_failures >= self.config.unhealthy_threshold:
+            logger.warning(f"[Health] {key} is down after {health.consecutive_failures} failed checks: {error}")
+            health.status = "down"
+            self.balancer.mark_down(key, reason=f"health check failed: {error}")
+
+    def is_healthy(self, endpoint: str) -> bool:
+        """端点是否健康（未登记或尚未检查的端点视为健康）"""
+        health = self._endpoints.get(self._key(endpoint))
+        return health is None or health.status != "down"
+
+    def any_healthy(self, urls: Iterable[str]) -> bool:
+        """是否至少有一个端点健康（没有端点时返回True，由调用方报告缺少URL）"""
+        urls = [url for url in urls if url]
+        return not urls or any(self.is_healthy(url) for url in urls)
+
+    def is_agent_healthy(self, agent: Any) -> bool:
+        """Agent 是否至少有一个健康的端点"""
+        return self.any_healthy(agent_endpoints(agent))
+
+    async def aclose(self):
+        """停止后台轮询并关闭HTTP客户端"""
+        task, self._task = self._task, None
+        if task and not task.done() and self._loop is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        client, self._client = self._client, None
+        if client and self._loop is asyncio.get_running_loop():
+            await client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各端点的状态、延迟和检查次数"""
+        return {
+            "enabled": self.config.enabled,
+            "interval": self.config.interval,
+            "running": self._task is not None and not self._task.done(),
+            "endpoints": {
+                endpoint: {
+                    "status": health.status,
+                    "latency_ms": round(health.latency * 1000, 1) if health.latency is not None else None,
+                    "avg_latency_ms": round(health.avg_latency * 1000, 1) if health.avg_latency is not None else None,
+                    "consecutive_failures": health.consecutive_failures,
+                    "checks": health.checks,
+                    "failures": health.failures,
+                    "last_error": health.last_error
+                }
+                for endpoint, health in self._endpoints.items()
+            }
+        }
+
+
+_health_monitor: Optional[AgentHealthMonitor] = None
+
+
+def get_health_monitor() -> AgentHealthMonitor:
+    """获取进程级共享的Agent健康监测器"""
+    global _health_monitor
+    if _health_monitor is None:
+        _health_monitor = AgentHealthMonitor()
+    return _health_monitor
@@ -0,0 +1,167 @@
+"""
+Agent HTTP 连接池 (Agent HTTP Pool)
+执行器持有的共享 httpx 客户端：按 Agent 端点（scheme://host:port）复用 keep-alive 连接，
+每个端点的连接数单独限制，并在计划匹配完成后提前建立到已分配 Agent 的连接
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Iterable, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+from yinqing.utils.config import HTTPPoolConfig, get_http_pool_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import h2  # noqa: F401  HTTP/2 支持（可选依赖: pip install "httpx[http2]"）
+except ImportError:  # pragma: no cover - 可选依赖
+    h2 = None
+
+# A2A Agent 卡片的标准路径，预热时用它建立连接（响应内容不使用）
+PREWARM_PATH = "/.well-known/agent.json"
+
+
+class _OriginStats:
+    """单个端点的请求统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_time = 0.0
+        self.prewarmed = 0
+
+
+class AgentHTTPPool:
+    """
+    按端点划分的 httpx 连接池
+
+    - 每个端点一个 AsyncClient，max_connections_per_host 限制该端点的并发连接数，
+      空闲连接在 keepalive_expiry 秒后关闭
+    - http2=True 且安装了 h2 时启用 HTTP/2（同一连接上多路复用）
+    - 客户端绑定到创建它的事件循环，换用新的事件循环（例如多次 asyncio.run）时重新创建
+    """
+
+    def __init__(self, config: HTTPPoolConfig = None):
+        self.config = config or get_http_pool_config()
+        self.http2 = self.config.http2 and h2 is not None
+        if self.config.http2 and h2 is None:
+            logger.warning("[HTTP Pool] h2 not installed, falling back to HTTP/1.1 (pip install \"httpx[http2]\")")
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, _OriginStats] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._prewarm_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _client(self, origin: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧循环上的连接已不可用，直接丢弃
+            self._loop = loop
+            self._clients = {}
+            self._prewarm_tasks = set()
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            per_host = self.config.max_connections_per_host
+            client = httpx.AsyncClient(
+                timeout=self.config.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=per_host,
+                    max_keepalive_connections=per_host,
+                    keepalive_expiry=self.config.keepalive_expiry
+                )
+            )
+            self._clients[origin] = client
+        return client
+
+    def _origin_stats(self, origin: str) -> _OriginStats:
+        if origin not in self._stats:
+            self._stats[origin] = _OriginStats()
+        return self._stats[origin]
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """通过该端点的共享连接发送 POST 请求"""
+        origin = self._origin(url)
+        client = self._client(origin)
+        stats = self._origin_stats(origin)
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await client.post(url, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.total_time += time.perf_counter() - started
+
+    async def _prewarm_origin(self, origin: str):
+        try:
+            await self._client(origin).get(origin + PREWARM_PATH, timeout=self.config.prewarm_timeout)
+            self._origin_stats(origin).prewarmed += 1
+        except Exception as e:
+            logger.debug(f"[HTTP Pool] Prewarm of {origin} failed: {e}")
+
+    def prewarm(self, urls: Iterable[str]):
+        """
+        在后台为尚无连接的端点建立连接（不等待完成）
+
+        Args:
+            urls: 计划中已分配Agent的端点
+        """
+        if not self.config.prewarm:
+            return
+        origins = {self._origin(url) for url in urls if url}
+        for origin in origins:
+            if origin in self._clients and self._loop is asyncio.get_running_loop():
+                continue
+            task = asyncio.create_task(self._prewarm_origin(origin), name=f"prewarm-{origin}")
+            self._prewarm_tasks.add(task)
+            task.add_done_callback(self._prewarm_tasks.discard)
+
+    async def aclose(self):
+        """关闭所有连接（引擎关闭时调用）"""
+        if self._loop is not asyncio.get_running_loop():
+            self._clients = {}
+            return
+        for task in list(self._prewarm_tasks):
+            task.cancel()
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+    @staticmethod
+    def _open_connections(client: httpx.AsyncClient) -> Optional[int]:
+        """当前打开的连接数（读取 httpcore 连接池，接口不可用时返回None）"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return len(connections) if connections is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各端点的请求数、错误数、在途数、平均耗时和打开的连接数"""
+        origins = {}
+        for origin, stats in self._stats.items():
+            client = self._clients.get(origin)
+            origins[origin] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "avg_time": round(stats.total_time / stats.requests, 4) if stats.requests else 0.0,
+                "prewarmed": stats.prewarmed,
+                "open_connections": self._open_connections(client) if client and not client.is_closed else 0
+            }
+        return {
+            "http2": self.http2,
+            "max_connections_per_host": self.config.max_connections_per_host,
+            "keepalive_expiry": self.config.keepalive_expiry,
+            "origins": origins
+        }
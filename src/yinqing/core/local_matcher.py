@@ -0,0 +1,189 @@
+"""
+本地能力匹配 (Local Capability Index)
+基于 Agent 注册表构建字符 n-gram TF-IDF 向量，用一次矩阵乘法为计划中的所有步骤打分；
+只有最高分与次高分过于接近（或最高分过低）时才需要交给 LLM 裁决。
+
+依赖 numpy（可选依赖: pip install "yinqing-agent[vector]"），未安装时 is_available() 返回 False，
+匹配器退回到原有的 LLM / find_agent 流程。
+"""
+
+import re
+import hashlib
+import json
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 按非字母数字字符切分片段，n-gram 只在片段内部生成
+_SEGMENT_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def is_available() -> bool:
+    """numpy 是否可用"""
+    return np is not None
+
+
+def char_ngrams(text: str, ngram_range: tuple = (2, 3)) -> List[str]:
+    """
+    生成字符 n-gram（对中文友好，无需分词）
+
+    文本先做 NFKC 规范化和小写，按标点/空白切分为片段；每个片段生成指定长度的 n-gram，
+    比最短 n 还短的片段整体作为一个词项。英文单词额外保留整词。
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    low, high = ngram_range
+    grams: List[str] = []
+    for segment in _SEGMENT_RE.split(text):
+        if not segment:
+            continue
+        if len(segment) < low:
+            grams.append(segment)
+            continue
+        if segment.isascii():
+            grams.append(segment)
+        for n in range(low, high + 1):
+            grams.extend(segment[i:i + n] for i in range(len(segment) - n + 1))
+    return grams
+
+
+def card_text(agent: Dict[str, Any]) -> str:
+    """拼接 Agent 卡片中用于匹配的文本：名称、描述、技能名称/描述/标签/示例"""
+    parts = [agent.get("name", ""), agent.get("description", "")]
+    for skill in agent.get("skills", []) or []:
+        parts.append(skill.get("name", ""))
+        parts.append(skill.get("description", ""))
+        parts.extend(skill.get("tags", []) or [])
+        parts.extend(skill.get("examples", []) or [])
+    return "\n".join(p for p in parts if p)
+
+
+@dataclass
+class LocalMatch:
+    """单个描述的本地匹配结果"""
+    description: str
+    agent: Optional[Dict[str, Any]]
+    score: float
+    runner_up: Optional[Dict[str, Any]] = None
+    runner_up_score: float = 0.0
+    confident: bool = False
+
+    @property
+    def margin(self) -> float:
+        return self.score - self.runner_up_score
+
+
+class LocalCapabilityIndex:
+    """
+    Agent 注册表的 TF-IDF 索引
+
+    - 每个 Agent 一行 L2 归一化的 TF-IDF 向量
+    - match() 将所有描述向量化后与卡片矩阵相乘，一次得到全部余弦相似度
+    """
+
+    def __init__(
+        self,
+        agents: List[Dict[str, Any]],
+        ngram_range: tuple = (2, 3),
+        margin: float = 0.05,
+        min_score: float = 0.1
+    ):
+        """
+        Args:
+            agents: list_all_agents 返回的 Agent 卡片列表
+            ngram_range: 字符 n-gram 长度范围
+            margin: 最高分需领先次高分的最小差值，否则视为不确定
+            min_score: 最高分低于该值视为不确定
+        """
+        if np is None:
+            raise ImportError("numpy is required for LocalCapabilityIndex (pip install 'yinqing-agent[vector]')")
+
+        self.agents = [a for a in agents if a.get("name")]
+        self.ngram_range = ngram_range
+        self.margin = margin
+        self.min_score = min_score
+        self.fingerprint = self.registry_fingerprint(self.agents)
+
+        docs = [char_ngrams(card_text(a), ngram_range) for a in self.agents]
+        vocabulary: Dict[str, int] = {}
+        for doc in docs:
+            for gram in doc:
+                vocabulary.setdefault(gram, len(vocabulary))
+        self.vocabulary = vocabulary
+
+        # 平滑IDF: log((1 + N) / (1 + df)) + 1
+        df = np.zeros(len(vocabulary), dtype=np.float64)
+        for doc in docs:
+            for gram in set(doc):
+                df[vocabulary[gram]] += 1
+        n_docs = max(1, len(docs))
+        self.idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+        self.matrix = self._vectorize(docs)
+        logger.info(
+            f"[LocalMatcher] Indexed {len(self.agents)} agents "
+            f"({len(vocabulary)} n-grams, fingerprint {self.fingerprint[:8]})"
+        )
+
+    @staticmethod
+    def registry_fingerprint(agents: List[Dict[str, Any]]) -> str:
+        """注册表内容指纹，用于判断是否需要重建索引"""
+        content = json.dumps(
+            sorted((card_text(a) for a in agents)), ensure_ascii=False
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _vectorize(self, docs: List[List[str]]) -> "np.ndarray":
+        """词项列表 -> L2 归一化的 TF-IDF 矩阵（忽略词表外的词项）"""
+        matrix = np.zeros((len(docs), len(self.vocabulary)), dtype=np.float64)
+        for row, doc in enumerate(docs):
+            for gram in doc:
+                col = self.vocabulary.get(gram)
+                if col is not None:
+                    matrix[row, col] += 1.0
+        # 亚线性TF，避免长示例文本中的重复词项主导得分
+        np.log1p(matrix, out=matrix)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def score(self, descriptions: List[str]) -> "np.ndarray":
+        """返回 (描述数 x Agent数) 的余弦相似度矩阵"""
+        if not descriptions or not self.agents:
+            return np.zeros((len(descriptions), len(self.agents)))
+        queries = self._vectorize([char_ngrams(d, self.ngram_range) for d in descriptions])
+        return queries @ self.matrix.T
+
+    def match(self, descriptions: List[str]) -> List[LocalMatch]:
+        """为所有描述选择得分最高的 Agent，并标记是否足够确定"""
+        scores = self.score(descriptions)
+        results = []
+        for i, description in enumerate(descriptions):
+            if not self.agents:
+                results.append(LocalMatch(description=description, agent=None, score=0.0))
+                continue
+            order = np.argsort(-scores[i])
+            best = int(order[0])
+            best_score = float(scores[i, best])
+            runner_up = int(order[1]) if len(order) > 1 else None
+            runner_up_score = float(scores[i, runner_up]) if runner_up is not None else 0.0
+            confident = best_score >= self.min_score and \
+                best_score - runner_up_score >= self.margin
+            results.append(LocalMatch(
+                description=description,
+                agent=self.agents[best],
+                score=best_score,
+                runner_up=self.agents[runner_up] if runner_up is not None else None,
+                runner_up_score=runner_up_score,
+                confident=confident
+            ))
+        return results
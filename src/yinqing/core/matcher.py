@@ -1,15 +1,20 @@
 import os
-import json
 import asyncio
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List, Any
 from dotenv import load_dotenv
-from yinqing.core.types import ExecutionPlan, AgentCard
-from yinqing.core.mcp_client import init_session, find_agent, list_all_agents
-from yinqing.utils.config import get_mcp_server_config
+from yinqing.core.types import ExecutionPlan, AgentCard, TaskStep
+from yinqing.core.mcp_client import get_registry_client
+from yinqing.core.health import get_health_monitor
+from yinqing.core.pool import BoundedTaskPool
+from yinqing.core.resilience import get_resilience_controller
+from yinqing.core import local_matcher
+from yinqing.core.local_matcher import LocalCapabilityIndex
+from yinqing.utils.cache import TTLCache, create_cache, normalize_key
+from yinqing.utils.config import (
+    MatcherConfig, MatchCacheConfig, get_mcp_server_config, get_matcher_config, get_match_cache_config
+)
 from yinqing.utils.logger import get_logger
-from yinqing.utils.common import RETRY_TIMES, RETRY_DELAY, AGENT_CACHE_TTL, clean_response_str
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
@@ -28,10 +33,44 @@ logger = get_logger(__name__)
 class CapabilityMatcherLayer:
     """猎头：负责根据步骤描述去 MCP 市场寻找合适的 Agent（增强版：使用LLM辅助匹配）"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        matcher_config: MatcherConfig = None,
+        agent_cache: TTLCache = None,
+        cache_config: MatchCacheConfig = None
+    ):
         self.config = get_mcp_server_config()
-        self.agent_cache: Dict[str, Tuple[AgentCard, datetime]] = {}
-        
+        self.matcher_config = matcher_config or get_matcher_config()
+        # 进程级共享的长连接MCP会话（含注册表版本缓存）；配置多个注册中心时为联邦客户端
+        self.sessions = get_registry_client()
+
+        # 进程级共享的Agent健康监测：匹配时跳过全部端点都不健康的Agent
+        self.health = get_health_monitor()
+
+        # 匹配缓存：键为规范化后的描述，值为Agent卡片（None表示未找到，短期负缓存）
+        self.cache_config = cache_config or get_match_cache_config()
+        self.agent_cache = agent_cache or create_cache(
+            backend=self.cache_config.backend,
+            namespace="agent_matches",
+            max_entries=self.cache_config.max_entries,
+            ttl=self.cache_config.ttl,
+            path=self.cache_config.path,
+            sweep_interval=self.cache_config.sweep_interval
+        )
+        # 注册表指纹单独存放（独立命名空间、只有一个键），不参与匹配缓存的LRU淘汰
+        self.registry_marker = create_cache(
+            backend=self.cache_config.backend,
+            namespace="agent_matches_registry",
+            max_entries=1,
+            ttl=0,
+            path=self.cache_config.path
+        )
+
+        # 本地TF-IDF索引（注册表内容变化时重建）
+        self.local_index: Optional[LocalCapabilityIndex] = None
+        if self.matcher_config.local and not local_matcher.is_available():
+            logger.warning("[Matcher] numpy not installed, local capability matching disabled")
+
         # 新增：LLM辅助匹配
         self.llm = ChatOpenAI(model=QWEN_MODEL, temperature=0.1, base_url=QWEN_BASE_URL, api_key=QWEN_API_KEY)
         self.match_prompt = ChatPromptTemplate.from_template(
@@ -59,82 +98,165 @@ class CapabilityMatcherLayer:
         )
         self.match_chain = self.match_prompt | self.llm | JsonOutputParser()
 
+        # 批量匹配：一次LLM调用为所有步骤选择Agent
+        self.batch_match_prompt = ChatPromptTemplate.from_template(
+            """你是一位专业的Agent匹配专家。请为下面每个任务分别选择最合适的Agent。
+
+任务列表（step_id: 任务描述）:
+{tasks}
+
+可用的Agent列表:
+{agents_info}
+
+选择规则：
+1. 如果任务明确要求生成Excel文件，必须选择"Excel Generator Agent"
+2. 如果任务明确要求生成Word文档，必须选择"Word Generator Agent"
+3. 如果任务需要研究/收集信息，选择"Researcher Agent"
+4. 如果任务需要写作/创作内容，选择"Writer Agent"
+5. 如果任务需要数据分析，选择"Data Analyst Agent"
+6. 如果任务需要编程，选择"Coder Agent"
+
+返回JSON格式（每个任务一项，step_id与任务列表一致）:
+{{
+    "assignments": [
+        {{"step_id": 1, "selected_agent": "Agent名称", "reason": "选择理由"}}
+    ]
+}}
+"""
+        )
+        self.batch_match_chain = self.batch_match_prompt | self.llm | JsonOutputParser()
+
+    @staticmethod
+    def _cache_key(description: str) -> str:
+        """匹配缓存键：忽略全半角、大小写、标点和多余空白"""
+        return normalize_key(description, strip_punctuation=True)
+
+    def _lookup_cached_agent(self, description: str) -> Tuple[bool, Optional[AgentCard]]:
+        """
+        查询匹配缓存
+
+        Returns:
+            (是否命中, AgentCard)；命中但AgentCard为None表示负缓存（近期未找到Agent）
+        """
+        entry = self.agent_cache.get(self._cache_key(description))
+        if entry is None:
+            return False, None
+        if entry.get("agent") is None:
+            return True, None
+        return True, self.sessions.agent_card(entry["agent"])
+
     def _get_cached_agent(self, description: str) -> Optional[AgentCard]:
-        if description in self.agent_cache:
-            agent_card, expire_time = self.agent_cache[description]
-            if datetime.now() < expire_time:
-                return agent_card
-            else:
-                del self.agent_cache[description]
-        return None
+        _, agent_card = self._lookup_cached_agent(description)
+        return agent_card
 
     def _set_cached_agent(self, description: str, agent_card: AgentCard):
-        expire_time = datetime.now() + AGENT_CACHE_TTL
-        self.agent_cache[description] = (agent_card, expire_time)
+        self.agent_cache.set(
+            self._cache_key(description),
+            {"agent": agent_card.model_dump(mode="json", exclude_none=True)}
+        )
+
+    def _set_negative_cache(self, description: str):
+        """记录未找到Agent的描述，短时间内不再重复查找"""
+        self.agent_cache.set(
+            self._cache_key(description), {"agent": None}, ttl=self.cache_config.negative_ttl
+        )
+
+    def _check_registry(self, all_agents: List[Dict]):
+        """注册表内容变化时清空匹配缓存（指纹与缓存使用同一后端，共享后端的进程间同样生效）"""
+        if not all_agents:
+            return
+        fingerprint = LocalCapabilityIndex.registry_fingerprint(all_agents)
+        stored = self.registry_marker.get("fingerprint")
+        if stored == fingerprint:
+            return
+        if stored is not None or len(self.agent_cache):
+            logger.info("[Matcher] Agent registry changed, invalidating match cache")
+        self.agent_cache.clear()
+        self.registry_marker.set("fingerprint", fingerprint)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """匹配缓存的命中率等统计（用于调整 MATCH_CACHE_TTL）"""
+        return self.agent_cache.get_stats()
 
     async def _retry_async(self, func, *args, **kwargs):
-        for attempt in range(RETRY_TIMES):
-            try:
-                return await func(*args, **kwargs)
-            except Exception as e:
-                if attempt == RETRY_TIMES - 1:
-                    raise e
-                logger.warning(f"Attempt {attempt+1} failed: {e}, retrying in {RETRY_DELAY}s...")
-                await asyncio.sleep(RETRY_DELAY)
-        return None
-
-    async def _find_agent_wrapper(self, session, description: str) -> Optional[AgentCard]:
-        """使用MCP Server的find_agent工具查找Agent"""
-        result = await find_agent(session, description)
-        if result and result.content:
-            text = result.content[0].text
-            cleaned_text = clean_response_str(text)
-            
-            # 检查是否为空响应
-            if not cleaned_text or cleaned_text.strip() == "":
-                logger.warning(f"Empty response from find_agent for: {description[:50]}")
-                return None
-            
-            try:
-                agent_card_json = json.loads(cleaned_text)
-                agent_card = AgentCard(**agent_card_json)
+        """按进程级弹性策略重试（指数退避 + 全局重试预算，不可重试的错误直接抛出）"""
+        return await get_resilience_controller().call(func, *args, **kwargs)
+
+    async def _find_agents_wrapper(self, descriptions: List[str]) -> Dict[str, Optional[AgentCard]]:
+        """使用MCP Server的find_agents工具一次为多个描述查找Agent"""
+        found = await self.sessions.find_agents(descriptions)
+        for description, agent_card in found.items():
+            if agent_card:
                 self._set_cached_agent(description, agent_card)
-                return agent_card
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse agent card JSON: {e}. Text: {cleaned_text[:100]}")
-                return None
-        return None
+        return found
     
-    async def _get_all_agents(self, session) -> List[Dict]:
-        """获取所有可用的Agent信息"""
+    async def _get_all_agents(self) -> List[Dict]:
+        """获取所有可用的Agent信息（注册表未变化时使用会话管理器的本地缓存）"""
         try:
-            result = await list_all_agents(session)
-            if result and result.content:
-                text = result.content[0].text
-                cleaned_text = clean_response_str(text)
-                agents = json.loads(cleaned_text)
-                return agents if isinstance(agents, list) else []
+            return await self.sessions.list_agents()
         except Exception as e:
             logger.warning(f"Failed to get all agents: {e}")
         return []
     
-    async def _llm_match_agent(self, session, description: str, all_agents: List[Dict]) -> Optional[AgentCard]:
+    def _format_agents_info(self, all_agents: List[Dict]) -> str:
+        """构建供LLM选择的Agent信息摘要"""
+        agents_info = []
+        for agent in all_agents:
+            agent_summary = f"- {agent.get('name', 'Unknown')}: {agent.get('description', '')}"
+            skills = agent.get('skills', [])
+            if skills:
+                tags = []
+                for skill in skills:
+                    tags.extend(skill.get('tags', []))
+                agent_summary += f" (关键词: {', '.join(tags[:5])})"
+            agents_info.append(agent_summary)
+        return "\n".join(agents_info)
+
+    async def _llm_batch_match(self, descriptions: Dict[int, str], all_agents: List[Dict]) -> Dict[int, AgentCard]:
+        """
+        批量LLM匹配：一次调用为多个任务选择Agent
+
+        Args:
+            descriptions: {step_id: 任务描述}
+            all_agents: 所有可用Agent
+
+        Returns:
+            {step_id: AgentCard}，未能匹配的step_id不在结果中
+        """
+        matched: Dict[int, AgentCard] = {}
+        try:
+            tasks_text = "\n".join(f"{step_id}: {desc}" for step_id, desc in descriptions.items())
+            logger.info(f"🤖 Using LLM to batch match agents for {len(descriptions)} tasks...")
+            match_result = await self.batch_match_chain.ainvoke({
+                "tasks": tasks_text,
+                "agents_info": self._format_agents_info(all_agents)
+            })
+
+            agents_by_name = {agent.get('name'): agent for agent in all_agents}
+            for item in match_result.get("assignments", []):
+                try:
+                    step_id = int(item.get("step_id"))
+                except (TypeError, ValueError):
+                    continue
+                selected_name = item.get("selected_agent", "")
+                if step_id not in descriptions:
+                    continue
+                if selected_name not in agents_by_name:
+                    logger.warning(f"LLM selected agent '{selected_name}' not found in agent list (step {step_id})")
+                    continue
+                agent_card = self.sessions.agent_card(agents_by_name[selected_name])
+                self._set_cached_agent(descriptions[step_id], agent_card)
+                matched[step_id] = agent_card
+                logger.info(f"🎯 LLM selected for step {step_id}: {selected_name} (Reason: {item.get('reason', '')})")
+        except Exception as e:
+            logger.error(f"LLM batch matching failed: {e}")
+        return matched
+
+    async def _llm_match_agent(self, description: str, all_agents: List[Dict]) -> Optional[AgentCard]:
         """使用LLM智能匹配Agent"""
         try:
-            # 构建Agent信息摘要
-            agents_info = []
-            for agent in all_agents:
-                agent_summary = f"- {agent.get('name', 'Unknown')}: {agent.get('description', '')}"
-                skills = agent.get('skills', [])
-                if skills:
-                    tags = []
-                    for skill in skills:
-                        tags.extend(skill.get('tags', []))
-                    agent_summary += f" (关键词: {', '.join(tags[:5])})"
-                agents_info.append(agent_summary)
-            
-            agents_text = "\n".join(agents_info)
-            
+            agents_text = self._format_agents_info(all_agents)
+
             # 调用LLM进行匹配
             logger.info(f"🤖 Using LLM to match agent for: {description[:50]}...")
             match_result = await self.match_chain.ainvoke({
@@ -150,7 +272,7 @@ class CapabilityMatcherLayer:
             # 根据名称找到对应的Agent卡片
             for agent in all_agents:
                 if agent.get('name') == selected_name:
-                    agent_card = AgentCard(**agent)
+                    agent_card = self.sessions.agent_card(agent)
                     self._set_cached_agent(description, agent_card)
                     return agent_card
             
@@ -161,56 +283,147 @@ class CapabilityMatcherLayer:
             logger.error(f"LLM matching failed: {e}")
             return None
 
-    async def match_agents(self, plan: ExecutionPlan, use_llm: bool = True) -> ExecutionPlan:
+    def _get_local_index(self, all_agents: List[Dict]) -> Optional[LocalCapabilityIndex]:
+        """获取本地索引，注册表内容变化时重建"""
+        if not (self.matcher_config.local and local_matcher.is_available() and all_agents):
+            return None
+        fingerprint = LocalCapabilityIndex.registry_fingerprint(all_agents)
+        if self.local_index is None or self.local_index.fingerprint != fingerprint:
+            self.local_index = LocalCapabilityIndex(
+                all_agents,
+                margin=self.matcher_config.local_margin,
+                min_score=self.matcher_config.local_min_score
+            )
+        return self.local_index
+
+    async def match_agents(self, plan: ExecutionPlan, use_llm: bool = True, mode: str = None) -> ExecutionPlan:
         """
         匹配Agent（增强版）
-        
+
+        描述相同的步骤只查找一次；未命中缓存的描述先由本地TF-IDF索引一次性打分，
+        得分足够确定的直接采用，其余的在并发上限内交给LLM匹配；
+        batch 模式下先用一次LLM调用为所有描述选择Agent。
+        LLM未能匹配的描述最后通过一次 find_agents 调用交给注册中心检索。
+
         Args:
             plan: 执行计划
             use_llm: 是否使用LLM辅助匹配（默认True）
+            mode: concurrent / batch，None使用配置
         """
-        logger.info(f"[bold blue]🔍 [Matcher] Starting agent discovery (LLM: {use_llm})[/bold blue] (trace_id: {plan.trace_id})...")
-        
+        mode = mode or self.matcher_config.mode
+        logger.info(f"[bold blue]🔍 [Matcher] Starting agent discovery (LLM: {use_llm}, mode: {mode})[/bold blue] (trace_id: {plan.trace_id})...")
+
+        # 按描述归并步骤，相同描述只匹配一次
+        groups: Dict[str, List[TaskStep]] = {}
+        for step in plan.steps:
+            groups.setdefault(step.description, []).append(step)
+
+        def _assign(description: str, agent_card: AgentCard, source: str):
+            for step in groups[description]:
+                step.assigned_agent = agent_card
+            agent_id = getattr(agent_card, 'id', getattr(agent_card, 'name', 'Unknown'))
+            step_ids = [s.step_id for s in groups[description]]
+            logger.info(f"  Step {step_ids}: ✅ [green]{source}:[/green] {agent_card.name} (ID: {agent_id})")
+
+        # 每次匹配都校验注册表版本（未变化时直接使用本地缓存的列表），
+        # 注册表变化时先清空匹配缓存，避免全部命中缓存时返回已下线的Agent
+        all_agents = await self._get_all_agents()
+        self._check_registry(all_agents)
+
+        # 检查缓存（含负缓存）
+        pending: List[str] = []
+        for description in groups:
+            hit, agent_card = self._lookup_cached_agent(description)
+            if agent_card and not self.health.is_agent_healthy(agent_card):
+                # 缓存的Agent当前不健康，重新匹配
+                logger.info(f"  ⚠️ Cached agent {agent_card.name} is unhealthy, re-matching '{description[:50]}'")
+                pending.append(description)
+            elif agent_card:
+                _assign(description, agent_card, "Cached Match")
+            elif hit:
+                step_ids = [s.step_id for s in groups[description]]
+                logger.warning(f"  Step {step_ids}: ❌ [red]No agent found[/red] (negative cache) for '[italic]{description}[/italic]'")
+            else:
+                pending.append(description)
+
+        if not pending:
+            return plan
+
         try:
-            async with init_session(self.config.host, self.config.port, self.config.transport) as session:
-                # 如果使用LLM，先获取所有Agent列表
-                all_agents = []
-                if use_llm:
-                    all_agents = await self._get_all_agents(session)
-                    logger.info(f"📋 Loaded {len(all_agents)} agents for LLM matching")
-                
-                for step in plan.steps:
-                    logger.info(f"  Step {step.step_id}: Searching for agent suitable for '[italic]{step.description}[/italic]'")
-                    
-                    # 检查缓存
-                    agent_card = self._get_cached_agent(step.description)
-                    if agent_card:
-                        step.assigned_agent = agent_card
-                        agent_id = getattr(step.assigned_agent, 'id', getattr(step.assigned_agent, 'name', 'Unknown'))
-                        logger.info(f"    ✅ [green]Cached Match:[/green] {step.assigned_agent.name} (ID: {agent_id})")
-                        continue
-                    
-                    try:
-                        # 优先使用LLM匹配
-                        if use_llm and all_agents:
-                            agent_card = await self._llm_match_agent(session, step.description, all_agents)
-                        
-                        # 如果LLM匹配失败，回退到传统匹配
-                        if not agent_card:
-                            logger.info(f"    🔄 Falling back to traditional matching...")
-                            agent_card = await self._retry_async(self._find_agent_wrapper, session, step.description)
-                        
+            if use_llm or self.matcher_config.local:
+                logger.info(f"📋 Loaded {len(all_agents)} agents for matching")
+
+                # 注册表中的Agent纳入后台健康监测，已判定不健康的不参与匹配（全部不健康时保留全部）
+                self.health.watch_agents(all_agents)
+                self.health.start()
+                healthy = [agent for agent in all_agents if self.health.is_agent_healthy(agent)]
+                if healthy and len(healthy) < len(all_agents):
+                    skipped = [agent.get('name') for agent in all_agents if agent not in healthy]
+                    logger.info(f"⚠️ Skipping unhealthy agents: {', '.join(map(str, skipped))}")
+                    all_agents = healthy
+
+            # 本地索引：一次矩阵运算为所有描述打分，只有不确定的描述才需要LLM
+            local_index = self._get_local_index(all_agents)
+            if local_index and pending:
+                resolved = set()
+                for match in local_index.match(pending):
+                    runner_up = match.runner_up.get('name') if match.runner_up else None
+                    if match.confident:
+                        agent_card = self.sessions.agent_card(match.agent)
+                        self._set_cached_agent(match.description, agent_card)
+                        _assign(match.description, agent_card, f"Local Match ({match.score:.2f})")
+                        resolved.add(match.description)
+                    else:
+                        logger.info(
+                            f"  ⚖️ Ambiguous local match for '{match.description[:50]}': "
+                            f"{match.agent['name']} ({match.score:.2f}) vs {runner_up} ({match.runner_up_score:.2f})"
+                        )
+                pending = [desc for desc in pending if desc not in resolved]
+
+            # batch模式：一次LLM调用匹配所有未缓存的描述（以组内第一个step_id标识）
+            if mode == "batch" and use_llm and all_agents:
+                keyed = {groups[desc][0].step_id: desc for desc in pending}
+                matched = await self._llm_batch_match(keyed, all_agents)
+                for step_id, agent_card in matched.items():
+                    _assign(keyed[step_id], agent_card, "Batch Match")
+                pending = [desc for desc in pending if groups[desc][0].step_id not in matched]
+                # LLM已经为这些描述选择过一次，剩余的直接回退到find_agent
+                use_llm = False
+
+            # 并发LLM匹配剩余描述
+            if use_llm and all_agents and pending:
+                pool = BoundedTaskPool(self.matcher_config.max_concurrency)
+                results = await pool.map(
+                    [self._llm_match_agent(desc, all_agents) for desc in pending],
+                    return_exceptions=True
+                )
+                for description, result in zip(pending, results):
+                    if isinstance(result, AgentCard):
+                        _assign(description, result, "Found")
+                pending = [
+                    desc for desc, result in zip(pending, results) if not isinstance(result, AgentCard)
+                ]
+
+            # 回退到传统匹配：所有剩余描述合并为一次find_agents调用
+            if pending:
+                logger.info(f"    🔄 Falling back to traditional matching for {len(pending)} description(s)...")
+                try:
+                    found = await self._retry_async(self._find_agents_wrapper, pending)
+                except Exception as e:
+                    step_ids = [s.step_id for desc in pending for s in groups[desc]]
+                    logger.error(f"    ⚠️ Error finding agent for steps {step_ids}: {e}")
+                else:
+                    for description in pending:
+                        agent_card = found.get(description)
                         if agent_card:
-                            step.assigned_agent = agent_card
-                            agent_id = getattr(step.assigned_agent, 'id', getattr(step.assigned_agent, 'name', 'Unknown'))
-                            logger.info(f"    ✅ [green]Found:[/green] {step.assigned_agent.name} (ID: {agent_id})")
+                            _assign(description, agent_card, "Found")
                         else:
-                            logger.warning(f"    ❌ [red]No agent found[/red]")
-                    except Exception as e:
-                        logger.error(f"    ⚠️ Error finding agent for step {step.step_id}: {e}")
+                            step_ids = [s.step_id for s in groups[description]]
+                            self._set_negative_cache(description)
+                            logger.warning(f"  Step {step_ids}: ❌ [red]No agent found[/red] for '[italic]{description}[/italic]'")
         except Exception as e:
             import traceback
-            logger.error(f"Failed to initialize MCP session: {e}")
+            logger.error(f"Agent matching via MCP failed: {e}")
             logger.error(traceback.format_exc())
-                    
+
         return plan
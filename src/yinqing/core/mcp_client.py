@@ -1,15 +1,27 @@
 import os
+import json
+import shlex
+import importlib
+import time
+import asyncio
 from contextlib import asynccontextmanager
+from dataclasses import astuple
+from typing import Any, Dict, List, Optional, Tuple
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
-from mcp.types import CallToolResult
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from mcp.types import METHOD_NOT_FOUND, CallToolResult, ErrorData, TextContent
+from yinqing.core.types import AgentCard
+from yinqing.utils.config import MCPServerConfig, get_mcp_server_config, get_mcp_registry_configs
 from yinqing.utils.logger import get_logger
+from yinqing.utils.common import clean_response_str
 
 logger = get_logger(__name__)
 
 @asynccontextmanager
-async def init_session(host, port, transport):
+async def init_session(host, port, transport, command: str = None):
     if transport == 'sse':
         url = f'http://{host}:{port}/sse'
         async with sse_client(url) as (read_stream, write_stream):
@@ -18,12 +30,22 @@ async def init_session(host, port, transport):
             ) as session:
                 await session.initialize()
                 yield session
+    elif transport in ('http', 'streamable-http'):
+        # Streamable HTTP：每次调用是一次普通的 HTTP 请求，底层 httpx 连接在会话生命周期内复用
+        url = f'http://{host}:{port}/mcp'
+        async with streamablehttp_client(url) as (read_stream, write_stream, _get_session_id):
+            async with ClientSession(
+                read_stream=read_stream, write_stream=write_stream
+            ) as session:
+                await session.initialize()
+                yield session
     elif transport == 'stdio':
-        # Assuming we want to run the server in the same env
+        # 以子进程方式启动注册中心服务端（继承当前环境变量）
         env = os.environ.copy()
+        argv = shlex.split(command or get_mcp_server_config().stdio_command)
         stdio_params = StdioServerParameters(
-            command='uv',
-            args=['run', 'a2a-mcp'], # This might need adjustment based on how user runs the server
+            command=argv[0],
+            args=argv[1:],
             env=env,
         )
         async with stdio_client(stdio_params) as (read_stream, write_stream):
@@ -34,6 +56,7 @@ async def init_session(host, port, transport):
                 await session.initialize()
                 yield session
     else:
+        # inprocess 不建立 MCP 会话，由 InProcessRegistrySession 直接调用注册中心函数
         raise ValueError(f"Unsupported transport type: {transport}")
 
 async def find_agent(session: ClientSession, query: str) -> CallToolResult:
@@ -51,3 +74,635 @@ async def list_all_agents(session: ClientSession) -> CallToolResult:
         name='list_all_agents',
         arguments={},
     )
+
+
+async def registry_version(session: ClientSession) -> CallToolResult:
+    return await session.call_tool(
+        name='registry_version',
+        arguments={},
+    )
+
+
+class _PooledConnection:
+    """连接池中的一个槽位：一个后台任务持有的一个 MCP 会话（stdio 下即一个服务端子进程）"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.ready = asyncio.Event()
+        self.reconnect = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.in_flight = 0
+        self.connects = 0
+
+
+class MCPSessionManager:
+    """
+    长连接的 MCP 会话管理器
+
+    - 后台任务持有会话（SSE/stdio 的上下文必须在同一个任务中进入和退出），
+      定期 ping 检查健康，断开或子进程退出后按指数退避自动重连/重启
+    - 所有工作流共享这些会话，请求在会话上并发复用；stdio 传输下维护
+      stdio_pool_size 个常驻服务端子进程，每次调用选择在途请求最少的一个
+    - Agent 注册表列表在本地缓存，通过 registry_version 工具判断是否变化，
+      未变化时不再重新传输；服务端不支持该工具时按 registry_ttl 过期
+    """
+
+    def __init__(self, config: MCPServerConfig = None):
+        self.config = config or get_mcp_server_config()
+        # SSE 会话本身支持并发请求，只需一个连接；stdio 子进程按池大小启动
+        self.pool_size = max(1, self.config.stdio_pool_size) if self.config.transport == "stdio" else 1
+        self._connections: List[_PooledConnection] = []
+        self._any_ready: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        self._registry_lock: Optional[asyncio.Lock] = None
+
+        # 注册表缓存
+        self._registry: Optional[List[Dict[str, Any]]] = None
+        self._registry_version: Optional[str] = None
+        self._registry_fetched_at = 0.0
+        self._supports_version = True
+        self._supports_batch = True
+        self._cards: Dict[str, AgentCard] = {}
+        self._card_sources: Dict[str, Dict[str, Any]] = {}  # 名称 -> 解析该 AgentCard 所用的卡片字典
+
+        # 统计
+        self.connects = 0
+        self.connect_failures = 0
+        self.ping_failures = 0
+        self.registry_hits = 0
+        self.registry_fetches = 0
+
+    # ---------- 会话生命周期 ----------
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 新的事件循环（例如多次 asyncio.run），旧循环上的会话已不可用
+            self._loop = loop
+            self._connections = [_PooledConnection(i) for i in range(self.pool_size)]
+            self._any_ready = asyncio.Condition()
+            self._registry_lock = asyncio.Lock()
+        self._closing = False
+        for conn in self._connections:
+            if conn.task is None or conn.task.done():
+                conn.task = asyncio.create_task(self._run(conn), name=f"mcp-session-{conn.index}")
+
+    async def _notify_ready(self):
+        async with self._any_ready:
+            self._any_ready.notify_all()
+
+    async def _run(self, conn: _PooledConnection):
+        """后台任务：建立会话、保持心跳，断开后重连"""
+        backoff = 1.0
+        while not self._closing:
+            try:
+                async with init_session(
+                    self.config.host, self.config.port, self.config.transport, self.config.stdio_command
+                ) as session:
+                    conn.session = session
+                    conn.connects += 1
+                    self.connects += 1
+                    backoff = 1.0
+                    conn.ready.set()
+                    await self._notify_ready()
+                    logger.info(f"[MCP] Session #{conn.index} established ({self._describe_server()})")
+                    await self._keepalive(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connect_failures += 1
+                logger.warning(f"[MCP] Session #{conn.index} error: {e}, reconnecting in {backoff:.0f}s...")
+            finally:
+                conn.session = None
+                conn.ready.clear()
+
+            if not self._closing:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def _keepalive(self, conn: _PooledConnection):
+        """定期 ping，失败或收到重连请求时返回（退出会话上下文，stdio 下即重启子进程）"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(conn.reconnect.wait(), timeout=self.config.ping_interval)
+                conn.reconnect.clear()
+                logger.info(f"[MCP] Session #{conn.index} reconnect requested")
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(conn.session.send_ping(), timeout=self.config.connect_timeout)
+            except Exception as e:
+                self.ping_failures += 1
+                logger.warning(f"[MCP] Session #{conn.index} ping failed: {e}")
+                return
+
+    def _describe_server(self) -> str:
+        if self.config.transport == "stdio":
+            return f"stdio: {self.config.stdio_command}"
+        return f"{self.config.transport}://{self.config.host}:{self.config.port}"
+
+    def _pick_connection(self) -> Optional[_PooledConnection]:
+        ready = [conn for conn in self._connections if conn.ready.is_set() and conn.session is not None]
+        if not ready:
+            return None
+        return min(ready, key=lambda conn: conn.in_flight)
+
+    async def _acquire_connection(self) -> _PooledConnection:
+        """获取在途请求最少的可用连接，全部不可用时等待（超过 connect_timeout 抛出 ConnectionError）"""
+        self._ensure_started()
+
+        async def _wait():
+            async with self._any_ready:
+                await self._any_ready.wait_for(lambda: self._pick_connection() is not None)
+
+        if self._pick_connection() is None:
+            try:
+                await asyncio.wait_for(_wait(), timeout=self.config.connect_timeout)
+            except asyncio.TimeoutError:
+                raise ConnectionError(
+                    f"MCP server ({self._describe_server()}) not reachable "
+                    f"within {self.config.connect_timeout}s"
+                )
+        return self._pick_connection()
+
+    async def get_session(self) -> ClientSession:
+        """获取一个可用的共享会话"""
+        return (await self._acquire_connection()).session
+
+    def request_reconnect(self, conn: _PooledConnection = None):
+        """标记会话不可用（默认全部），后台任务会重新建立连接"""
+        for target in ([conn] if conn else self._connections):
+            if target.session is not None:
+                target.ready.clear()
+                target.reconnect.set()
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any] = None) -> CallToolResult:
+        """在共享会话上调用工具；连接异常时重连该会话并在其他会话上重试一次"""
+        for attempt in range(2):
+            conn = await self._acquire_connection()
+            conn.in_flight += 1
+            try:
+                return await asyncio.wait_for(
+                    conn.session.call_tool(name=name, arguments=arguments or {}),
+                    timeout=self.config.call_timeout
+                )
+            except McpError:
+                # 协议层错误（如工具不存在），重连也无济于事
+                raise
+            except Exception as e:
+                if attempt == 1:
+                    raise
+                logger.warning(f"[MCP] Call '{name}' failed on session #{conn.index}: {e}, reconnecting...")
+                self.request_reconnect(conn)
+            finally:
+                conn.in_flight -= 1
+        return None
+
+    async def aclose(self):
+        """关闭会话和后台任务（stdio 下同时结束服务端子进程）"""
+        self._closing = True
+        if self._loop is asyncio.get_running_loop():
+            tasks = [conn.task for conn in self._connections if conn.task and not conn.task.done()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for conn in self._connections:
+            conn.task = None
+            conn.session = None
+
+    # ---------- 注册表 ----------
+
+    @staticmethod
+    def _result_text(result: Optional[CallToolResult]) -> str:
+        if result and result.content:
+            return clean_response_str(result.content[0].text)
+        return ""
+
+    async def _fetch_registry_version(self) -> Optional[str]:
+        """获取服务端注册表版本，服务端不支持时返回None"""
+        if not self._supports_version:
+            return None
+        try:
+            result = await self.call_tool("registry_version")
+        except McpError:
+            result = None
+        if result is None or result.isError:
+            logger.info("[MCP] Server has no 'registry_version' tool, falling back to TTL for registry cache")
+            self._supports_version = False
+            return None
+        try:
+            return json.loads(self._result_text(result)).get("version")
+        except (json.JSONDecodeError, AttributeError):
+            return None
+
+    async def _fetch_agents(self) -> List[Dict[str, Any]]:
+        """从服务端拉取完整的Agent列表"""
+        result = await self.call_tool("list_all_agents")
+        agents = json.loads(self._result_text(result) or "[]")
+        return agents if isinstance(agents, list) else []
+
+    async def _search_agent(self, query: str) -> Optional[Dict[str, Any]]:
+        """调用服务端的 find_agent 工具，返回卡片字典"""
+        result = await self.call_tool("find_agent", {"query": query})
+        text = self._result_text(result)
+        if not text.strip():
+            logger.warning(f"Empty response from find_agent for: {query[:50]}")
+            return None
+        try:
+            card = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse agent card JSON: {e}. Text: {text[:100]}")
+            return None
+        return card if isinstance(card, dict) else None
+
+    async def _search_agents(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """调用服务端的 search_agents 工具，返回 [{"score": ..., "agent": card}]"""
+        result = await self.call_tool("search_agents", arguments)
+        if result is None or result.isError:
+            raise McpError(ErrorData(code=METHOD_NOT_FOUND, message="Server has no 'search_agents' tool"))
+        ranked = json.loads(self._result_text(result) or "[]")
+        return ranked if isinstance(ranked, list) else []
+
+    async def _search_agents_batch(self, queries: List[str], top_k: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """调用服务端的 find_agents 工具，服务端不支持时返回None"""
+        if not self._supports_batch:
+            return None
+        try:
+            result = await self.call_tool("find_agents", {"queries": queries, "top_k": top_k})
+        except McpError:
+            result = None
+        if result is None or result.isError:
+            logger.info("[MCP] Server has no 'find_agents' tool, falling back to one find_agent call per query")
+            self._supports_batch = False
+            return None
+        ranked = json.loads(self._result_text(result) or "[]")
+        return ranked if isinstance(ranked, list) else []
+
+    def _index_cards(self, agents: List[Dict[str, Any]]):
+        """按名称解析并缓存 AgentCard，注册表版本不变时匹配器直接复用同一批对象"""
+        cards: Dict[str, AgentCard] = {}
+        sources: Dict[str, Dict[str, Any]] = {}
+        for agent in agents:
+            try:
+                cards[agent.get("name")] = AgentCard(**agent)
+                sources[agent.get("name")] = agent
+            except Exception as e:
+                logger.warning(f"[MCP] Invalid agent card '{agent.get('name')}': {e}")
+        self._cards = cards
+        self._card_sources = sources
+
+    def agent_card(self, agent: Dict[str, Any]) -> AgentCard:
+        """返回注册表中已解析的 AgentCard；卡片内容与索引不同时校验一次并替换索引中的对象"""
+        name = agent.get("name")
+        card = self._cards.get(name)
+        if card is not None and self._card_sources.get(name) == agent:
+            return card
+        card = AgentCard(**agent)
+        self._cards[name] = card
+        self._card_sources[name] = agent
+        return card
+
+    async def find_agent(self, query: str) -> Optional[AgentCard]:
+        """使用注册中心的 find_agent 为查询选择Agent"""
+        logger.info(f"Calling 'find_agent' tool with query: '{query[:50]}...'")
+        agent = await self._search_agent(query)
+        return self.agent_card(agent) if agent else None
+
+    async def rank_agents(self, queries: List[str], top_k: int = 1) -> Dict[str, List[Tuple[float, AgentCard]]]:
+        """
+        一次调用为多个查询检索候选Agent
+
+        Returns:
+            {query: [(score, AgentCard)]}，按得分从高到低排列；服务端不支持 find_agents 时
+            退回逐个 find_agent，得分记为 0
+        """
+        if not queries:
+            return {}
+        logger.info(f"Calling 'find_agents' tool with {len(queries)} queries")
+        ranked = await self._search_agents_batch(queries, top_k)
+        if ranked is None:
+            cards = await asyncio.gather(*(self.find_agent(query) for query in queries))
+            return {query: [(0.0, card)] if card else [] for query, card in zip(queries, cards)}
+
+        results: Dict[str, List[Tuple[float, AgentCard]]] = {query: [] for query in queries}
+        for item in ranked:
+            if item.get("query") in results:
+                results[item["query"]] = [
+                    (match["score"], self.agent_card(match["agent"])) for match in item.get("matches") or []
+                ]
+        return results
+
+    async def find_agents(self, queries: List[str]) -> Dict[str, Optional[AgentCard]]:
+        """
+        一次调用为多个查询选择Agent
+
+        Returns:
+            {query: AgentCard}，未找到的查询对应None
+        """
+        ranked = await self.rank_agents(queries)
+        return {query: matches[0][1] if matches else None for query, matches in ranked.items()}
+
+    async def search_agents(
+        self, query: str, top_k: int = 5, min_score: Optional[float] = None
+    ) -> List[Tuple[float, AgentCard]]:
+        """
+        按相关度返回前 top_k 个候选Agent
+
+        Args:
+            query: 任务描述
+            top_k: 最大候选数
+            min_score: 最低得分，None 表示使用服务端默认值
+
+        Returns:
+            [(score, AgentCard)]，按得分从高到低排列
+        """
+        arguments: Dict[str, Any] = {"query": query, "top_k": top_k}
+        if min_score is not None:
+            arguments["min_score"] = min_score
+        ranked = await self._search_agents(arguments)
+        return [(item["score"], self.agent_card(item["agent"])) for item in ranked]
+
+    async def list_agents(self, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        获取所有Agent卡片（带版本校验的本地缓存）
+
+        Args:
+            force: 忽略缓存，强制重新获取
+        """
+        self._ensure_started()
+        async with self._registry_lock:
+            version = await self._fetch_registry_version()
+            if self._registry is not None and not force:
+                if version is not None and version == self._registry_version:
+                    self.registry_hits += 1
+                    return self._registry
+                if version is None and time.time() - self._registry_fetched_at < self.config.registry_ttl:
+                    self.registry_hits += 1
+                    return self._registry
+
+            self._registry = await self._fetch_agents()
+            self._index_cards(self._registry)
+            self._registry_version = version
+            self._registry_fetched_at = time.time()
+            self.registry_fetches += 1
+            logger.info(f"[MCP] Registry loaded: {len(self._registry)} agents (version: {version or 'n/a'})")
+            return self._registry
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "server": self._describe_server(),
+            "connected": any(conn.session is not None for conn in self._connections),
+            "pool_size": self.pool_size,
+            "live_sessions": sum(1 for conn in self._connections if conn.session is not None),
+            "in_flight": [conn.in_flight for conn in self._connections],
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "ping_failures": self.ping_failures,
+            "registry_version": self._registry_version,
+            "registry_agents": len(self._registry) if self._registry is not None else None,
+            "registry_hits": self.registry_hits,
+            "registry_fetches": self.registry_fetches
+        }
+
+
+class InProcessRegistrySession(MCPSessionManager):
+    """
+    进程内注册中心（transport=inprocess），适用于注册中心与编排器部署在同一主机/进程
+
+    直接调用注册中心模块的函数，不经过网络和 JSON 序列化。AgentCard 由注册中心按卡片文件
+    解析一次并缓存（load_agent_card_objects / search_agent_card_objects），匹配器直接共享这些
+    只读对象，不再逐个重新校验。对外接口与 MCPSessionManager 一致，切换 MCP_SERVER_TRANSPORT 即可
+    """
+
+    # MCP 工具名 -> 注册中心模块中的实现函数
+    TOOLS = {
+        "list_all_agents": "load_agent_cards",
+        "find_agent": "search_agent_card",
+        "find_agents": "search_agent_cards_batch",
+        "search_agents": "search_agent_cards",
+        "registry_version": "get_registry_version",
+    }
+
+    def __init__(self, config: MCPServerConfig = None):
+        super().__init__(config)
+        self.pool_size = 0
+        self._registry_module = None
+        self._parsed_cards: Dict[str, AgentCard] = {}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._registry_lock = asyncio.Lock()
+        if self._registry_module is None:
+            try:
+                self._registry_module = importlib.import_module(self.config.inprocess_module)
+            except ImportError as e:
+                self.connect_failures += 1
+                raise ConnectionError(f"Registry module '{self.config.inprocess_module}' not importable: {e}")
+            self.connects += 1
+            logger.info(f"[MCP] Using in-process registry ({self.config.inprocess_module})")
+        self._closing = False
+
+    def _describe_server(self) -> str:
+        return f"inprocess: {self.config.inprocess_module}"
+
+    async def _call_registry(self, func_name: str, **kwargs) -> Any:
+        """在线程中调用注册中心函数（卡片目录变化时其实现会重新读取文件）"""
+        self._ensure_started()
+        return await asyncio.to_thread(getattr(self._registry_module, func_name), **kwargs)
+
+    async def get_session(self) -> "InProcessRegistrySession":
+        """进程内没有 MCP 会话：返回自身，其 call_tool(name, arguments) 与 ClientSession 用法一致"""
+        self._ensure_started()
+        return self
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any] = None) -> CallToolResult:
+        """与远程调用相同的返回格式（JSON 文本），供按工具名调用的代码使用"""
+        if name not in self.TOOLS:
+            return CallToolResult(content=[TextContent(type="text", text=f"Unknown tool: {name}")], isError=True)
+        value = await self._call_registry(self.TOOLS[name], **(arguments or {}))
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(value, ensure_ascii=False))])
+
+    async def _fetch_registry_version(self) -> Optional[str]:
+        return (await self._call_registry("get_registry_version")).get("version")
+
+    async def _fetch_agents(self) -> List[Dict[str, Any]]:
+        agents = await self._call_registry("load_agent_cards")
+        self._parsed_cards = await self._call_registry("load_agent_card_objects", factory=AgentCard)
+        return agents
+
+    def _index_cards(self, agents: List[Dict[str, Any]]):
+        # 直接使用注册中心已解析的对象
+        self._cards = self._parsed_cards
+
+    def agent_card(self, agent: Dict[str, Any]) -> AgentCard:
+        """返回注册中心已解析的 AgentCard（匹配前 list_agents 都会校验版本，索引与当前注册表一致）"""
+        card = self._cards.get(agent.get("name"))
+        return card if card is not None else AgentCard(**agent)
+
+    async def _search_objects(
+        self, queries: List[str], top_k: int, min_score: Optional[float] = None
+    ) -> List[List[Tuple[float, AgentCard]]]:
+        kwargs: Dict[str, Any] = {"queries": queries, "factory": AgentCard, "top_k": top_k}
+        if min_score is not None:
+            kwargs["min_score"] = min_score
+        return await self._call_registry("search_agent_card_objects", **kwargs)
+
+    async def find_agent(self, query: str) -> Optional[AgentCard]:
+        return (await self.find_agents([query])).get(query)
+
+    async def rank_agents(self, queries: List[str], top_k: int = 1) -> Dict[str, List[Tuple[float, AgentCard]]]:
+        if not queries:
+            return {}
+        return dict(zip(queries, await self._search_objects(queries, top_k)))
+
+    async def search_agents(
+        self, query: str, top_k: int = 5, min_score: Optional[float] = None
+    ) -> List[Tuple[float, AgentCard]]:
+        return (await self._search_objects([query], top_k, min_score))[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["connected"] = self._registry_module is not None
+        return stats
+
+
+class FederatedRegistry:
+    """
+    联邦注册中心：同时查询多个 MCP 注册中心（例如每个团队一个）
+
+    - 每个注册中心使用各自的共享会话管理器，Agent 列表独立缓存（各自的版本校验）
+    - 查询并发发往所有注册中心，每个注册中心受 lookup_timeout 限制；
+      超时或出错的注册中心被跳过并计入统计，不影响其他注册中心的结果
+    - 候选按得分合并排序；同名 Agent 以配置中靠前的注册中心为准
+    - 对外接口与 MCPSessionManager 一致，匹配器无需区分
+    """
+
+    def __init__(self, configs: List[MCPServerConfig]):
+        self.members = [get_session_manager(config) for config in configs]
+        self.failures: Dict[str, int] = {self._name(member): 0 for member in self.members}
+        self._owners: Dict[str, MCPSessionManager] = {}
+
+    @staticmethod
+    def _name(member: MCPSessionManager) -> str:
+        return member.config.name or member._describe_server()
+
+    async def _gather(self, operation) -> List[Tuple[MCPSessionManager, Any]]:
+        """在所有注册中心上并发执行 operation(member)，返回成功的 (member, 结果)"""
+        async def _call(member):
+            return await asyncio.wait_for(operation(member), timeout=member.config.lookup_timeout)
+
+        results = await asyncio.gather(*(_call(member) for member in self.members), return_exceptions=True)
+        succeeded = []
+        for member, result in zip(self.members, results):
+            if isinstance(result, BaseException):
+                name = self._name(member)
+                self.failures[name] += 1
+                reason = "timed out" if isinstance(result, asyncio.TimeoutError) else str(result)
+                logger.warning(f"[MCP] Registry '{name}' skipped: {reason}")
+            else:
+                succeeded.append((member, result))
+        if not succeeded:
+            raise ConnectionError("No agent registry reachable")
+        return succeeded
+
+    async def list_agents(self, force: bool = False) -> List[Dict[str, Any]]:
+        """合并所有可用注册中心的Agent列表（按名称去重）"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        owners: Dict[str, MCPSessionManager] = {}
+        for member, agents in await self._gather(lambda m: m.list_agents(force=force)):
+            for agent in agents:
+                name = agent.get("name")
+                if name not in merged:
+                    merged[name] = agent
+                    owners[name] = member
+        self._owners = owners
+        return list(merged.values())
+
+    def agent_card(self, agent: Dict[str, Any]) -> AgentCard:
+        owner = self._owners.get(agent.get("name"))
+        return owner.agent_card(agent) if owner else AgentCard(**agent)
+
+    @staticmethod
+    def _merge(candidate_lists: List[List[Tuple[float, AgentCard]]], top_k: int) -> List[Tuple[float, AgentCard]]:
+        """按得分合并多个注册中心的候选，同名Agent只保留得分最高的一个"""
+        best: Dict[str, Tuple[float, AgentCard]] = {}
+        for candidates in candidate_lists:
+            for score, card in candidates:
+                if card.name not in best or score > best[card.name][0]:
+                    best[card.name] = (score, card)
+        return sorted(best.values(), key=lambda item: item[0], reverse=True)[:top_k]
+
+    async def rank_agents(self, queries: List[str], top_k: int = 1) -> Dict[str, List[Tuple[float, AgentCard]]]:
+        if not queries:
+            return {}
+        succeeded = await self._gather(lambda m: m.rank_agents(queries, top_k))
+        return {
+            query: self._merge([ranked.get(query, []) for _, ranked in succeeded], top_k)
+            for query in queries
+        }
+
+    async def find_agents(self, queries: List[str]) -> Dict[str, Optional[AgentCard]]:
+        ranked = await self.rank_agents(queries)
+        return {query: matches[0][1] if matches else None for query, matches in ranked.items()}
+
+    async def find_agent(self, query: str) -> Optional[AgentCard]:
+        return (await self.find_agents([query])).get(query)
+
+    async def search_agents(
+        self, query: str, top_k: int = 5, min_score: Optional[float] = None
+    ) -> List[Tuple[float, AgentCard]]:
+        succeeded = await self._gather(lambda m: m.search_agents(query, top_k=top_k, min_score=min_score))
+        return self._merge([candidates for _, candidates in succeeded], top_k)
+
+    async def aclose(self):
+        await asyncio.gather(*(member.aclose() for member in self.members), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "registries": [
+                {"name": self._name(member), "failures": self.failures[self._name(member)], **member.get_stats()}
+                for member in self.members
+            ]
+        }
+
+
+_session_managers: Dict[tuple, MCPSessionManager] = {}
+
+
+def get_session_manager(config: MCPServerConfig = None) -> MCPSessionManager:
+    """
+    获取进程级共享的会话管理器
+
+    按完整配置区分（名称、传输方式、地址、启动命令/模块、超时等），联邦查询中地址相同的
+    注册中心（如多个 inprocess/stdio 注册中心）各自拥有独立的管理器和Agent列表缓存
+    """
+    config = config or get_mcp_server_config()
+    key = astuple(config)
+    if key not in _session_managers:
+        manager_cls = InProcessRegistrySession if config.transport == "inprocess" else MCPSessionManager
+        _session_managers[key] = manager_cls(config)
+    return _session_managers[key]
+
+
+_federated_registry: Optional[FederatedRegistry] = None
+
+
+def get_registry_client():
+    """
+    获取匹配器使用的注册中心客户端
+
+    配置了多个注册中心（MCP_REGISTRIES）时返回进程级共享的 FederatedRegistry，
+    否则返回单个注册中心的会话管理器
+    """
+    global _federated_registry
+    configs = get_mcp_registry_configs()
+    if len(configs) == 1:
+        return get_session_manager(configs[0])
+    if _federated_registry is None:
+        _federated_registry = FederatedRegistry(configs)
+    return _federated_registry
@@ -1,11 +1,15 @@
 import os
+import hashlib
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from yinqing.core.types import ExecutionPlan
 from yinqing.utils.logger import get_logger
+from yinqing.utils.cache import TTLCache, create_cache, normalize_key
+from yinqing.utils.config import PlanCacheConfig, get_plan_cache_config
 
 # Load environment variables
 env_path = Path(__file__).parent.parent.parent.parent / '.env'
@@ -21,7 +25,7 @@ logger = get_logger(__name__)
 class TaskParserLayer:
     """大脑：负责将自然语言拆解为结构化步骤（支持并行依赖）"""
     
-    def __init__(self):
+    def __init__(self, plan_cache: TTLCache = None, cache_config: PlanCacheConfig = None):
         self.llm = ChatOpenAI(model=QWEN_MODEL, temperature=0.1, base_url=QWEN_BASE_URL, api_key=QWEN_API_KEY)
         self.parser = JsonOutputParser(pydantic_object=ExecutionPlan)
         
@@ -68,7 +72,74 @@ class TaskParserLayer:
         )
         self.chain = self.prompt | self.llm | self.parser
 
-    async def parse(self, query: str, context_id: str, task_id: str) -> ExecutionPlan:
+        # 计划缓存：相同（规范化后的）查询直接复用已校验的执行计划，跳过LLM调用
+        self.cache_config = cache_config or get_plan_cache_config()
+        self.plan_cache = plan_cache
+        if self.plan_cache is None and self.cache_config.enabled:
+            self.plan_cache = create_cache(
+                backend=self.cache_config.backend,
+                namespace="plans",
+                max_entries=self.cache_config.max_entries,
+                ttl=self.cache_config.ttl,
+                path=self.cache_config.path
+            )
+        # 模型或Prompt变化后旧计划自动失效
+        self._cache_version = hashlib.sha256(
+            f"{QWEN_MODEL}\n{self.prompt.messages[0].prompt.template}".encode("utf-8")
+        ).hexdigest()[:16]
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """规范化查询：全角转半角、统一大小写、合并空白"""
+        return normalize_key(query)
+
+    def _plan_cache_key(self, query: str) -> str:
+        normalized = self.normalize_query(query)
+        return hashlib.sha256(f"{self._cache_version}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _plan_from_cache(self, query: str, context_id: str, task_id: str) -> Optional[ExecutionPlan]:
+        """从缓存构造新的执行计划（新的trace_id和运行时状态）"""
+        cached = self.plan_cache.get(self._plan_cache_key(query))
+        if cached is None:
+            return None
+        plan = ExecutionPlan(**cached)
+        plan.task_id = task_id
+        plan.context_id = context_id
+        plan.cache_hit = True
+        plan.init_dag()
+        return plan
+
+    def _store_plan(self, query: str, plan: ExecutionPlan):
+        """只缓存计划结构（目标、步骤、依赖、上下文键），不含运行时状态"""
+        self.plan_cache.set(self._plan_cache_key(query), {
+            "goal": plan.goal,
+            "steps": [
+                step.model_dump(include={"step_id", "name", "description", "context_keys", "dependencies"})
+                for step in plan.steps
+            ]
+        })
+
+    def invalidate_plan(self, query: str):
+        """删除查询对应的缓存计划"""
+        if self.plan_cache is not None:
+            self.plan_cache.delete(self._plan_cache_key(query))
+
+    async def parse(self, query: str, context_id: str, task_id: str, use_cache: bool = True) -> ExecutionPlan:
+        """
+        将查询拆解为执行计划
+
+        Args:
+            query: 用户查询
+            context_id: 上下文ID
+            task_id: 任务ID
+            use_cache: 是否读取计划缓存（False时强制重新规划，新计划仍会写入缓存）
+        """
+        if use_cache and self.plan_cache is not None:
+            plan = self._plan_from_cache(query, context_id, task_id)
+            if plan:
+                logger.info(f"[bold green]🧠 [Parser] Plan Cache Hit[/bold green] ({len(plan.steps)} steps, trace_id: {plan.trace_id})")
+                return plan
+
         logger.info(f"🧠 [Parser] Analyzing query: {query}")
         try:
             response = await self.chain.ainvoke({
@@ -88,6 +159,9 @@ class TaskParserLayer:
             # 检测循环依赖
             if plan.check_cycle():
                 raise ValueError("Execution plan contains circular dependencies!")
+
+            if self.plan_cache is not None:
+                self._store_plan(query, plan)
             
             # 详细日志输出
             logger.info(f"[bold green]🧠 [Parser] Plan Generated[/bold green] (trace_id: {plan.trace_id}):")
@@ -0,0 +1,124 @@
+"""
+滑动窗口执行池 (Bounded Task Pool)
+以信号量控制并发：始终保持最多 max_parallel 个Agent调用在途，
+任一槽位空闲时立即拉取下一个等待中的任务，并统计每个槽位的利用率
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BoundedTaskPool:
+    """
+    滑动窗口执行池
+
+    与按块 gather 不同，某个调用完成后空出的槽位会立刻被下一个任务占用，
+    不会等待同一块中最慢的调用。
+    """
+
+    def __init__(self, max_parallel: int = 5):
+        """
+        Args:
+            max_parallel: 最大在途调用数（槽位数）
+        """
+        self.max_parallel = max(1, max_parallel)
+        self._semaphore = asyncio.Semaphore(self.max_parallel)
+        self._free_slots: List[int] = list(range(self.max_parallel))
+
+        # 槽位统计
+        self._slot_busy_time: List[float] = [0.0] * self.max_parallel
+        self._slot_task_count: List[int] = [0] * self.max_parallel
+        self._first_start: Optional[float] = None
+        self._last_end: Optional[float] = None
+        self._in_flight = 0
+
+    async def run(self, coro: Awaitable) -> Any:
+        """占用一个槽位执行协程，槽位已满时排队等待"""
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            # 排队期间被取消：关闭未启动的协程，避免 "never awaited" 警告
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise
+
+        slot = self._free_slots.pop(0)
+        started = time.perf_counter()
+        if self._first_start is None:
+            self._first_start = started
+        self._in_flight += 1
+        try:
+            return await coro
+        finally:
+            ended = time.perf_counter()
+            self._in_flight -= 1
+            self._slot_busy_time[slot] += ended - started
+            self._slot_task_count[slot] += 1
+            self._last_end = ended
+            self._free_slots.append(slot)
+            self._semaphore.release()
+
+    async def map(self, coros: List[Awaitable], return_exceptions: bool = True) -> List[Any]:
+        """
+        在池中执行一组协程，结果顺序与输入一致
+
+        Args:
+            coros: 待执行的协程列表
+            return_exceptions: True 时单个失败不影响其他任务；False 时首个异常会终止其余任务
+        """
+        tasks = [asyncio.create_task(self.run(coro)) for coro in coros]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @property
+    def in_flight(self) -> int:
+        """当前在途调用数"""
+        return self._in_flight
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行池统计信息（每个槽位的任务数、忙碌时间和利用率）"""
+        elapsed = 0.0
+        if self._first_start is not None and self._last_end is not None:
+            elapsed = self._last_end - self._first_start
+
+        slots = []
+        for slot in range(self.max_parallel):
+            busy = self._slot_busy_time[slot]
+            slots.append({
+                "slot": slot,
+                "tasks": self._slot_task_count[slot],
+                "busy_time": round(busy, 3),
+                "utilization": round(busy / elapsed, 3) if elapsed > 0 else 0.0
+            })
+
+        return {
+            "max_parallel": self.max_parallel,
+            "completed": sum(self._slot_task_count),
+            "elapsed": round(elapsed, 3),
+            "avg_utilization": round(
+                sum(s["utilization"] for s in slots) / self.max_parallel, 3
+            ),
+            "slots": slots
+        }
+
+    def log_stats(self, label: str = "Pool"):
+        """输出槽位利用率日志"""
+        stats = self.get_stats()
+        if not stats["completed"]:
+            return
+        per_slot = ", ".join(
+            f"#{s['slot']}:{s['utilization']:.0%}({s['tasks']})" for s in stats["slots"]
+        )
+        logger.info(
+            f"📊 [{label}] {stats['completed']} calls in {stats['elapsed']:.2f}s, "
+            f"avg utilization {stats['avg_utilization']:.0%} [{per_slot}]"
+        )
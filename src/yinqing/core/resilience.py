@@ -0,0 +1,295 @@
+"""
+调用弹性控制 (Resilience)
+区分可重试与不可重试的错误，按指数退避（带抖动）重试，用全局重试预算限制重试放大，
+并按Agent端点熔断：连续失败的端点在冷却期内直接快速失败，冷却后放行少量探测请求
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from yinqing.core.admission import AdmissionTimeoutError
+from yinqing.utils.config import ResilienceConfig, get_resilience_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 这些HTTP状态码表示暂时性问题，重试可能成功
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """端点熔断中，调用被直接拒绝"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit open for {endpoint}, retry after {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    判断错误是否值得重试
+
+    - 超时、连接失败等传输错误，以及 408/429/5xx 响应：可重试
+    - 其他 4xx 响应、参数/解析错误、熔断和准入超时：不可重试（重试只会得到相同结果或继续加压）
+    """
+    if isinstance(error, (CircuitOpenError, AdmissionTimeoutError)):
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return False
+    return True
+
+
+def counts_as_failure(error: BaseException) -> bool:
+    """错误是否说明端点本身不健康（计入熔断）；4xx 等请求错误不计入"""
+    if isinstance(error, (CircuitOpenError, AdmissionTimeoutError)):
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code in (408, 429)
+    return is_retryable(error)
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器
+
+    closed: 正常放行，连续失败达到 failure_threshold 后转为 open
+    open: 直接拒绝，reset_timeout 秒后转为 half_open
+    half_open: 最多放行 half_open_max_calls 个探测请求，成功则 closed，失败则重新 open
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int):
+        self.endpoint = endpoint
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+
+        # 统计
+        self.opens = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """调用前检查，熔断中抛出 CircuitOpenError"""
+        if self.state == "open":
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.endpoint, self.reset_timeout - elapsed)
+            self.state = "half_open"
+            self.half_open_in_flight = 0
+            logger.info(f"[Circuit] {self.endpoint} half-open, probing")
+        if self.state == "half_open":
+            if self.half_open_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.endpoint, 0.0)
+            self.half_open_in_flight += 1
+
+    def _release_probe(self):
+        if self.state == "half_open":
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def record_success(self):
+        self._release_probe()
+        if self.state != "closed":
+            logger.info(f"[Circuit] {self.endpoint} closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self._release_probe()
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(
+                    f"[Circuit] {self.endpoint} opened after {self.consecutive_failures} consecutive failures "
+                    f"(cooling down {self.reset_timeout}s)"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def record_ignored(self):
+        """调用结束但结果不反映端点健康状况（如 4xx）"""
+        self._release_probe()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
+
+
+class RetryBudget:
+    """
+    全局重试预算：滑动窗口内的重试次数不超过 请求数 × ratio + min_retries
+
+    避免下游故障时所有调用同时重试，把负载放大数倍
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_acquire_retry(self) -> bool:
+        """申请一次重试，预算不足时返回False"""
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= len(self._requests) * self.ratio + self.min_retries:
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        return {
+            "window_requests": len(self._requests),
+            "window_retries": len(self._retries),
+            "exhausted": self.exhausted
+        }
+
+
+class ResilienceController:
+    """
+    进程级的重试与熔断控制器
+
+    call() 负责一次逻辑调用的全部尝试：熔断检查 -> 调用 -> 记录结果 ->
+    （可重试且预算允许时）指数退避后重试
+    """
+
+    def __init__(self, config: ResilienceConfig = None):
+        self.config = config or get_resilience_config()
+        self.budget = RetryBudget(
+            ratio=self.config.budget_ratio,
+            min_retries=self.config.budget_min_retries,
+            window=self.config.budget_window
+        )
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        key = endpoint.rstrip("/")
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                key,
+                failure_threshold=self.config.failure_threshold,
+                reset_timeout=self.config.reset_timeout,
+                half_open_max_calls=self.config.half_open_max_calls
+            )
+        return self._breakers[key]
+
+    def is_open(self, endpoint: str) -> bool:
+        """端点当前是否熔断（冷却期已过、可以探测的端点视为未熔断）"""
+        breaker = self._breakers.get(endpoint.rstrip("/"))
+        if breaker is None or breaker.state != "open":
+            return False
+        return time.monotonic() - breaker.opened_at < breaker.reset_timeout
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待秒数：指数增长，封顶 max_delay，full jitter"""
+        delay = min(self.config.max_delay, self.config.base_delay * (2 ** attempt))
+        return random.uniform(0, delay) if self.config.jitter else delay
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        endpoint: Optional[str] = None,
+        choose_endpoint: Optional[Callable[[List[str]], Optional[str]]] = None,
+        max_attempts: Optional[int] = None,
+        **kwargs
+    ) -> Any:
+        """
+        在重试策略下执行 func(*args, **kwargs)
+
+        Args:
+            endpoint: 被调用的端点，提供时启用该端点的熔断器
+            choose_endpoint: 每次尝试前选择端点的函数（参数为本次调用已失败的端点），
+                提供时以 func(endpoint, *args, **kwargs) 调用，重试可以换到其他副本
+            max_attempts: 最大尝试次数，None使用配置值
+        """
+        attempts = max_attempts or self.config.max_attempts
+        failed: List[str] = []
+        for attempt in range(attempts):
+            call_args = args
+            if choose_endpoint is not None:
+                endpoint = choose_endpoint(failed)
+                call_args = (endpoint,) + args
+            breaker = self.breaker(endpoint) if endpoint else None
+            if breaker:
+                breaker.before_call()
+            self.budget.record_request()
+            try:
+                result = await func(*call_args, **kwargs)
+            except Exception as e:
+                if breaker:
+                    if counts_as_failure(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_ignored()
+                if endpoint:
+                    failed.append(endpoint)
+                if not is_retryable(e) or attempt == attempts - 1:
+                    raise
+                if breaker and breaker.state == "open" and choose_endpoint is None:
+                    # 本次失败触发了熔断且没有其他副本可换，不再重试，保留原始错误
+                    raise
+                if not self.budget.try_acquire_retry():
+                    logger.warning(f"Retry budget exhausted, giving up after attempt {attempt + 1}: {e}")
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # 取消等：不反映端点健康状况，只归还探测名额
+                if breaker:
+                    breaker.record_ignored()
+                raise
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "retry_budget": self.budget.get_stats(),
+            "circuits": {endpoint: breaker.get_stats() for endpoint, breaker in self._breakers.items()}
+        }
+
+
+_resilience_controller: Optional[ResilienceController] = None
+
+
+def get_resilience_controller() -> ResilienceController:
+    """获取进程级共享的重试与熔断控制器（所有引擎和工作流共用）"""
+    global _resilience_controller
+    if _resilience_controller is None:
+        _resilience_controller = ResilienceController()
+    return _resilience_controller
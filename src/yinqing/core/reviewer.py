@@ -4,6 +4,7 @@
 """
 
 import os
+import copy
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Literal
@@ -134,6 +135,17 @@ class ReviewerLayer:
         self.parser = JsonOutputParser()
         self.chain = self.review_prompt | self.llm | self.parser
 
+    def with_config(self, config: ReviewConfig) -> "ReviewerLayer":
+        """
+        返回使用另一份审核配置的审核层
+
+        新实例与当前实例共享LLM客户端和审核链，只替换配置，
+        用于按单次执行覆盖审核配置而不重新创建LLM客户端。
+        """
+        reviewer = copy.copy(self)
+        reviewer.config = config
+        return reviewer
+
     async def review_step(
         self,
         step_id: int,
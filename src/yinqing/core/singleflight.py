@@ -0,0 +1,101 @@
+"""
+相同请求合并 (Single Flight)
+并发的、完全相同的Agent调用（相同Agent端点 + 相同请求内容）只发出一次，
+其余调用等待同一个在途请求并共享其结果或异常
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _AgentCounters:
+    """单个Agent端点的合并统计"""
+
+    def __init__(self):
+        self.leaders = 0  # 实际发出的请求数
+        self.coalesced = 0  # 合并到在途请求、未单独发出的调用数
+
+
+class SingleFlight:
+    """
+    按键合并并发调用
+
+    - 第一个调用（leader）在独立任务中执行，之后相同键的调用直接等待该任务
+    - 某个等待方被取消不影响其他等待方，在途请求继续执行
+    - 请求结束即从在途表中移除，之后的调用会重新发出（结果复用由结果缓存负责）
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._counters: Dict[str, _AgentCounters] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _agent_counters(self, endpoint: str) -> _AgentCounters:
+        if endpoint not in self._counters:
+            self._counters[endpoint] = _AgentCounters()
+        return self._counters[endpoint]
+
+    async def do(self, endpoint: str, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行 func()，已有相同 (endpoint, key) 的在途请求时等待并共享其结果
+
+        Args:
+            endpoint: Agent端点（用于统计）
+            key: 请求内容的哈希
+            func: 发出请求的协程函数
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧循环上的在途任务无法在新循环中等待
+            self._loop = loop
+            self._inflight = {}
+
+        endpoint = endpoint.rstrip("/")
+        counters = self._agent_counters(endpoint)
+        flight_key = (endpoint, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda t: self._done(flight_key, t))
+            counters.leaders += 1
+        else:
+            counters.coalesced += 1
+            logger.info(f"  [Single Flight] Joining in-flight request to {endpoint}")
+        return await asyncio.shield(task)
+
+    def _done(self, flight_key: Tuple[str, str], task: asyncio.Task):
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+        if not task.cancelled():
+            # 所有等待方都已取消时，避免 "exception was never retrieved"
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """全局与各端点的实际请求数、合并次数和当前在途数"""
+        leaders = sum(c.leaders for c in self._counters.values())
+        coalesced = sum(c.coalesced for c in self._counters.values())
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": leaders,
+            "coalesced": coalesced,
+            "agents": {
+                endpoint: {"leaders": c.leaders, "coalesced": c.coalesced}
+                for endpoint, c in self._counters.items()
+            }
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """获取进程级共享的请求合并器（所有引擎和工作流共用）"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
@@ -5,6 +5,7 @@
 
 import copy
 import time
+import itertools
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 from pydantic import BaseModel, Field
@@ -75,16 +76,20 @@ class SnapshotManager:
     3. 管理快照生命周期（自动清理过期快照）
     """
 
-    def __init__(self, max_snapshots_per_trace: int = 50):
+    def __init__(self, max_snapshots_per_trace: int = 50, backend=None):
         """
         初始化快照管理器
 
         Args:
             max_snapshots_per_trace: 每个trace最多保留的快照数量
+            backend: 可选的状态存储后端（StateBackend），用于持久化快照以支持崩溃恢复
         """
+        self.backend = backend
         self.snapshots: Dict[str, ExecutionSnapshot] = OrderedDict()
         self.trace_snapshots: Dict[str, List[str]] = {}  # trace_id -> [snapshot_ids]
         self.max_snapshots_per_trace = max_snapshots_per_trace
+        # 并行步骤可能在同一毫秒内创建快照，用序号保证ID唯一
+        self._sequence = itertools.count()
 
     def create_snapshot(
         self,
@@ -95,7 +100,7 @@ class SnapshotManager:
         in_degrees: Dict[int, int]
     ) -> ExecutionSnapshot:
         """
-        创建执行快照
+        创建执行快照（同步写入持久化后端，事件循环中使用 acreate_snapshot）
 
         Args:
             trace_id: 任务追踪ID
@@ -107,7 +112,39 @@ class SnapshotManager:
         Returns:
             ExecutionSnapshot: 创建的快照
         """
-        snapshot_id = f"{trace_id}_{step_id}_{int(time.time() * 1000)}"
+        snapshot, removed = self._add_snapshot(trace_id, step_id, context, step_states, in_degrees)
+        if self.backend:
+            self.backend.save_snapshot(trace_id, snapshot.snapshot_id, step_id, snapshot.model_dump_json())
+            for snapshot_id in removed:
+                self.backend.delete_snapshot(trace_id, snapshot_id)
+        return snapshot
+
+    async def acreate_snapshot(
+        self,
+        trace_id: str,
+        step_id: int,
+        context: Dict[str, Any],
+        step_states: Dict[int, Dict],
+        in_degrees: Dict[int, int]
+    ) -> ExecutionSnapshot:
+        """创建执行快照，持久化写入在后端线程中进行，不阻塞事件循环（参数同 create_snapshot）"""
+        snapshot, removed = self._add_snapshot(trace_id, step_id, context, step_states, in_degrees)
+        if self.backend:
+            await self.backend.asave_snapshot(trace_id, snapshot.snapshot_id, step_id, snapshot.model_dump_json())
+            for snapshot_id in removed:
+                await self.backend.adelete_snapshot(trace_id, snapshot_id)
+        return snapshot
+
+    def _add_snapshot(
+        self,
+        trace_id: str,
+        step_id: int,
+        context: Dict[str, Any],
+        step_states: Dict[int, Dict],
+        in_degrees: Dict[int, int]
+    ) -> Tuple[ExecutionSnapshot, List[str]]:
+        """在内存中创建快照，返回快照和因超出数量被清理的旧快照ID"""
+        snapshot_id = f"{trace_id}_{step_id}_{int(time.time() * 1000)}_{next(self._sequence)}"
 
         # 深拷贝上下文避免后续修改影响快照
         snapshot = ExecutionSnapshot(
@@ -147,14 +184,14 @@ class SnapshotManager:
         self.trace_snapshots[trace_id].append(snapshot_id)
 
         # 清理过多的快照
-        self._cleanup_old_snapshots(trace_id)
+        removed = self._cleanup_old_snapshots(trace_id)
 
         logger.debug(
             f"[快照] 创建快照 {snapshot_id} "
             f"(step={step_id}, completed={len(snapshot.completed_steps)})"
         )
 
-        return snapshot
+        return snapshot, removed
 
     def get_snapshot(self, snapshot_id: str) -> Optional[ExecutionSnapshot]:
         """获取指定快照"""
@@ -282,14 +319,14 @@ class SnapshotManager:
 
         return history
 
-    def _cleanup_old_snapshots(self, trace_id: str):
-        """清理过多的快照，保留最近的"""
+    def _cleanup_old_snapshots(self, trace_id: str) -> List[str]:
+        """清理过多的快照，保留最近的，返回被清理的快照ID（由调用方从持久化后端删除）"""
         if trace_id not in self.trace_snapshots:
-            return
+            return []
 
         snapshot_ids = self.trace_snapshots[trace_id]
         if len(snapshot_ids) <= self.max_snapshots_per_trace:
-            return
+            return []
 
         # 删除最旧的快照
         to_remove = len(snapshot_ids) - self.max_snapshots_per_trace
@@ -299,9 +336,37 @@ class SnapshotManager:
 
         self.trace_snapshots[trace_id] = snapshot_ids[to_remove:]
         logger.debug(f"[快照] 清理了 {to_remove} 个旧快照 (trace={trace_id})")
+        return snapshot_ids[:to_remove]
+
+    def load_trace_snapshots(self, trace_id: str) -> int:
+        """从持久化后端加载指定trace的快照（用于崩溃后恢复执行）"""
+        if not self.backend:
+            return 0
+
+        loaded = 0
+        for data in self.backend.load_snapshots(trace_id):
+            snapshot = ExecutionSnapshot.model_validate_json(data)
+            if snapshot.snapshot_id in self.snapshots:
+                continue
+            self.snapshots[snapshot.snapshot_id] = snapshot
+            self.trace_snapshots.setdefault(trace_id, []).append(snapshot.snapshot_id)
+            loaded += 1
+
+        if loaded:
+            logger.info(f"[快照] 从存储加载了 {loaded} 个快照 (trace={trace_id})")
+        return loaded
+
+    def clear_trace_snapshots(self, trace_id: str, keep_persisted: bool = False):
+        """
+        清除指定trace的所有快照
+
+        Args:
+            trace_id: 任务追踪ID
+            keep_persisted: 只释放内存中的快照，保留持久化后端中的副本
+        """
+        if self.backend and not keep_persisted:
+            self.backend.delete_snapshots(trace_id)
 
-    def clear_trace_snapshots(self, trace_id: str):
-        """清除指定trace的所有快照"""
         if trace_id not in self.trace_snapshots:
             return
 
@@ -0,0 +1,488 @@
+"""
+工作流状态存储 (Workflow State Store)
+持久化执行计划、步骤完成记录（预写日志）和执行快照，
+使进程崩溃或重新部署后可以通过 trace_id 从最后完成的步骤继续执行
+"""
+
+import os
+import json
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from yinqing.core.types import ExecutionPlan, TaskStep
+from yinqing.utils.config import StateStoreConfig, get_state_store_config
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# ==================== 数据模型 ====================
+
+class WorkflowState(BaseModel):
+    """持久化的工作流状态"""
+    trace_id: str
+    query: str
+    context_id: Optional[str] = None
+    task_id: Optional[str] = None
+    status: str = Field(default="running", description="running/completed/failed/cancelled")
+    plan: Optional[Dict[str, Any]] = Field(default=None, description="匹配完成后的执行计划")
+    step_records: Dict[int, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description="每个步骤最新的完成记录 {step_id: {status, result, error}}"
+    )
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    def restore_plan(self) -> Optional[ExecutionPlan]:
+        """
+        重建执行计划：已成功的步骤保留结果，其余步骤重置为pending，
+        入度按未成功的依赖重新计算，保证已完成的Agent调用不会重复执行
+        """
+        if not self.plan:
+            return None
+
+        plan = ExecutionPlan(**self.plan)
+        for step in plan.steps:
+            step.successors = []
+        plan.init_dag()
+
+        for step in plan.steps:
+            record = self.step_records.get(step.step_id)
+            if record and record.get("status") == "success":
+                step.status = "success"
+                step.result = record.get("result")
+            else:
+                step.status = "pending"
+                step.result = None
+            step.error = None
+
+        for step in plan.steps:
+            step.in_degree = sum(
+                1 for dep_id in step.dependencies
+                if dep_id in plan.step_map and plan.step_map[dep_id].status != "success"
+            )
+        return plan
+
+    def restore_context(self) -> Dict[str, Any]:
+        """根据已成功步骤的输出重建全局上下文"""
+        context = {"user_query": self.query, "trace_id": self.trace_id}
+        for step_id, record in sorted(self.step_records.items()):
+            if record.get("status") == "success":
+                context[f"step_{step_id}_output"] = record.get("result")
+        return context
+
+    @property
+    def completed_steps(self) -> List[int]:
+        return sorted(
+            sid for sid, record in self.step_records.items()
+            if record.get("status") == "success"
+        )
+
+
+# ==================== 存储后端 ====================
+
+class StateBackend:
+    """
+    状态存储后端（内存实现）
+
+    进程内有效，重启后丢失；需要崩溃恢复时使用 SQLiteStateBackend。
+    成功完成的工作流没有恢复的必要，结束时即删除其状态和快照；失败或取消的工作流
+    保留以便恢复，最多保留 max_finished 个，超出时删除最早结束的。
+    """
+
+    def __init__(self, max_finished: int = 1000):
+        self._states: Dict[str, WorkflowState] = {}
+        self._snapshots: Dict[str, Dict[str, str]] = {}  # trace_id -> {snapshot_id: json}
+        self.max_finished = max_finished
+        self._finished: "OrderedDict[str, None]" = OrderedDict()  # 按结束顺序排列的已结束trace
+
+    def save_plan(
+        self,
+        trace_id: str,
+        query: str,
+        plan: ExecutionPlan,
+        context_id: str = None,
+        task_id: str = None
+    ):
+        """保存（或覆盖）执行计划"""
+        now = datetime.now().isoformat()
+        state = self._states.get(trace_id)
+        if state is None:
+            state = WorkflowState(trace_id=trace_id, query=query, created_at=now)
+            self._states[trace_id] = state
+        self._finished.pop(trace_id, None)
+        state.context_id = context_id
+        state.task_id = task_id
+        state.plan = plan.model_dump(mode="json")
+        state.status = "running"
+        state.updated_at = now
+
+    def record_step(self, trace_id: str, step: TaskStep, result: Any = None):
+        """追加一条步骤状态记录（同一步骤以最新记录为准）"""
+        state = self._states.get(trace_id)
+        if state is None:
+            return
+        state.step_records[step.step_id] = {
+            "status": step.status,
+            "result": result if result is not None else step.result,
+            "error": step.error
+        }
+        state.updated_at = datetime.now().isoformat()
+
+    def mark_finished(self, trace_id: str, status: str):
+        """标记工作流结束状态（成功完成的工作流直接删除）"""
+        state = self._states.get(trace_id)
+        if state is None:
+            return
+        if status == "completed":
+            self.delete(trace_id)
+            return
+        state.status = status
+        state.updated_at = datetime.now().isoformat()
+        self._finished[trace_id] = None
+        self._finished.move_to_end(trace_id)
+        while len(self._finished) > self.max_finished:
+            oldest, _ = self._finished.popitem(last=False)
+            self.delete(oldest)
+
+    def load(self, trace_id: str) -> Optional[WorkflowState]:
+        """加载工作流状态"""
+        state = self._states.get(trace_id)
+        return state.model_copy(deep=True) if state else None
+
+    def list_traces(self, status: str = None) -> List[Dict[str, Any]]:
+        """列出已保存的工作流（可按状态过滤）"""
+        return [
+            {
+                "trace_id": s.trace_id,
+                "query": s.query,
+                "status": s.status,
+                "completed_steps": len(s.completed_steps),
+                "updated_at": s.updated_at
+            }
+            for s in self._states.values()
+            if status is None or s.status == status
+        ]
+
+    def delete(self, trace_id: str):
+        """删除工作流状态及其快照"""
+        self._states.pop(trace_id, None)
+        self._finished.pop(trace_id, None)
+        self.delete_snapshots(trace_id)
+
+    # ---------- 快照 ----------
+
+    def save_snapshot(self, trace_id: str, snapshot_id: str, step_id: int, data: str):
+        self._snapshots.setdefault(trace_id, {})[snapshot_id] = data
+
+    def delete_snapshot(self, trace_id: str, snapshot_id: str):
+        self._snapshots.get(trace_id, {}).pop(snapshot_id, None)
+
+    def load_snapshots(self, trace_id: str) -> List[str]:
+        return list(self._snapshots.get(trace_id, {}).values())
+
+    def delete_snapshots(self, trace_id: str):
+        self._snapshots.pop(trace_id, None)
+
+    def close(self):
+        pass
+
+    # ---------- 事件循环中使用的异步接口 ----------
+    # 内存后端直接执行；SQLite后端在线程中执行，避免提交时的磁盘同步阻塞其他工作流
+
+    async def aload(self, trace_id: str) -> Optional[WorkflowState]:
+        return self.load(trace_id)
+
+    async def asave_plan(
+        self,
+        trace_id: str,
+        query: str,
+        plan: ExecutionPlan,
+        context_id: str = None,
+        task_id: str = None
+    ):
+        self.save_plan(trace_id, query, plan, context_id, task_id)
+
+    async def arecord_step(self, trace_id: str, step: TaskStep, result: Any = None):
+        self.record_step(trace_id, step, result)
+
+    async def amark_finished(self, trace_id: str, status: str):
+        self.mark_finished(trace_id, status)
+
+    async def asave_snapshot(self, trace_id: str, snapshot_id: str, step_id: int, data: str):
+        self.save_snapshot(trace_id, snapshot_id, step_id, data)
+
+    async def adelete_snapshot(self, trace_id: str, snapshot_id: str):
+        self.delete_snapshot(trace_id, snapshot_id)
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    本地 SQLite 状态存储
+
+    - traces: 每个trace一行，保存查询和执行计划
+    - step_log: 步骤完成的预写日志，只追加，加载时取每个步骤的最新记录
+    - snapshots: 回溯用的执行快照
+
+    数据库以 WAL 模式打开，单次写入都是小事务；事件循环中通过 a* 异步接口在线程中执行。
+    与内存后端一致：成功完成的工作流结束时删除其全部记录，失败或取消的工作流
+    最多保留 max_finished 个（按结束时间淘汰最早的）。
+    """
+
+    def __init__(self, path: str, max_finished: int = 1000):
+        super().__init__(max_finished=max_finished)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS traces (
+                trace_id TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                context_id TEXT,
+                task_id TEXT,
+                status TEXT NOT NULL,
+                plan TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS step_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trace_id TEXT NOT NULL,
+                step_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_step_log_trace ON step_log (trace_id, id);
+            CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_id TEXT PRIMARY KEY,
+                trace_id TEXT NOT NULL,
+                step_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_snapshots_trace ON snapshots (trace_id);
+            """
+        )
+        logger.info(f"[StateStore] Using SQLite state store at {os.path.abspath(path)}")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def save_plan(
+        self,
+        trace_id: str,
+        query: str,
+        plan: ExecutionPlan,
+        context_id: str = None,
+        task_id: str = None
+    ):
+        self._write_plan(self._plan_row(trace_id, query, plan, context_id, task_id))
+
+    @staticmethod
+    def _plan_row(trace_id: str, query: str, plan: ExecutionPlan, context_id: str, task_id: str) -> tuple:
+        now = datetime.now().isoformat()
+        plan_json = json.dumps(plan.model_dump(mode="json"), ensure_ascii=False)
+        return (trace_id, query, context_id, task_id, plan_json, now, now)
+
+    def _write_plan(self, row: tuple):
+        self._execute(
+            """
+            INSERT INTO traces (trace_id, query, context_id, task_id, status, plan, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'running', ?, ?, ?)
+            ON CONFLICT(trace_id) DO UPDATE SET
+                context_id = excluded.context_id,
+                task_id = excluded.task_id,
+                status = 'running',
+                plan = excluded.plan,
+                updated_at = excluded.updated_at
+            """,
+            row
+        )
+
+    @staticmethod
+    def _step_row(trace_id: str, step: TaskStep, result: Any = None) -> tuple:
+        """在调用线程中取出步骤的当前状态（步骤对象之后可能继续被修改）"""
+        value = result if result is not None else step.result
+        return (
+            trace_id, step.step_id, step.status,
+            None if value is None else str(value), step.error, datetime.now().isoformat()
+        )
+
+    def _write_step(self, row: tuple):
+        trace_id, now = row[0], row[-1]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO step_log (trace_id, step_id, status, result, error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+            self._conn.execute(
+                "UPDATE traces SET updated_at = ? WHERE trace_id = ?", (now, trace_id)
+            )
+            self._conn.execute("COMMIT")
+
+    def record_step(self, trace_id: str, step: TaskStep, result: Any = None):
+        self._write_step(self._step_row(trace_id, step, result))
+
+    def _delete_rows(self, trace_ids: List[str]):
+        """在已开启的事务中删除这些trace的全部记录"""
+        for trace_id in trace_ids:
+            self._conn.execute("DELETE FROM step_log WHERE trace_id = ?", (trace_id,))
+            self._conn.execute("DELETE FROM snapshots WHERE trace_id = ?", (trace_id,))
+            self._conn.execute("DELETE FROM traces WHERE trace_id = ?", (trace_id,))
+
+    def mark_finished(self, trace_id: str, status: str):
+        """标记结束状态：成功完成的工作流直接删除，失败/取消的只保留最近 max_finished 个"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            if status == "completed":
+                self._delete_rows([trace_id])
+            else:
+                self._conn.execute(
+                    "UPDATE traces SET status = ?, updated_at = ? WHERE trace_id = ?",
+                    (status, datetime.now().isoformat(), trace_id)
+                )
+                expired = [
+                    row[0] for row in self._conn.execute(
+                        "SELECT trace_id FROM traces WHERE status != 'running' "
+                        "ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                        (self.max_finished,)
+                    ).fetchall()
+                ]
+                self._delete_rows(expired)
+            self._conn.execute("COMMIT")
+
+    def load(self, trace_id: str) -> Optional[WorkflowState]:
+        rows = self._execute(
+            "SELECT trace_id, query, context_id, task_id, status, plan, created_at, updated_at "
+            "FROM traces WHERE trace_id = ?",
+            (trace_id,)
+        )
+        if not rows:
+            return None
+        trace_id, query, context_id, task_id, status, plan_json, created_at, updated_at = rows[0]
+
+        step_records = {}
+        for step_id, step_status, result, error in self._execute(
+            "SELECT step_id, status, result, error FROM step_log WHERE trace_id = ? ORDER BY id",
+            (trace_id,)
+        ):
+            step_records[step_id] = {"status": step_status, "result": result, "error": error}
+
+        return WorkflowState(
+            trace_id=trace_id,
+            query=query,
+            context_id=context_id,
+            task_id=task_id,
+            status=status,
+            plan=json.loads(plan_json) if plan_json else None,
+            step_records=step_records,
+            created_at=created_at,
+            updated_at=updated_at
+        )
+
+    def list_traces(self, status: str = None) -> List[Dict[str, Any]]:
+        sql = (
+            "SELECT t.trace_id, t.query, t.status, t.updated_at, "
+            "(SELECT COUNT(DISTINCT step_id) FROM step_log s WHERE s.trace_id = t.trace_id AND s.status = 'success') "
+            "FROM traces t"
+        )
+        params: tuple = ()
+        if status:
+            sql += " WHERE t.status = ?"
+            params = (status,)
+        sql += " ORDER BY t.updated_at DESC"
+        return [
+            {
+                "trace_id": trace_id,
+                "query": query,
+                "status": trace_status,
+                "completed_steps": completed,
+                "updated_at": updated_at
+            }
+            for trace_id, query, trace_status, updated_at, completed in self._execute(sql, params)
+        ]
+
+    def delete(self, trace_id: str):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._delete_rows([trace_id])
+            self._conn.execute("COMMIT")
+
+    def save_snapshot(self, trace_id: str, snapshot_id: str, step_id: int, data: str):
+        self._execute(
+            "INSERT OR REPLACE INTO snapshots (snapshot_id, trace_id, step_id, data, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (snapshot_id, trace_id, step_id, data, datetime.now().isoformat())
+        )
+
+    def delete_snapshot(self, trace_id: str, snapshot_id: str):
+        self._execute("DELETE FROM snapshots WHERE snapshot_id = ?", (snapshot_id,))
+
+    def load_snapshots(self, trace_id: str) -> List[str]:
+        return [
+            row[0] for row in self._execute(
+                "SELECT data FROM snapshots WHERE trace_id = ? ORDER BY created_at, rowid",
+                (trace_id,)
+            )
+        ]
+
+    def delete_snapshots(self, trace_id: str):
+        self._execute("DELETE FROM snapshots WHERE trace_id = ?", (trace_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def aload(self, trace_id: str) -> Optional[WorkflowState]:
+        return await asyncio.to_thread(self.load, trace_id)
+
+    async def asave_plan(
+        self,
+        trace_id: str,
+        query: str,
+        plan: ExecutionPlan,
+        context_id: str = None,
+        task_id: str = None
+    ):
+        # 计划在调用线程中序列化，之后的修改不影响写入的内容
+        await asyncio.to_thread(self._write_plan, self._plan_row(trace_id, query, plan, context_id, task_id))
+
+    async def arecord_step(self, trace_id: str, step: TaskStep, result: Any = None):
+        await asyncio.to_thread(self._write_step, self._step_row(trace_id, step, result))
+
+    async def amark_finished(self, trace_id: str, status: str):
+        await asyncio.to_thread(self.mark_finished, trace_id, status)
+
+    async def asave_snapshot(self, trace_id: str, snapshot_id: str, step_id: int, data: str):
+        await asyncio.to_thread(self.save_snapshot, trace_id, snapshot_id, step_id, data)
+
+    async def adelete_snapshot(self, trace_id: str, snapshot_id: str):
+        await asyncio.to_thread(self.delete_snapshot, trace_id, snapshot_id)
+
+
+def create_state_backend(config: StateStoreConfig = None) -> StateBackend:
+    """根据配置创建状态存储后端"""
+    config = config or get_state_store_config()
+    if config.backend == "memory":
+        return StateBackend(max_finished=config.max_finished)
+    if config.backend == "sqlite":
+        return SQLiteStateBackend(config.path, max_finished=config.max_finished)
+    raise ValueError(f"Unsupported state backend: {config.backend}")
@@ -24,6 +24,7 @@ class TaskStep(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     error: Optional[str] = None
+    cache_hit: bool = Field(default=False, description="结果是否来自步骤结果缓存")
 
     @validator("step_id")
     def step_id_must_be_positive(cls, v):
@@ -40,6 +41,8 @@ class ExecutionPlan(BaseModel):
     context_id: Optional[str] = None
     # DAG依赖映射：step_id -> 步骤对象（运行时注入）
     step_map: Dict[int, TaskStep] = Field(default_factory=dict, exclude=True)
+    # 计划是否来自解析器的计划缓存（运行时注入）
+    cache_hit: bool = Field(default=False, exclude=True)
 
     def init_dag(self):
         """初始化DAG的入度和后继步骤"""
@@ -82,3 +85,4 @@ class ParallelConfig(BaseModel):
     """并行执行配置"""
     fail_strategy: str = Field(default="continue", description="失败策略：continue（继续）/ abort（终止所有并行步骤）")
     max_parallel: int = Field(default=5, description="最大并行数")
+    scheduler: str = Field(default="eager", description="调度模式：eager（依赖完成即启动后继步骤）/ batch（按层批量执行，保留用于对比）")
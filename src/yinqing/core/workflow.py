@@ -1,12 +1,15 @@
 import os
 import asyncio
 import traceback
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from collections import deque
 from yinqing.core.types import ExecutionPlan, TaskStep, ParallelConfig, generate_trace_id
 from yinqing.core.parser import TaskParserLayer
 from yinqing.core.matcher import CapabilityMatcherLayer
 from yinqing.core.executor import TaskExecutorLayer
+from yinqing.core.pool import BoundedTaskPool
+from yinqing.core.context import ExecutionContext
+from yinqing.core.state_store import StateBackend, create_state_backend
 from yinqing.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -14,22 +17,27 @@ logger = get_logger(__name__)
 class WorkflowEngine:
     """项目经理：支持并行执行和依赖处理的通用编排器"""
     
-    def __init__(self):
+    def __init__(self, state_store: StateBackend = None):
         self.parser = TaskParserLayer()
         self.matcher = CapabilityMatcherLayer()
         self.executor = TaskExecutorLayer()
-        self.global_context_store: Dict[str, Dict[str, Any]] = {}
-        self.step_status_store: Dict[str, Dict[int, TaskStep]] = {}
+        # 持久化的计划与步骤完成记录，用于崩溃后按 trace_id 恢复执行
+        self.state_store = state_store or create_state_backend()
         self.parallel_config = ParallelConfig(fail_strategy="continue", max_parallel=5)
-        
-        # Current context (runtime)
-        self.global_context = {}
+
+        # 运行中的执行上下文 {trace_id: ExecutionContext}，每次 stream() 独立一份
+        self.executions: Dict[str, ExecutionContext] = {}
         
         # 输出目录
         self.output_dir = os.path.join(os.getcwd(), "output")
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
+    async def aclose(self):
+        """关闭引擎持有的连接（Agent HTTP连接池和MCP会话）"""
+        await self.executor.aclose()
+        await self.matcher.sessions.aclose()
+
     def format_response(self, content: str, is_complete: bool = False):
         return {"content": content, "is_complete": is_complete}
 
@@ -81,59 +89,192 @@ class WorkflowEngine:
             logger.error(f"Failed to save result to file: {e}")
             return None
 
-    async def _execute_parallel_steps(self, steps: List[TaskStep], context: Dict[str, Any], trace_id: str):
+    async def _execute_parallel_steps(self, steps: List[TaskStep], ctx: ExecutionContext):
         """并行执行多个步骤，返回执行结果"""
         # 构建并行任务列表
         tasks = []
         for step in steps:
             if step.status == "pending":
-                tasks.append(self.executor.execute_step(step, context, trace_id))
+                tasks.append(self.executor.execute_step(step, ctx.global_context, ctx.trace_id))
         
         if not tasks:
             return []
 
-        # 控制最大并行数
-        if len(tasks) > self.parallel_config.max_parallel:
-            chunks = [tasks[i:i+self.parallel_config.max_parallel] for i in range(0, len(tasks), self.parallel_config.max_parallel)]
-            all_results = []
-            for chunk in chunks:
-                chunk_results = await asyncio.gather(*chunk, return_exceptions=self.parallel_config.fail_strategy == "continue")
-                all_results.extend(chunk_results)
-        else:
-            # 执行并行任务，return_exceptions=True表示某个任务失败不影响其他任务
-            all_results = await asyncio.gather(*tasks, return_exceptions=self.parallel_config.fail_strategy == "continue")
+        # 滑动窗口控制最大并行数：任一调用完成即启动下一个
+        # return_exceptions=True表示某个任务失败不影响其他任务
+        pool = BoundedTaskPool(ctx.parallel_config.max_parallel)
+        all_results = await pool.map(tasks, return_exceptions=ctx.parallel_config.fail_strategy == "continue")
+        pool.log_stats(f"Batch {ctx.trace_id[:8]}")
         return all_results
 
-    async def stream(self, query: str, context_id: str = None, task_id: str = None):
-        """主入口流式函数（支持并行与依赖）"""
-        trace_id = generate_trace_id()
+    async def _complete_step(self, ctx: ExecutionContext, step: TaskStep, result_str: str) -> Tuple[Dict[str, Any], List[int]]:
+        """记录步骤结果并更新后继入度，返回进度消息和新就绪的步骤ID"""
+        plan = ctx.plan
+        # 更新上下文和状态
+        ctx.global_context[f"step_{step.step_id}_output"] = result_str
+        await self.state_store.arecord_step(plan.trace_id, step, result_str)
+
+        # 输出步骤结果
+        preview = result_str[:100] + "..." if len(str(result_str)) > 100 else result_str
+        status_icon = "✅" if step.status == "success" else "❌"
+        cache_note = "（缓存命中）" if step.cache_hit else ""
+        logger.info(f"  {status_icon} Step {step.step_id} finished{' (cached)' if step.cache_hit else ''}: {preview}")
+        response = self.format_response(f"步骤 {step.step_id} {step.status}{cache_note}。输出: {preview}", is_complete=False)
+
+        # 更新后继步骤的入度
+        ready_ids = []
+        for succ_id in step.successors:
+            succ_step = plan.step_map[succ_id]
+            succ_step.in_degree -= 1
+            # 入度为0则加入队列（后续可执行）
+            if succ_step.in_degree == 0 and succ_step.status == "pending":
+                ready_ids.append(succ_id)
+        return response, ready_ids
+
+    async def _run_batch_schedule(self, ctx: ExecutionContext, queue: deque):
+        """按层批量调度：每批全部完成后才释放后继步骤（旧模式，保留用于对比）"""
+        plan = ctx.plan
+        while queue:
+            # 取出当前所有入度为0的步骤（可并行执行）
+            current_parallel_steps = [plan.step_map[step_id] for step_id in queue]
+            queue.clear()
+
+            if not current_parallel_steps:
+                break
+
+            # 输出并行执行提示
+            step_ids = [step.step_id for step in current_parallel_steps]
+            step_names = [step.name for step in current_parallel_steps]
+            logger.info(f"▶️  Executing Batch: Steps {step_ids} ({', '.join(step_names)})")
+            yield self.format_response(f"正在执行步骤：{', '.join(step_names)}...", is_complete=False)
+
+            # 并行执行步骤
+            results = await self._execute_parallel_steps(current_parallel_steps, ctx)
+
+            # 处理执行结果
+            for result in results:
+                if isinstance(result, Exception):
+                    # 处理任务执行异常
+                    logger.error(f"❌ Step execution failed: {result}")
+                    yield self.format_response(f"步骤执行异常：{str(result)[:100]}...", is_complete=False)
+                    continue
+
+                step, result_str = result # type: ignore
+                response, ready_ids = await self._complete_step(ctx, step, result_str)
+                yield response
+                queue.extend(ready_ids)
+
+    async def _run_eager_schedule(self, ctx: ExecutionContext, queue: deque):
+        """事件驱动调度：任一步骤完成即释放其后继，不等待同层其他步骤"""
+        plan = ctx.plan
+        parallel_config = ctx.parallel_config
+        running: Dict[asyncio.Task, TaskStep] = {}
+        pool = BoundedTaskPool(parallel_config.max_parallel)
+        try:
+            while queue or running:
+                # 在并行上限内启动所有就绪步骤
+                launched = []
+                while queue and len(running) < parallel_config.max_parallel:
+                    step = plan.step_map[queue.popleft()]
+                    if step.status != "pending":
+                        continue
+                    task = asyncio.create_task(pool.run(self.executor.execute_step(step, ctx.global_context, ctx.trace_id)))
+                    running[task] = step
+                    launched.append(step)
+
+                if launched:
+                    step_ids = [step.step_id for step in launched]
+                    step_names = [step.name for step in launched]
+                    logger.info(f"▶️  Launching Steps {step_ids} ({', '.join(step_names)}), in flight: {len(running)}")
+                    yield self.format_response(f"正在执行步骤：{', '.join(step_names)}...", is_complete=False)
+
+                if not running:
+                    break
+
+                # 等待任意一个步骤完成
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        if parallel_config.fail_strategy == "abort":
+                            raise error
+                        logger.error(f"❌ Step execution failed: {error}")
+                        yield self.format_response(f"步骤执行异常：{str(error)[:100]}...", is_complete=False)
+                        continue
+
+                    step, result_str = task.result()
+                    response, ready_ids = await self._complete_step(ctx, step, result_str)
+                    yield response
+                    queue.extend(ready_ids)
+        finally:
+            # abort策略或外部取消时，终止仍在运行的步骤
+            for task in running:
+                task.cancel()
+            pool.log_stats(f"Scheduler {plan.trace_id[:8]}")
+
+    async def stream(
+        self,
+        query: str,
+        context_id: str = None,
+        task_id: str = None,
+        trace_id: str = None,
+        parallel_config: ParallelConfig = None,
+        use_plan_cache: bool = True
+    ):
+        """
+        主入口流式函数（支持并行与依赖）
+
+        每次调用创建独立的 ExecutionContext，同一引擎实例可并发运行多个工作流。
+
+        Args:
+            query: 用户查询
+            context_id: 上下文ID
+            task_id: 任务ID
+            trace_id: 指定trace_id（默认自动生成）
+            parallel_config: 本次执行的并行配置（默认使用引擎配置）
+            use_plan_cache: 是否复用解析器缓存的执行计划
+
+        Raises:
+            RuntimeError: 指定的 trace_id 正在执行（避免同一计划在共享上下文上重复执行）
+        """
+        if trace_id and trace_id in self.executions:
+            raise RuntimeError(f"Workflow {trace_id} is already running")
+
+        trace_id = trace_id or generate_trace_id()
+        ctx = ExecutionContext(trace_id, query, parallel_config or self.parallel_config)
+        self.executions[trace_id] = ctx
         logger.info(f"[bold magenta]🚀 Workflow Started[/bold magenta] (Query: '{query}')")
         yield self.format_response(f"收到任务：{query}，正在分析... (trace_id: {trace_id})", is_complete=False)
 
         try:
-            # 初始化上下文和状态
-            if trace_id in self.global_context_store:
-                self.global_context = self.global_context_store[trace_id]
-                saved_steps = self.step_status_store[trace_id]
-                logger.info(f"🔄 Resuming workflow from breakpoint (trace_id: {trace_id})")
+            # 存在已持久化的计划则从断点恢复：跳过解析和匹配，已成功的步骤不再执行
+            saved_state = await self.state_store.aload(trace_id)
+            plan = saved_state.restore_plan() if saved_state else None
+            if plan:
+                ctx.global_context = saved_state.restore_context()
+                ctx.plan = plan
+                logger.info(
+                    f"🔄 Resuming workflow from breakpoint (trace_id: {trace_id}, "
+                    f"completed steps: {saved_state.completed_steps})"
+                )
                 yield self.format_response(f"发现断点，将从上次中断处继续执行... (trace_id: {trace_id})", is_complete=False)
             else:
-                self.global_context = {"user_query": query, "trace_id": trace_id}
-                saved_steps = {}
+                # Phase 1: 解析与DAG初始化
+                plan = await self.parser.parse(query, context_id, task_id, use_cache=use_plan_cache)
+                plan.trace_id = trace_id
+                ctx.plan = plan
+                cache_note = "（复用缓存计划）" if plan.cache_hit else ""
+                yield self.format_response(f"计划生成完毕{cache_note}，共 {len(plan.steps)} 个步骤。", is_complete=False)
 
-            # Phase 1: 解析与DAG初始化
-            plan = await self.parser.parse(query, context_id, task_id)
-            self.global_context["trace_id"] = plan.trace_id
-            yield self.format_response(f"计划生成完毕，共 {len(plan.steps)} 个步骤。", is_complete=False)
+                # Phase 2: 匹配Agent
+                plan = await self.matcher.match_agents(plan)
+                ctx.plan = plan
+                await self.state_store.asave_plan(trace_id, query, plan, context_id, task_id)
+                yield self.format_response("资源调度完毕，Agent 匹配完成。", is_complete=False)
 
-            # Phase 2: 匹配Agent
-            plan = await self.matcher.match_agents(plan)
-            yield self.format_response("资源调度完毕，Agent 匹配完成。", is_complete=False)
-
-            # 合并保存的步骤状态
-            for step_id, saved_step in saved_steps.items():
-                if step_id in plan.step_map:
-                    plan.step_map[step_id] = saved_step
+            # 后台预先建立到已分配Agent的HTTP连接
+            self.executor.prewarm(s for s in plan.steps if s.status != "success")
 
             # Phase 3: 拓扑排序 + 并行执行
             queue = deque()
@@ -141,52 +282,14 @@ class WorkflowEngine:
                 if step.in_degree == 0 and step.status == "pending":
                     queue.append(step.step_id)
 
-            logger.info("[bold yellow]⚡️ Starting Execution Phase[/bold yellow]")
-
-            while queue:
-                # 取出当前所有入度为0的步骤（可并行执行）
-                current_parallel_steps = [plan.step_map[step_id] for step_id in queue]
-                queue.clear()
-
-                if not current_parallel_steps:
-                    break
+            logger.info(f"[bold yellow]⚡️ Starting Execution Phase[/bold yellow] (scheduler: {ctx.parallel_config.scheduler})")
 
-                # 输出并行执行提示
-                step_ids = [step.step_id for step in current_parallel_steps]
-                step_names = [step.name for step in current_parallel_steps]
-                logger.info(f"▶️  Executing Batch: Steps {step_ids} ({', '.join(step_names)})")
-                yield self.format_response(f"正在执行步骤：{', '.join(step_names)}...", is_complete=False)
-
-                # 并行执行步骤
-                results = await self._execute_parallel_steps(current_parallel_steps, self.global_context, plan.trace_id)
-
-                # 处理执行结果
-                for result in results:
-                    if isinstance(result, Exception):
-                        # 处理任务执行异常
-                        logger.error(f"❌ Step execution failed: {result}")
-                        yield self.format_response(f"步骤执行异常：{str(result)[:100]}...", is_complete=False)
-                        continue
-                    
-                    step, result_str = result # type: ignore
-                    # 更新上下文和状态
-                    self.global_context[f"step_{step.step_id}_output"] = result_str
-                    self.step_status_store[plan.trace_id] = self.step_status_store.get(plan.trace_id, {})
-                    self.step_status_store[plan.trace_id][step.step_id] = step
-
-                    # 输出步骤结果
-                    preview = result_str[:100] + "..." if len(str(result_str)) > 100 else result_str
-                    status_icon = "✅" if step.status == "success" else "❌"
-                    logger.info(f"  {status_icon} Step {step.step_id} finished: {preview}")
-                    yield self.format_response(f"步骤 {step.step_id} {step.status}。输出: {preview}", is_complete=False)
-
-                    # 更新后继步骤的入度
-                    for succ_id in step.successors:
-                        succ_step = plan.step_map[succ_id]
-                        succ_step.in_degree -= 1
-                        # 入度为0则加入队列（后续可执行）
-                        if succ_step.in_degree == 0 and succ_step.status == "pending":
-                            queue.append(succ_id)
+            if ctx.parallel_config.scheduler == "batch":
+                scheduler = self._run_batch_schedule(ctx, queue)
+            else:
+                scheduler = self._run_eager_schedule(ctx, queue)
+            async for response in scheduler:
+                yield response
 
             # 汇总最终结果并保存
             final_output = []
@@ -195,18 +298,46 @@ class WorkflowEngine:
                     final_output.append(f"## Step {step.step_id}: {step.name}\n\n{step.result}\n")
             
             full_result_text = "\n".join(final_output)
-            saved_path = self._save_result_to_file(query, full_result_text, plan.trace_id, plan)
+            saved_path = self._save_result_to_file(query, full_result_text, trace_id, plan)
 
-            # 保存上下文
-            self.global_context_store[plan.trace_id] = self.global_context
-            logger.info(f"[bold green]🏁 Workflow Completed Successfully![/bold green] (trace_id: {plan.trace_id})")
+            ctx.finish("completed")
+            logger.info(f"[bold green]🏁 Workflow Completed Successfully![/bold green] (trace_id: {trace_id})")
             
             completion_msg = f"✅ 所有任务步骤执行完毕！"
+            cache_hits = len([s for s in plan.steps if s.cache_hit])
+            if cache_hits:
+                completion_msg += f"\n♻️ {cache_hits}/{len(plan.steps)} 个步骤复用了缓存结果"
             if saved_path:
                 completion_msg += f"\n📄 结果已保存至: {saved_path}"
                 
             yield self.format_response(completion_msg, is_complete=True)
 
         except Exception as e:
+            ctx.finish("failed")
             logger.error(f"Workflow crashed (trace_id: {trace_id}): {traceback.format_exc()}")
             yield self.format_response(f"Workflow Critical Error: {e} (trace_id: {trace_id})")
+        finally:
+            if ctx.status == "running":
+                ctx.finish("cancelled")
+            await self.state_store.amark_finished(trace_id, ctx.status)
+            self.executions.pop(trace_id, None)
+
+    async def resume(self, trace_id: str, parallel_config: ParallelConfig = None):
+        """
+        从状态存储中恢复指定trace的工作流，已成功的步骤不会重新执行
+
+        Args:
+            trace_id: 要恢复的任务追踪ID
+            parallel_config: 本次执行的并行配置（默认使用引擎配置）
+        """
+        saved_state = await self.state_store.aload(trace_id)
+        if not saved_state:
+            raise ValueError(f"No saved workflow state for trace_id: {trace_id}")
+        async for response in self.stream(
+            saved_state.query,
+            context_id=saved_state.context_id,
+            task_id=saved_state.task_id,
+            trace_id=trace_id,
+            parallel_config=parallel_config
+        ):
+            yield response
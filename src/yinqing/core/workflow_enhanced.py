@@ -6,7 +6,7 @@
 import os
 import asyncio
 import traceback
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 from collections import deque
 from datetime import datetime
 
@@ -14,8 +14,11 @@ from yinqing.core.types import ExecutionPlan, TaskStep, ParallelConfig, generate
 from yinqing.core.parser import TaskParserLayer
 from yinqing.core.matcher import CapabilityMatcherLayer
 from yinqing.core.executor import TaskExecutorLayer
+from yinqing.core.pool import BoundedTaskPool
+from yinqing.core.context import ExecutionContext
 from yinqing.core.reviewer import ReviewerLayer, ReviewConfig, ReviewResult
 from yinqing.core.snapshot import SnapshotManager, ExecutionSnapshot
+from yinqing.core.state_store import StateBackend, create_state_backend
 from yinqing.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -32,12 +35,13 @@ class EnhancedWorkflowEngine:
     4. 人工介入接口 - 支持暂停等待人工处理
     """
 
-    def __init__(self, review_config: ReviewConfig = None):
+    def __init__(self, review_config: ReviewConfig = None, state_store: StateBackend = None):
         """
         初始化增强版工作流引擎
 
         Args:
             review_config: 审核配置，None则使用默认配置
+            state_store: 状态存储后端，None则按配置创建（默认本地SQLite）
         """
         # 核心组件
         self.parser = TaskParserLayer()
@@ -47,24 +51,26 @@ class EnhancedWorkflowEngine:
         # 新增：审核层和快照管理器
         self.review_config = review_config or ReviewConfig()
         self.reviewer = ReviewerLayer(config=self.review_config)
-        self.snapshot_manager = SnapshotManager()
+        # 状态存储：计划、步骤完成记录和快照都会持久化，崩溃后可按 trace_id 恢复
+        self.state_store = state_store or create_state_backend()
+        self.snapshot_manager = SnapshotManager(backend=self.state_store)
 
-        # 状态存储
-        self.global_context_store: Dict[str, Dict[str, Any]] = {}
-        self.step_status_store: Dict[str, Dict[int, TaskStep]] = {}
         self.parallel_config = ParallelConfig(fail_strategy="continue", max_parallel=5)
 
-        # 运行时上下文
-        self.global_context: Dict[str, Any] = {}
-
-        # 重试计数器 {trace_id: {step_id: retry_count}}
-        self.retry_counters: Dict[str, Dict[int, int]] = {}
+        # 运行中的执行上下文 {trace_id: ExecutionContext}
+        # 上下文、重试计数和审核配置都按trace隔离，同一实例可并发运行多个工作流
+        self.executions: Dict[str, ExecutionContext] = {}
 
         # 输出目录
         self.output_dir = os.path.join(os.getcwd(), "output")
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
+    async def aclose(self):
+        """关闭引擎持有的连接（Agent HTTP连接池和MCP会话）"""
+        await self.executor.aclose()
+        await self.matcher.sessions.aclose()
+
     def format_response(
         self,
         content: str,
@@ -131,13 +137,14 @@ class EnhancedWorkflowEngine:
             logger.error(f"Failed to save result to file: {e}")
             return None
 
-    def _get_step_states_dict(self, plan: ExecutionPlan) -> Dict[int, Dict]:
+    def _get_step_states_dict(self, ctx: ExecutionContext) -> Dict[int, Dict]:
         """获取所有步骤状态的字典形式"""
+        plan = ctx.plan
         return {
             step.step_id: {
                 "status": step.status,
                 "result": step.result,
-                "retry_count": self.retry_counters.get(plan.trace_id, {}).get(step.step_id, 0),
+                "retry_count": ctx.retry_counters.get(step.step_id, 0),
                 "error_history": getattr(step, 'error_history', []),
                 "start_time": step.start_time,
                 "end_time": step.end_time
@@ -149,113 +156,157 @@ class EnhancedWorkflowEngine:
         """获取所有步骤入度的字典"""
         return {step.step_id: step.in_degree for step in plan.steps}
 
-    async def _create_snapshot(self, plan: ExecutionPlan, step_id: int):
-        """创建执行快照"""
-        if not self.review_config.enable_rollback:
+    async def _create_snapshot(self, ctx: ExecutionContext, step_id: int, context: Dict[str, Any] = None):
+        """创建执行快照（context为步骤的隔离上下文视图，默认使用全局上下文）"""
+        if not ctx.review_config.enable_rollback:
             return
 
-        self.snapshot_manager.create_snapshot(
-            trace_id=plan.trace_id,
+        await self.snapshot_manager.acreate_snapshot(
+            trace_id=ctx.trace_id,
             step_id=step_id,
-            context=self.global_context,
-            step_states=self._get_step_states_dict(plan),
-            in_degrees=self._get_in_degrees_dict(plan)
+            context=context if context is not None else ctx.global_context,
+            step_states=self._get_step_states_dict(ctx),
+            in_degrees=self._get_in_degrees_dict(ctx.plan)
         )
 
     async def _restore_from_snapshot(
         self,
-        plan: ExecutionPlan,
-        snapshot: ExecutionSnapshot
+        ctx: ExecutionContext,
+        snapshot: ExecutionSnapshot,
+        step_ids: Optional[Set[int]] = None
     ) -> ExecutionPlan:
-        """从快照恢复状态"""
+        """
+        从快照恢复状态
+
+        Args:
+            ctx: 执行上下文
+            snapshot: 要恢复的快照
+            step_ids: 只恢复这些步骤（及其输出）；None表示恢复全部。
+                      并行执行时只回退失败分支，其他分支的结果保持不变
+        """
         restored_context, restored_states, restored_in_degrees = \
             self.snapshot_manager.restore_from_snapshot(snapshot)
+        plan = ctx.plan
 
-        # 恢复上下文
-        self.global_context = restored_context
+        if step_ids is None:
+            # 恢复上下文
+            ctx.global_context = restored_context
 
-        # 恢复步骤状态
-        for step in plan.steps:
-            state = restored_states.get(step.step_id)
-            if state:
-                step.status = state.get("status", "pending")
-                step.result = state.get("result")
-                step.in_degree = restored_in_degrees.get(step.step_id, step.in_degree)
+            # 恢复步骤状态
+            for step in plan.steps:
+                state = restored_states.get(step.step_id)
+                if state:
+                    step.status = state.get("status", "pending")
+                    step.result = state.get("result")
+                    step.in_degree = restored_in_degrees.get(step.step_id, step.in_degree)
+            return plan
+
+        for step_id in step_ids:
+            step = plan.step_map[step_id]
+            output_key = f"step_{step_id}_output"
+            if output_key in restored_context:
+                ctx.global_context[output_key] = restored_context[output_key]
+            else:
+                ctx.global_context.pop(output_key, None)
+
+            state = restored_states.get(step_id, {})
+            step.status = state.get("status", "pending")
+            if step.status in ("running", "failed"):
+                step.status = "pending"
+            step.result = state.get("result")
+            step.error = None
+
+        # 按当前DAG状态重新计算入度：未完成（含运行中）的依赖仍计入
+        for step_id in step_ids:
+            step = plan.step_map[step_id]
+            step.in_degree = sum(
+                1 for dep_id in step.dependencies
+                if dep_id in plan.step_map
+                and plan.step_map[dep_id].status not in ("success", "failed")
+            )
 
         return plan
 
+    def _get_descendants(self, plan: ExecutionPlan, step_id: int) -> Set[int]:
+        """获取某步骤及其所有下游步骤的ID"""
+        affected = {step_id}
+        stack = [step_id]
+        while stack:
+            for succ_id in plan.step_map[stack.pop()].successors:
+                if succ_id not in affected:
+                    affected.add(succ_id)
+                    stack.append(succ_id)
+        return affected
+
     async def _execute_parallel_steps(
         self,
         steps: List[TaskStep],
-        context: Dict[str, Any],
-        trace_id: str
+        ctx: ExecutionContext
     ) -> List[Tuple[TaskStep, str]]:
         """并行执行多个步骤"""
         tasks = []
         for step in steps:
             if step.status == "pending":
-                tasks.append(self.executor.execute_step(step, context, trace_id))
+                tasks.append(self.executor.execute_step(step, ctx.global_context, ctx.trace_id))
 
         if not tasks:
             return []
 
-        # 控制最大并行数
-        if len(tasks) > self.parallel_config.max_parallel:
-            chunks = [
-                tasks[i:i + self.parallel_config.max_parallel]
-                for i in range(0, len(tasks), self.parallel_config.max_parallel)
-            ]
-            all_results = []
-            for chunk in chunks:
-                chunk_results = await asyncio.gather(
-                    *chunk,
-                    return_exceptions=self.parallel_config.fail_strategy == "continue"
-                )
-                all_results.extend(chunk_results)
-        else:
-            all_results = await asyncio.gather(
-                *tasks,
-                return_exceptions=self.parallel_config.fail_strategy == "continue"
-            )
+        # 滑动窗口控制最大并行数：任一调用完成即启动下一个
+        pool = BoundedTaskPool(ctx.parallel_config.max_parallel)
+        all_results = await pool.map(
+            tasks,
+            return_exceptions=ctx.parallel_config.fail_strategy == "continue"
+        )
+        pool.log_stats(f"Batch {ctx.trace_id[:8]}")
 
         return all_results
 
     async def _execute_step_with_review(
         self,
         step: TaskStep,
-        plan: ExecutionPlan,
+        ctx: ExecutionContext,
+        context: Dict[str, Any] = None
     ) -> Tuple[TaskStep, str, Optional[ReviewResult]]:
         """
         执行单个步骤并进行审核
 
+        Args:
+            step: 要执行的步骤
+            ctx: 执行上下文
+            context: 该步骤的隔离上下文视图（并行执行时互不影响），默认使用全局上下文
+
         Returns:
             Tuple[step, result, review_result]
         """
-        trace_id = plan.trace_id
+        plan = ctx.plan
+        trace_id = ctx.trace_id
+        retry_counters = ctx.retry_counters
+        if context is None:
+            context = ctx.global_context
 
         # 初始化重试计数
-        if trace_id not in self.retry_counters:
-            self.retry_counters[trace_id] = {}
-        if step.step_id not in self.retry_counters[trace_id]:
-            self.retry_counters[trace_id][step.step_id] = 0
+        if step.step_id not in retry_counters:
+            retry_counters[step.step_id] = 0
 
-        max_retries = self.review_config.max_retries
+        max_retries = ctx.review_config.max_retries
         review_result = None
 
-        while self.retry_counters[trace_id][step.step_id] < max_retries:
+        while retry_counters[step.step_id] < max_retries:
             # 创建执行前快照
-            await self._create_snapshot(plan, step.step_id)
+            await self._create_snapshot(ctx, step.step_id, context)
 
-            # 执行步骤
+            # 执行步骤（重试时跳过结果缓存）
             step, result = await self.executor.execute_step(
-                step, self.global_context, trace_id
+                step, context, trace_id,
+                use_cache=retry_counters[step.step_id] == 0
             )
 
             if step.status == "failed":
-                self.retry_counters[trace_id][step.step_id] += 1
+                retry_counters[step.step_id] += 1
                 logger.warning(
                     f"[重试] Step {step.step_id} 执行失败，重试 "
-                    f"{self.retry_counters[trace_id][step.step_id]}/{max_retries}"
+                    f"{retry_counters[step.step_id]}/{max_retries}"
                 )
                 step.status = "pending"  # 重置状态以便重试
                 continue
@@ -266,30 +317,31 @@ class EnhancedWorkflowEngine:
                 for s in plan.steps
                 if s.step_id != step.step_id
             )
-            should_review = self.reviewer.should_review_step(step.step_id, is_final)
+            should_review = ctx.reviewer.should_review_step(step.step_id, is_final)
 
             if should_review:
                 logger.info(f"[审核] 开始审核 Step {step.step_id}")
-                review_result = await self.reviewer.review_step(
+                review_result = await ctx.reviewer.review_step(
                     step_id=step.step_id,
                     task_description=step.description,
                     result=result,
-                    context=self.global_context,
+                    context=context,
                     dependencies=step.dependencies
                 )
 
                 if not review_result.passed:
-                    # 审核未通过
-                    self.retry_counters[trace_id][step.step_id] += 1
+                    # 审核未通过：不再复用该结果
+                    self.executor.invalidate_cached_result(step, context)
+                    retry_counters[step.step_id] += 1
                     logger.warning(
                         f"[审核] Step {step.step_id} 审核未通过 "
                         f"(score={review_result.score:.2f}), "
-                        f"重试 {self.retry_counters[trace_id][step.step_id]}/{max_retries}"
+                        f"重试 {retry_counters[step.step_id]}/{max_retries}"
                     )
 
                     # 将审核建议加入上下文
                     if review_result.suggestions:
-                        self.global_context["_review_suggestions"] = review_result.suggestions
+                        context["_review_suggestions"] = review_result.suggestions
 
                     # 检查是否需要回溯
                     if (review_result.rollback_recommendation and
@@ -310,11 +362,11 @@ class EnhancedWorkflowEngine:
     async def _handle_rollback(
         self,
         step: TaskStep,
-        plan: ExecutionPlan,
+        ctx: ExecutionContext,
         review_result: ReviewResult
     ) -> Tuple[bool, Optional[int]]:
         """
-        处理回溯逻辑
+        处理回溯逻辑（只回退目标步骤及其下游分支）
 
         Returns:
             Tuple[should_continue, rollback_target_step_id]
@@ -327,14 +379,19 @@ class EnhancedWorkflowEngine:
         if action.action_type == "revert":
             # 尝试回溯
             snapshot = self.snapshot_manager.get_rollback_snapshot(
-                plan.trace_id, action.target_step_id
+                ctx.trace_id, action.target_step_id
             )
             if snapshot:
                 logger.info(
                     f"[回溯] 回溯到 Step {action.target_step_id} "
                     f"(原因: {action.reason})"
                 )
-                await self._restore_from_snapshot(plan, snapshot)
+                affected = self._get_descendants(ctx.plan, action.target_step_id)
+                await self._restore_from_snapshot(ctx, snapshot, step_ids=affected)
+                # 回溯目标的输入不变，需删除其缓存结果才能真正重新执行
+                self.executor.invalidate_cached_result(
+                    ctx.plan.step_map[action.target_step_id], ctx.global_context
+                )
                 return True, action.target_step_id
             else:
                 logger.warning(f"[回溯] 未找到可用快照，无法回溯到 Step {action.target_step_id}")
@@ -346,121 +403,127 @@ class EnhancedWorkflowEngine:
 
         return False, None
 
-    async def stream(
-        self,
-        query: str,
-        context_id: str = None,
-        task_id: str = None,
-        review_config: ReviewConfig = None
-    ):
+    async def _run_schedule(self, ctx: ExecutionContext, queue: deque):
         """
-        主入口流式函数 - 支持审核和回溯
+        并行调度（带审核和回溯）
 
-        Args:
-            query: 用户查询
-            context_id: 上下文ID
-            task_id: 任务ID
-            review_config: 审核配置（覆盖默认配置）
+        就绪步骤在 max_parallel 限制内并发执行、审核和重试，每个在途步骤使用
+        启动时的上下文副本。eager 模式下任一步骤完成即释放后继；batch 模式下
+        等待整批完成。回溯只重置失败分支，分支内仍在运行的步骤会被取消，
+        其过期结果通过代次（epoch）丢弃。
         """
-        # 更新审核配置
-        if review_config:
-            self.review_config = review_config
-            self.reviewer = ReviewerLayer(config=review_config)
-
-        trace_id = generate_trace_id()
-        logger.info(f"[bold magenta]Workflow Started[/bold magenta] (Query: '{query}')")
-        yield self.format_response(
-            f"收到任务：{query}，正在分析... (trace_id: {trace_id})",
-            phase="start",
-            trace_id=trace_id
-        )
+        plan = ctx.plan
+        pool = BoundedTaskPool(ctx.parallel_config.max_parallel)
+        eager = ctx.parallel_config.scheduler != "batch"
+        running: Dict[asyncio.Task, Tuple[TaskStep, int]] = {}
+        epochs: Dict[int, int] = {step.step_id: 0 for step in plan.steps}
 
         try:
-            # 初始化上下文
-            self.global_context = {"user_query": query, "trace_id": trace_id}
-
-            # ========== Phase 1: 任务解析 ==========
-            yield self.format_response("Phase 1: 解析任务...", phase="parsing")
-            plan = await self.parser.parse(query, context_id, task_id)
-            self.global_context["trace_id"] = plan.trace_id
-
-            yield self.format_response(
-                f"任务已拆解为 {len(plan.steps)} 个步骤",
-                phase="parsing",
-                steps=[{
-                    "step_id": s.step_id,
-                    "name": s.name,
-                    "dependencies": s.dependencies
-                } for s in plan.steps]
-            )
-
-            # ========== Phase 2: Agent匹配 ==========
-            yield self.format_response("Phase 2: 匹配Agent...", phase="matching")
-            plan = await self.matcher.match_agents(plan)
-
-            yield self.format_response(
-                "Agent匹配完成",
-                phase="matching",
-                assignments=[{
-                    "step_id": s.step_id,
-                    "agent": getattr(s.assigned_agent, 'name', 'Unknown') if s.assigned_agent else None
-                } for s in plan.steps]
-            )
-
-            # ========== Phase 3: DAG并行执行（带审核） ==========
-            yield self.format_response(
-                "Phase 3: 开始执行...",
-                phase="execution",
-                review_enabled=self.review_config.enabled
-            )
+            while queue or running:
+                # 启动就绪步骤（batch模式下需等待上一批全部完成）
+                launched = []
+                if eager or not running:
+                    while queue:
+                        step = plan.step_map[queue.popleft()]
+                        if step.status != "pending":
+                            continue
+                        context_view = dict(ctx.global_context)
+                        task = asyncio.create_task(
+                            pool.run(self._execute_step_with_review(step, ctx, context_view))
+                        )
+                        running[task] = (step, epochs[step.step_id])
+                        launched.append(step)
 
-            queue = deque()
-            for step in plan.steps:
-                if step.in_degree == 0 and step.status == "pending":
-                    queue.append(step.step_id)
+                if launched:
+                    step_ids = [s.step_id for s in launched]
+                    step_names = [s.name for s in launched]
+                    logger.info(f"Executing Steps {step_ids} ({', '.join(step_names)})")
+                    yield self.format_response(
+                        f"正在执行: {', '.join(step_names)}",
+                        phase="execution",
+                        batch_steps=step_ids
+                    )
 
-            logger.info("[bold yellow]Starting Execution Phase[/bold yellow]")
+                if not running:
+                    break
 
-            while queue:
-                current_step_ids = list(queue)
-                queue.clear()
+                done, _ = await asyncio.wait(
+                    running.keys(),
+                    return_when=asyncio.FIRST_COMPLETED if eager else asyncio.ALL_COMPLETED
+                )
 
-                current_steps = [plan.step_map[sid] for sid in current_step_ids]
+                for task in done:
+                    step, epoch = running.pop(task)
 
-                # 输出当前批次信息
-                step_names = [s.name for s in current_steps]
-                logger.info(f"Executing Batch: Steps {current_step_ids} ({', '.join(step_names)})")
-                yield self.format_response(
-                    f"正在执行: {', '.join(step_names)}",
-                    phase="execution",
-                    batch_steps=current_step_ids
-                )
+                    # 所在分支已被回溯，丢弃过期结果
+                    if task.cancelled() or epoch != epochs[step.step_id]:
+                        logger.info(f"[回溯] 丢弃 Step {step.step_id} 的过期结果")
+                        continue
 
-                # 逐个执行（带审核，不完全并行以支持精确的审核和回溯）
-                for step in current_steps:
-                    # 创建快照
-                    await self._create_snapshot(plan, step.step_id)
+                    error = task.exception()
+                    if error is not None:
+                        if ctx.parallel_config.fail_strategy == "abort":
+                            raise error
+                        step.status = "failed"
+                        step.error = str(error)
+                        await self.state_store.arecord_step(ctx.trace_id, step)
+                        logger.error(f"Step {step.step_id} execution failed: {error}")
+                        yield self.format_response(
+                            f"Step {step.step_id} 执行失败: {step.error}",
+                            phase="error",
+                            step_id=step.step_id,
+                            error=step.error
+                        )
+                        continue
 
-                    # 执行并审核
-                    step, result, review = await self._execute_step_with_review(step, plan)
+                    step, result, review = task.result()
 
-                    if step.status == "failed":
-                        # 检查是否需要回溯
-                        if review and review.rollback_recommendation:
-                            should_rollback, target_id = await self._handle_rollback(
-                                step, plan, review
-                            )
-                            if should_rollback and target_id:
-                                # 回溯后重新加入队列
+                    # 审核建议回退到前置步骤
+                    needs_revert = (
+                        review is not None and not review.passed
+                        and review.rollback_recommendation is not None
+                        and review.rollback_recommendation.action_type == "revert"
+                    )
+                    if (step.status == "failed" or needs_revert) and review and \
+                            review.rollback_recommendation and ctx.review_config.enable_rollback:
+                        should_rollback, target_id = await self._handle_rollback(
+                            step, ctx, review
+                        )
+                        if should_rollback and target_id:
+                            # 取消回退分支中仍在运行的步骤
+                            affected = self._get_descendants(plan, target_id)
+                            for step_id in affected:
+                                epochs[step_id] += 1
+                                await self.state_store.arecord_step(ctx.trace_id, plan.step_map[step_id])
+                            for other_task, (other_step, _) in running.items():
+                                if other_step.step_id in affected:
+                                    other_task.cancel()
+
+                            # 回溯后重新加入队列
+                            if plan.step_map[target_id].in_degree == 0:
                                 queue.append(target_id)
-                                yield self.format_response(
-                                    f"回溯到 Step {target_id}，重新执行",
-                                    phase="rollback",
-                                    rollback_target=target_id
-                                )
-                                continue
+                            yield self.format_response(
+                                f"回溯到 Step {target_id}，重新执行",
+                                phase="rollback",
+                                rollback_target=target_id
+                            )
+                            continue
+
+                    if needs_revert and step.status != "failed":
+                        # 无法回溯（无可用快照或未启用回溯）：被否决的结果不能当作成功，改走重试
+                        if ctx.retry_counters[step.step_id] < ctx.review_config.max_retries:
+                            logger.warning(f"[回溯] 无法回溯，重新执行 Step {step.step_id}")
+                            step.status = "pending"
+                            queue.append(step.step_id)
+                            continue
+                        step.status = "failed"
+                        step.error = (
+                            f"审核未通过且无法回溯到 Step {review.rollback_recommendation.target_step_id}"
+                        )
 
+                    if step.status == "failed":
                         # 无法恢复的失败
+                        await self.state_store.arecord_step(ctx.trace_id, step)
                         yield self.format_response(
                             f"Step {step.step_id} 执行失败: {step.error}",
                             phase="error",
@@ -469,8 +532,9 @@ class EnhancedWorkflowEngine:
                         )
                         continue
 
-                    # 成功：更新上下文
-                    self.global_context[f"step_{step.step_id}_output"] = result
+                    # 成功：更新上下文并写入步骤完成记录
+                    ctx.global_context[f"step_{step.step_id}_output"] = result
+                    await self.state_store.arecord_step(ctx.trace_id, step, result)
 
                     # 输出结果
                     preview = result[:150] + "..." if len(result) > 150 else result
@@ -485,7 +549,8 @@ class EnhancedWorkflowEngine:
                         step_name=step.name,
                         result_preview=preview,
                         review_score=review.score if review else None,
-                        review_passed=review.passed if review else None
+                        review_passed=review.passed if review else None,
+                        cache_hit=step.cache_hit
                     )
 
                     # 更新后继步骤入度
@@ -494,9 +559,136 @@ class EnhancedWorkflowEngine:
                         succ_step.in_degree -= 1
                         if succ_step.in_degree == 0 and succ_step.status == "pending":
                             queue.append(succ_id)
+        finally:
+            for task in running:
+                task.cancel()
+            pool.log_stats(f"Scheduler {ctx.trace_id[:8]}")
+
+    async def stream(
+        self,
+        query: str,
+        context_id: str = None,
+        task_id: str = None,
+        review_config: ReviewConfig = None,
+        trace_id: str = None,
+        parallel_config: ParallelConfig = None,
+        use_plan_cache: bool = True
+    ):
+        """
+        主入口流式函数 - 支持审核和回溯
+
+        每次调用创建独立的 ExecutionContext，审核配置只作用于本次执行，
+        同一引擎实例可并发运行多个工作流。
+
+        Args:
+            query: 用户查询
+            context_id: 上下文ID
+            task_id: 任务ID
+            review_config: 审核配置（仅覆盖本次执行）
+            trace_id: 指定trace_id（默认自动生成）
+            parallel_config: 并行配置（仅覆盖本次执行）
+            use_plan_cache: 是否复用解析器缓存的执行计划
+
+        Raises:
+            RuntimeError: 指定的 trace_id 正在执行（避免同一计划在共享上下文上重复执行）
+        """
+        if trace_id and trace_id in self.executions:
+            raise RuntimeError(f"Workflow {trace_id} is already running")
+
+        # 本次执行的审核配置：共享审核层的LLM客户端，只替换配置
+        review_config = review_config or self.review_config
+        reviewer = self.reviewer if review_config is self.review_config \
+            else self.reviewer.with_config(review_config)
+
+        trace_id = trace_id or generate_trace_id()
+        ctx = ExecutionContext(
+            trace_id,
+            query,
+            parallel_config or self.parallel_config,
+            review_config=review_config,
+            reviewer=reviewer
+        )
+        self.executions[trace_id] = ctx
+        logger.info(f"[bold magenta]Workflow Started[/bold magenta] (Query: '{query}')")
+        yield self.format_response(
+            f"收到任务：{query}，正在分析... (trace_id: {trace_id})",
+            phase="start",
+            trace_id=trace_id
+        )
+
+        try:
+            # 存在已持久化的计划则从断点恢复：跳过解析和匹配，已成功的步骤不再执行
+            saved_state = await self.state_store.aload(trace_id)
+            plan = saved_state.restore_plan() if saved_state else None
+            if plan:
+                ctx.global_context = saved_state.restore_context()
+                ctx.plan = plan
+                self.snapshot_manager.load_trace_snapshots(trace_id)
+                logger.info(
+                    f"Resuming workflow from breakpoint (trace_id: {trace_id}, "
+                    f"completed steps: {saved_state.completed_steps})"
+                )
+                yield self.format_response(
+                    f"发现断点，将从上次中断处继续执行... (trace_id: {trace_id})",
+                    phase="resume",
+                    trace_id=trace_id,
+                    completed_steps=saved_state.completed_steps
+                )
+            else:
+                # ========== Phase 1: 任务解析 ==========
+                yield self.format_response("Phase 1: 解析任务...", phase="parsing")
+                plan = await self.parser.parse(query, context_id, task_id, use_cache=use_plan_cache)
+                plan.trace_id = trace_id
+                ctx.plan = plan
+
+                yield self.format_response(
+                    f"任务已拆解为 {len(plan.steps)} 个步骤{'（复用缓存计划）' if plan.cache_hit else ''}",
+                    phase="parsing",
+                    plan_cached=plan.cache_hit,
+                    steps=[{
+                        "step_id": s.step_id,
+                        "name": s.name,
+                        "dependencies": s.dependencies
+                    } for s in plan.steps]
+                )
+
+                # ========== Phase 2: Agent匹配 ==========
+                yield self.format_response("Phase 2: 匹配Agent...", phase="matching")
+                plan = await self.matcher.match_agents(plan)
+                ctx.plan = plan
+                await self.state_store.asave_plan(trace_id, query, plan, context_id, task_id)
+
+                yield self.format_response(
+                    "Agent匹配完成",
+                    phase="matching",
+                    assignments=[{
+                        "step_id": s.step_id,
+                        "agent": getattr(s.assigned_agent, 'name', 'Unknown') if s.assigned_agent else None
+                    } for s in plan.steps]
+                )
+
+            # 后台预先建立到已分配Agent的HTTP连接
+            self.executor.prewarm(s for s in plan.steps if s.status != "success")
+
+            # ========== Phase 3: DAG并行执行（带审核） ==========
+            yield self.format_response(
+                "Phase 3: 开始执行...",
+                phase="execution",
+                review_enabled=review_config.enabled
+            )
+
+            queue = deque()
+            for step in plan.steps:
+                if step.in_degree == 0 and step.status == "pending":
+                    queue.append(step.step_id)
+
+            logger.info(f"[bold yellow]Starting Execution Phase[/bold yellow] (scheduler: {ctx.parallel_config.scheduler})")
+
+            async for response in self._run_schedule(ctx, queue):
+                yield response
 
             # ========== Phase 4: 最终审核（可选） ==========
-            if self.review_config.review_final_only and self.review_config.enabled:
+            if review_config.review_final_only and review_config.enabled:
                 yield self.format_response("Phase 4: 最终审核...", phase="final_review")
 
                 all_results = {
@@ -505,7 +697,7 @@ class EnhancedWorkflowEngine:
                 }
                 step_names = {s.step_id: s.name for s in plan.steps}
 
-                final_review = await self.reviewer.review_final_result(
+                final_review = await reviewer.review_final_result(
                     goal=plan.goal,
                     all_results=all_results,
                     step_names=step_names
@@ -528,15 +720,11 @@ class EnhancedWorkflowEngine:
                     final_output.append(f"## Step {step.step_id}: {step.name}\n\n{step.result}\n")
 
             full_result_text = "\n".join(final_output)
-            saved_path = self._save_result_to_file(query, full_result_text, plan.trace_id, plan)
+            saved_path = self._save_result_to_file(query, full_result_text, trace_id, plan)
 
-            # 保存上下文
-            self.global_context_store[plan.trace_id] = self.global_context
+            ctx.finish("completed")
 
-            # 清理快照
-            self.snapshot_manager.clear_trace_snapshots(plan.trace_id)
-
-            logger.info(f"[bold green]Workflow Completed![/bold green] (trace_id: {plan.trace_id})")
+            logger.info(f"[bold green]Workflow Completed![/bold green] (trace_id: {trace_id})")
 
             completion_msg = "所有任务步骤执行完毕！"
             if saved_path:
@@ -546,13 +734,16 @@ class EnhancedWorkflowEngine:
                 completion_msg,
                 is_complete=True,
                 phase="complete",
-                trace_id=plan.trace_id,
+                trace_id=trace_id,
                 saved_path=saved_path,
                 total_steps=len(plan.steps),
-                successful_steps=len([s for s in plan.steps if s.status == "success"])
+                successful_steps=len([s for s in plan.steps if s.status == "success"]),
+                cache_hits=len([s for s in plan.steps if s.cache_hit]),
+                cache_stats=self.executor.get_cache_stats()
             )
 
         except Exception as e:
+            ctx.finish("failed")
             logger.error(f"Workflow crashed (trace_id: {trace_id}): {traceback.format_exc()}")
             yield self.format_response(
                 f"Workflow Critical Error: {e}",
@@ -561,6 +752,41 @@ class EnhancedWorkflowEngine:
                 error=str(e),
                 traceback=traceback.format_exc()
             )
+        finally:
+            if ctx.status == "running":
+                ctx.finish("cancelled")
+            # 成功完成的工作流由状态存储一并删除其计划、步骤记录和持久化快照；
+            # 未完成的工作流保留已持久化的快照，恢复执行时仍可回溯
+            await self.state_store.amark_finished(trace_id, ctx.status)
+            self.snapshot_manager.clear_trace_snapshots(trace_id, keep_persisted=True)
+            self.executions.pop(trace_id, None)
+
+    async def resume(
+        self,
+        trace_id: str,
+        review_config: ReviewConfig = None,
+        parallel_config: ParallelConfig = None
+    ):
+        """
+        从状态存储中恢复指定trace的工作流，已成功的步骤不会重新执行
+
+        Args:
+            trace_id: 要恢复的任务追踪ID
+            review_config: 审核配置（仅覆盖本次执行）
+            parallel_config: 并行配置（仅覆盖本次执行）
+        """
+        saved_state = await self.state_store.aload(trace_id)
+        if not saved_state:
+            raise ValueError(f"No saved workflow state for trace_id: {trace_id}")
+        async for response in self.stream(
+            saved_state.query,
+            context_id=saved_state.context_id,
+            task_id=saved_state.task_id,
+            review_config=review_config,
+            trace_id=trace_id,
+            parallel_config=parallel_config
+        ):
+            yield response
 
     async def run(
         self,
@@ -18,7 +18,9 @@ def main():
 
 @main.command()
 @click.argument('query', required=False)
-def run(query):
+@click.option('--scheduler', type=click.Choice(['eager', 'batch']), default='eager', help='调度模式：eager（依赖完成即启动后继）/ batch（按层批量执行）')
+@click.option('--plan-cache/--no-plan-cache', default=True, help='是否复用缓存的执行计划')
+def run(query, scheduler, plan_cache):
     """Run a single task or enter interactive mode."""
     init_api_key()
     
@@ -28,6 +30,7 @@ def run(query):
         return
 
     agent = WorkflowEngine()
+    agent.parallel_config.scheduler = scheduler
 
     async def _run_loop():
         nonlocal query
@@ -41,7 +44,7 @@ def run(query):
             click.echo(f"\n🚀 开始执行任务: {query}\n")
             
             try:
-                async for response in agent.stream(query):
+                async for response in agent.stream(query, use_plan_cache=plan_cache):
                     click.echo(f"[{'DONE' if response['is_complete'] else 'PROG'}] {response['content']}")
             except Exception as e:
                 click.echo(f"Error: {e}")
@@ -49,6 +52,8 @@ def run(query):
             query = None # Reset for next loop
             click.echo("\n------------------------------------------------\n")
 
+        await agent.aclose()
+
     asyncio.run(_run_loop())
 
 if __name__ == "__main__":
@@ -32,7 +32,8 @@ def main():
 @click.option('--max-retries', default=3, type=int, help='最大重试次数')
 @click.option('--rollback/--no-rollback', default=True, help='启用/禁用回溯机制')
 @click.option('--critical-steps', default='', help='关键步骤ID列表，逗号分隔，如: 1,3,5')
-def run(query, review, review_all, threshold, max_retries, rollback, critical_steps):
+@click.option('--plan-cache/--no-plan-cache', default=True, help='是否复用缓存的执行计划')
+def run(query, review, review_all, threshold, max_retries, rollback, critical_steps, plan_cache):
     """
     运行任务（增强版，支持审核和回溯）
 
@@ -99,7 +100,7 @@ def run(query, review, review_all, threshold, max_retries, rollback, critical_st
             click.echo(f"{'=' * 60}\n")
 
             try:
-                async for response in engine.stream(query, review_config=review_config):
+                async for response in engine.stream(query, review_config=review_config, use_plan_cache=plan_cache):
                     _display_response(response)
             except Exception as e:
                 click.echo(click.style(f"Error: {e}", fg='red'))
@@ -108,6 +109,8 @@ def run(query, review, review_all, threshold, max_retries, rollback, critical_st
             query = None
             click.echo("\n" + "-" * 60 + "\n")
 
+        await engine.aclose()
+
     asyncio.run(_run_loop())
 
 
@@ -125,6 +128,7 @@ def _display_response(response: dict):
         'execution': ('yellow', '⚡'),
         'step_complete': ('green', '✅'),
         'rollback': ('red', '🔄'),
+        'resume': ('cyan', '⏯️'),
         'final_review': ('cyan', '📝'),
         'complete': ('green', '🎉'),
         'error': ('red', '❌'),
@@ -147,6 +151,9 @@ def _display_response(response: dict):
     if response.get('step_id'):
         output += f" (Step {response['step_id']})"
 
+    if response.get('cache_hit'):
+        output += click.style(" [缓存]", fg='blue')
+
     click.echo(click.style(output, fg=color))
 
     # 显示额外信息
@@ -167,9 +174,86 @@ def _display_response(response: dict):
             click.echo(click.style(f"结果已保存: {response['saved_path']}", fg='green'))
         if response.get('trace_id'):
             click.echo(click.style(f"Trace ID: {response['trace_id']}", fg='green'))
+        if response.get('cache_hits'):
+            click.echo(click.style(
+                f"缓存命中: {response['cache_hits']}/{response.get('total_steps', '?')} 个步骤", fg='green'
+            ))
         click.echo(click.style("=" * 60, fg='green'))
 
 
+@main.command()
+@click.option('--host', default='0.0.0.0', help='监听地址')
+@click.option('--port', default=10100, type=int, help='监听端口')
+@click.option('--max-concurrent', default=50, type=int, help='同时运行的工作流上限')
+@click.option('--drain-timeout', default=60.0, type=float, help='关闭时等待运行中工作流的秒数')
+def serve(host, port, max_concurrent, drain_timeout):
+    """
+    以服务模式运行（HTTP/SSE）
+
+    示例:
+        yinqing-enhanced serve --port 10100
+        curl -N -X POST "localhost:10100/workflows?stream=true" -d '{"query": "写一份技术报告"}'
+    """
+    init_api_key()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        click.echo("Error: OPENAI_API_KEY environment variable is not set.")
+        return
+
+    from yinqing.server import run_server
+    run_server(host=host, port=port, max_concurrent=max_concurrent, drain_timeout=drain_timeout)
+
+
+@main.command()
+@click.argument('trace_id', required=False)
+@click.option('--list', 'list_traces', is_flag=True, help='列出未完成、可恢复的工作流')
+def resume(trace_id, list_traces):
+    """
+    从断点恢复工作流（已完成的步骤不会重新执行）
+
+    示例:
+        yinqing-enhanced resume --list
+        yinqing-enhanced resume 3f2b8c1e-...
+    """
+    from yinqing.core.state_store import create_state_backend
+
+    if list_traces or not trace_id:
+        store = create_state_backend()
+        traces = [t for t in store.list_traces() if t["status"] != "completed"]
+        store.close()
+        if not traces:
+            click.echo("没有可恢复的工作流")
+            return
+        click.echo("\n可恢复的工作流:")
+        click.echo("-" * 60)
+        for t in traces:
+            click.echo(
+                f"  {t['trace_id']}  [{t['status']}] 已完成 {t['completed_steps']} 步  "
+                f"{t['updated_at']}\n    {t['query'][:60]}"
+            )
+        click.echo("-" * 60)
+        return
+
+    init_api_key()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        click.echo("Error: OPENAI_API_KEY environment variable is not set.")
+        return
+
+    engine = EnhancedWorkflowEngine()
+
+    async def _resume():
+        try:
+            async for response in engine.resume(trace_id):
+                _display_response(response)
+        except ValueError as e:
+            click.echo(click.style(f"Error: {e}", fg='red'))
+        finally:
+            await engine.aclose()
+
+    asyncio.run(_resume())
+
+
 @main.command()
 def status():
     """查看系统状态"""
@@ -183,10 +267,10 @@ def status():
     else:
         click.echo(click.style("❌ OPENAI_API_KEY: 未配置", fg='red'))
 
-    # 检查服务端口
-    import socket
-    ports = {
-        10000: "MCP Server",
+    # 检查服务状态：MCP Server 检查端口，各 Agent 并发请求 /health
+    from yinqing.core.health import AgentHealthMonitor
+    mcp_port = 10000
+    agents = {
         10001: "Researcher Agent",
         10002: "Writer Agent",
         10003: "Coder Agent",
@@ -196,15 +280,34 @@ def status():
         10007: "Quality Reviewer Agent",
     }
 
+    async def _check():
+        async def _port_open(port: int) -> bool:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection('localhost', port), timeout=1)
+            except (OSError, asyncio.TimeoutError):
+                return False
+            writer.close()
+            return True
+
+        monitor = AgentHealthMonitor()
+        monitor.watch(f"http://localhost:{port}" for port in agents)
+        try:
+            mcp_up, _ = await asyncio.gather(_port_open(mcp_port), monitor.check_all())
+            return mcp_up, monitor.get_stats()["endpoints"]
+        finally:
+            await monitor.aclose()
+
+    mcp_up, endpoints = asyncio.run(_check())
+
     click.echo("\n服务状态:")
-    for port, name in ports.items():
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex(('localhost', port))
-        sock.close()
-
-        if result == 0:
-            click.echo(click.style(f"  ✅ {name} (:{port}): 运行中", fg='green'))
+    if mcp_up:
+        click.echo(click.style(f"  ✅ MCP Server (:{mcp_port}): 运行中", fg='green'))
+    else:
+        click.echo(click.style(f"  ❌ MCP Server (:{mcp_port}): 未运行", fg='red'))
+    for port, name in agents.items():
+        health = endpoints.get(f"http://localhost:{port}", {})
+        if health.get("status") == "up":
+            click.echo(click.style(f"  ✅ {name} (:{port}): 运行中 ({health['latency_ms']}ms)", fg='green'))
         else:
             click.echo(click.style(f"  ❌ {name} (:{port}): 未运行", fg='red'))
 
@@ -0,0 +1,456 @@
+"""
+YinQing Agent 工作流服务
+以 HTTP/SSE 方式暴露 EnhancedWorkflowEngine.stream，供负载均衡后的长驻部署使用
+
+接口:
+    POST /workflows                     提交工作流，返回 trace_id（?stream=true 时直接返回SSE流）
+    GET  /workflows/{trace_id}          查询状态
+    GET  /workflows/{trace_id}/events   订阅进度事件（SSE，会先回放已产生的事件）
+    GET  /workflows/{trace_id}/result   获取最终结果
+    POST /workflows/{trace_id}/resume   从状态存储恢复中断的工作流
+    GET  /health                        健康检查
+"""
+
+import json
+import asyncio
+import contextlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from pydantic import ValidationError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from yinqing.core.types import generate_trace_id
+from yinqing.core.reviewer import ReviewConfig
+from yinqing.core.workflow_enhanced import EnhancedWorkflowEngine
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TraceRecord:
+    """
+    单个工作流的事件记录，供多个SSE订阅者回放和等待
+
+    只保留最近 max_events 个事件（最终结果单独保存在 final_event 中），
+    更早的事件被丢弃，回放时从仍保留的最早事件开始
+    """
+
+    def __init__(self, trace_id: str, query: str, max_events: int = 1000):
+        self.trace_id = trace_id
+        self.query = query
+        self.status = "queued"  # queued/running/completed/failed/cancelled
+        self.events: List[Dict[str, Any]] = []
+        self.max_events = max_events
+        self.dropped = 0  # 已丢弃的最早事件数
+        self.final_event: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    async def append(self, event: Dict[str, Any]):
+        async with self._changed:
+            self.events.append(event)
+            overflow = len(self.events) - self.max_events
+            if overflow > 0:
+                del self.events[:overflow]
+                self.dropped += overflow
+            self._changed.notify_all()
+
+    async def finish(self, status: str):
+        async with self._changed:
+            self.status = status
+            self.finished_at = datetime.now()
+            self._changed.notify_all()
+
+    async def follow(self):
+        """从头回放事件，并持续等待新事件直到工作流结束（index 为包含已丢弃事件在内的绝对序号）"""
+        index = 0
+        while True:
+            async with self._changed:
+                while index >= self.event_count and not self.finished:
+                    await self._changed.wait()
+                # 订阅者落后时跳过已丢弃的事件
+                index = max(index, self.dropped)
+                pending = self.events[index - self.dropped:]
+                finished = self.finished
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= self.event_count:
+                return
+
+    @property
+    def event_count(self) -> int:
+        return self.dropped + len(self.events)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "query": self.query,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "event_count": self.event_count,
+            "dropped_events": self.dropped,
+            "last_event": self.events[-1] if self.events else None
+        }
+
+
+class WorkflowService:
+    """
+    工作流服务
+
+    所有请求共享一个 EnhancedWorkflowEngine（解析器、匹配器、执行器和LLM客户端只创建一次），
+    每个提交在后台任务中运行，进度事件缓存在 TraceRecord 中供查询和SSE订阅。
+    """
+
+    def __init__(
+        self,
+        engine: EnhancedWorkflowEngine = None,
+        max_concurrent: int = 50,
+        max_records: int = 1000,
+        max_events: int = 1000,
+        record_ttl: float = 3600.0
+    ):
+        """
+        Args:
+            engine: 共享的工作流引擎，None则创建默认引擎
+            max_concurrent: 同时运行的工作流上限，超出的提交排队等待
+            max_records: 保留的已结束工作流记录数
+            max_events: 每个工作流保留的最近事件数
+            record_ttl: 已结束工作流记录的保留秒数
+        """
+        self.engine = engine or EnhancedWorkflowEngine()
+        self.max_concurrent = max_concurrent
+        self.max_records = max_records
+        self.max_events = max_events
+        self.record_ttl = record_ttl
+        self.records: Dict[str, TraceRecord] = OrderedDict()
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def submit(
+        self,
+        query: str,
+        review_config: ReviewConfig = None,
+        context_id: str = None,
+        task_id: str = None,
+        trace_id: str = None,
+        use_plan_cache: bool = True
+    ) -> TraceRecord:
+        """提交工作流，立即返回记录（在后台执行）；指定已持久化的 trace_id 时从断点恢复"""
+        if self.draining:
+            raise RuntimeError("Service is draining, not accepting new workflows")
+
+        trace_id = trace_id or generate_trace_id()
+        record = TraceRecord(trace_id, query, max_events=self.max_events)
+        self.records[trace_id] = record
+        self._evict_old_records()
+
+        record.task = asyncio.create_task(
+            self._run(record, review_config, context_id, task_id, use_plan_cache)
+        )
+        logger.info(f"[Service] Workflow submitted (trace_id: {trace_id})")
+        return record
+
+    async def _run(
+        self,
+        record: TraceRecord,
+        review_config: Optional[ReviewConfig],
+        context_id: Optional[str],
+        task_id: Optional[str],
+        use_plan_cache: bool = True
+    ):
+        status = "failed"
+        try:
+            async with self._slots:
+                record.status = "running"
+                async for event in self.engine.stream(
+                    record.query,
+                    context_id=context_id,
+                    task_id=task_id,
+                    review_config=review_config,
+                    trace_id=record.trace_id,
+                    use_plan_cache=use_plan_cache
+                ):
+                    await record.append(event)
+                    if event.get("is_complete"):
+                        record.final_event = event
+                        status = "completed"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"[Service] Workflow {record.trace_id} failed: {e}")
+            await record.append({"content": f"Service Error: {e}", "is_complete": False, "phase": "error"})
+        finally:
+            await record.finish(status)
+            logger.info(f"[Service] Workflow {status} (trace_id: {record.trace_id})")
+
+    def _evict_old_records(self):
+        """淘汰超过保留时间的已结束记录，并只保留最近 max_records 条，运行中的记录不会被淘汰"""
+        expire_before = datetime.now() - timedelta(seconds=self.record_ttl)
+        for trace_id in [
+            trace_id for trace_id, record in self.records.items()
+            if record.finished and record.finished_at and record.finished_at < expire_before
+        ]:
+            del self.records[trace_id]
+
+        overflow = len(self.records) - self.max_records
+        if overflow <= 0:
+            return
+        for trace_id in list(self.records.keys()):
+            if overflow <= 0:
+                break
+            if self.records[trace_id].finished:
+                del self.records[trace_id]
+                overflow -= 1
+
+    def get(self, trace_id: str) -> Optional[TraceRecord]:
+        self._evict_old_records()
+        return self.records.get(trace_id)
+
+    @property
+    def active_count(self) -> int:
+        return len([r for r in self.records.values() if not r.finished])
+
+    async def drain(self, timeout: float = 60.0):
+        """停止接收新工作流，等待运行中的工作流结束，超时后取消剩余工作流"""
+        self.draining = True
+        tasks = [r.task for r in self.records.values() if r.task and not r.task.done()]
+        if not tasks:
+            return
+        logger.info(f"[Service] Draining {len(tasks)} running workflows (timeout: {timeout}s)...")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"[Service] Cancelled {len(pending)} workflows after drain timeout")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# ==================== HTTP 接口 ====================
+
+def _sse_event(event: Dict[str, Any]) -> str:
+    name = "complete" if event.get("is_complete") else event.get("phase", "progress")
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {name}\ndata: {data}\n\n"
+
+
+def _sse_response(record: TraceRecord) -> StreamingResponse:
+    async def _events():
+        yield f"event: trace\ndata: {json.dumps({'trace_id': record.trace_id})}\n\n"
+        async for event in record.follow():
+            yield _sse_event(event)
+        yield f"event: end\ndata: {json.dumps(record.to_dict(), ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def create_app(
+    service: WorkflowService = None,
+    max_concurrent: int = 50,
+    drain_timeout: float = 60.0
+) -> Starlette:
+    """
+    创建工作流服务的 Starlette 应用
+
+    Args:
+        service: 已创建的服务实例，None则在启动时创建
+        max_concurrent: 同时运行的工作流上限（仅在自动创建服务时使用）
+        drain_timeout: 关闭时等待运行中工作流的秒数
+    """
+
+    state: Dict[str, WorkflowService] = {}
+
+    def _service() -> WorkflowService:
+        if "service" not in state:
+            state["service"] = service or WorkflowService(max_concurrent=max_concurrent)
+        return state["service"]
+
+    async def submit_workflow(request: Request):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+        if not isinstance(body, dict):
+            return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+
+        query = body.get("query") or ""
+        if not isinstance(query, str) or not query.strip():
+            return JSONResponse({"error": "Field 'query' must be a non-empty string"}, status_code=400)
+        query = query.strip()
+
+        use_plan_cache = body.get("use_plan_cache", True)
+        if isinstance(use_plan_cache, str) and use_plan_cache.lower() in ("true", "false"):
+            use_plan_cache = use_plan_cache.lower() == "true"
+        if not isinstance(use_plan_cache, bool):
+            return JSONResponse({"error": "Field 'use_plan_cache' must be a boolean"}, status_code=400)
+
+        review_config = None
+        if body.get("review_config") is not None:
+            if not isinstance(body["review_config"], dict):
+                return JSONResponse({"error": "Field 'review_config' must be a JSON object"}, status_code=400)
+            try:
+                review_config = ReviewConfig(**body["review_config"])
+            except ValidationError as e:
+                return JSONResponse({"error": f"Invalid review_config: {e}"}, status_code=400)
+
+        try:
+            record = _service().submit(
+                query,
+                review_config=review_config,
+                context_id=body.get("context_id"),
+                task_id=body.get("task_id"),
+                use_plan_cache=use_plan_cache
+            )
+        except RuntimeError as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
+
+        if request.query_params.get("stream", "").lower() in ("1", "true", "yes"):
+            return _sse_response(record)
+
+        return JSONResponse({
+            "trace_id": record.trace_id,
+            "status": record.status,
+            "status_url": f"/workflows/{record.trace_id}",
+            "events_url": f"/workflows/{record.trace_id}/events",
+            "result_url": f"/workflows/{record.trace_id}/result"
+        }, status_code=202)
+
+    async def resume_workflow(request: Request):
+        trace_id = request.path_params["trace_id"]
+        svc = _service()
+        record = svc.get(trace_id)
+        if record and not record.finished:
+            return JSONResponse({"trace_id": trace_id, "status": record.status}, status_code=409)
+        if trace_id in svc.engine.executions:
+            # 由其他入口（如直接调用引擎）启动、仍在执行的工作流
+            return JSONResponse({"trace_id": trace_id, "status": "running"}, status_code=409)
+
+        saved_state = await svc.engine.state_store.aload(trace_id)
+        if not saved_state:
+            return JSONResponse({"error": f"No saved state for trace_id: {trace_id}"}, status_code=404)
+
+        try:
+            record = svc.submit(
+                saved_state.query,
+                context_id=saved_state.context_id,
+                task_id=saved_state.task_id,
+                trace_id=trace_id
+            )
+        except RuntimeError as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
+
+        if request.query_params.get("stream", "").lower() in ("1", "true", "yes"):
+            return _sse_response(record)
+
+        return JSONResponse({
+            "trace_id": trace_id,
+            "status": record.status,
+            "completed_steps": saved_state.completed_steps,
+            "events_url": f"/workflows/{trace_id}/events",
+            "result_url": f"/workflows/{trace_id}/result"
+        }, status_code=202)
+
+    async def get_workflow(request: Request):
+        trace_id = request.path_params["trace_id"]
+        record = _service().get(trace_id)
+        if not record:
+            return JSONResponse({"error": f"Unknown trace_id: {trace_id}"}, status_code=404)
+
+        payload = record.to_dict()
+        ctx = _service().engine.executions.get(trace_id)
+        if ctx:
+            payload["execution"] = ctx.get_summary()
+        return JSONResponse(json.loads(json.dumps(payload, ensure_ascii=False, default=str)))
+
+    async def stream_events(request: Request):
+        trace_id = request.path_params["trace_id"]
+        record = _service().get(trace_id)
+        if not record:
+            return JSONResponse({"error": f"Unknown trace_id: {trace_id}"}, status_code=404)
+        return _sse_response(record)
+
+    async def get_result(request: Request):
+        trace_id = request.path_params["trace_id"]
+        record = _service().get(trace_id)
+        if not record:
+            return JSONResponse({"error": f"Unknown trace_id: {trace_id}"}, status_code=404)
+        if not record.finished:
+            return JSONResponse({"trace_id": trace_id, "status": record.status}, status_code=409)
+
+        return JSONResponse(json.loads(json.dumps({
+            "trace_id": trace_id,
+            "status": record.status,
+            "final_event": record.final_event,
+            "saved_path": (record.final_event or {}).get("saved_path")
+        }, ensure_ascii=False, default=str)))
+
+    async def health_check(request: Request):
+        svc = _service()
+        return JSONResponse({
+            "status": "draining" if svc.draining else "healthy",
+            "service": "YinQing Workflow Service",
+            "active_workflows": svc.active_count,
+            "max_concurrent": svc.max_concurrent,
+            "agents": svc.engine.executor.admission.get_stats(),
+            "plan_cache": svc.engine.parser.plan_cache.get_stats() if svc.engine.parser.plan_cache else None,
+            "match_cache": svc.engine.matcher.get_cache_stats(),
+            "mcp": svc.engine.matcher.sessions.get_stats(),
+            "result_cache": svc.engine.executor.get_cache_stats(),
+            "http_pool": svc.engine.executor.get_http_stats(),
+            "resilience": svc.engine.executor.get_resilience_stats(),
+            "agent_health": svc.engine.executor.get_health_stats(),
+            "single_flight": svc.engine.executor.get_coalesce_stats()
+        }, status_code=503 if svc.draining else 200)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        _service()
+        yield
+        await _service().drain(timeout=drain_timeout)
+        await _service().engine.aclose()
+
+    return Starlette(
+        routes=[
+            Route("/workflows", submit_workflow, methods=["POST"]),
+            Route("/workflows/{trace_id}", get_workflow, methods=["GET"]),
+            Route("/workflows/{trace_id}/events", stream_events, methods=["GET"]),
+            Route("/workflows/{trace_id}/result", get_result, methods=["GET"]),
+            Route("/workflows/{trace_id}/resume", resume_workflow, methods=["POST"]),
+            Route("/health", health_check, methods=["GET"]),
+        ],
+        lifespan=lifespan
+    )
+
+
+def run_server(
+    host: str = "0.0.0.0",
+    port: int = 10100,
+    max_concurrent: int = 50,
+    drain_timeout: float = 60.0
+):
+    """启动工作流服务"""
+    logger.info(f"[bold magenta]Starting YinQing Workflow Service on {host}:{port}[/bold magenta]")
+    app = create_app(max_concurrent=max_concurrent, drain_timeout=drain_timeout)
+    uvicorn.run(app, host=host, port=port, timeout_graceful_shutdown=int(drain_timeout) + 5)
+
+
+if __name__ == "__main__":
+    run_server()
@@ -0,0 +1,372 @@
+"""
+通用缓存 (TTL + LRU)
+内存缓存按最近使用淘汰并支持过期时间；SQLite 缓存在内存缓存之下增加磁盘持久层，
+进程重启后缓存仍然有效。值需要可以 JSON 序列化。
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from yinqing.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+
+def normalize_key(text: str, strip_punctuation: bool = False) -> str:
+    """
+    规范化缓存键：全角转半角（NFKC）、统一小写、合并空白，可选去除标点
+
+    Args:
+        text: 原始文本
+        strip_punctuation: 是否去掉所有标点符号（中英文）
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    if strip_punctuation:
+        text = "".join(
+            " " if unicodedata.category(ch).startswith("P") else ch
+            for ch in text
+        )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TTLCache:
+    """
+    内存 LRU 缓存
+
+    - 超过 max_entries 时淘汰最久未使用的条目
+    - 每个条目有过期时间（ttl 秒，None 表示不过期），读取时惰性删除；
+      设置 sweep_interval 后，写入时会定期主动清理所有过期条目
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: Optional[float] = 3600.0,
+        name: str = "cache",
+        sweep_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            max_entries: 最大条目数
+            ttl: 默认过期秒数，None表示不过期
+            name: 缓存名称（用于日志和统计）
+            sweep_interval: 主动清理过期条目的间隔秒数，None表示只惰性删除
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.name = name
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    def _get_local(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value: Any, expires_at: Optional[float]):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _maybe_sweep(self):
+        """距上次清理超过 sweep_interval 时清理全部过期条目（读写和统计大小时都会检查）"""
+        if self.sweep_interval and time.time() - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = time.time()
+            removed = self.purge_expired()
+            if removed:
+                logger.debug(f"[Cache:{self.name}] Swept {removed} expired entries")
+
+    def purge_expired(self) -> int:
+        """清理所有过期条目，返回清理数量"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                key for key, (_, expires_at) in self._entries.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for key in expired:
+                del self._entries[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期返回 default"""
+        self._maybe_sweep()
+        value = self._get_local(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入缓存，ttl为None时使用默认过期时间"""
+        self._set_local(key, value, self._expires_at(ttl))
+        self.sets += 1
+        self._maybe_sweep()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        self._maybe_sweep()
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self._get_local(key) is not _MISSING
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率等统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def close(self):
+        pass
+
+
+class SQLiteCache(TTLCache):
+    """
+    磁盘持久化的 LRU 缓存
+
+    内存中保留最近使用的一部分条目，未命中时查询 SQLite；
+    同一个数据库文件可以按 namespace 存放多个缓存。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "default",
+        max_entries: int = 10000,
+        ttl: Optional[float] = 86400.0,
+        memory_entries: int = 256,
+        sweep_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            path: SQLite数据库路径（多个进程可共用同一文件）
+            namespace: 缓存命名空间
+            max_entries: 磁盘上的最大条目数
+            ttl: 默认过期秒数，None表示不过期
+            memory_entries: 内存中保留的热点条目数
+            sweep_interval: 主动清理过期条目的间隔秒数
+        """
+        super().__init__(
+            max_entries=min(memory_entries, max_entries),
+            ttl=ttl,
+            name=namespace,
+            sweep_interval=sweep_interval
+        )
+        self.path = path
+        self.namespace = namespace
+        self.disk_max_entries = max(1, max_entries)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache (namespace, accessed_at);
+            """
+        )
+        self._db_lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._maybe_sweep()
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        now = time.time()
+        rows = self._execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        )
+        if not rows:
+            self.misses += 1
+            return default
+
+        raw, expires_at = rows[0]
+        if expires_at is not None and expires_at <= now:
+            self._execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._execute(
+            "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key)
+        )
+        value = json.loads(raw)
+        self._set_local(key, value, expires_at)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = self._expires_at(ttl)
+        self._set_local(key, value, expires_at)
+        self.sets += 1
+
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), expires_at, now)
+            )
+            # 超出上限时淘汰最久未访问的条目（过期条目优先）
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+            overflow = count - self.disk_max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM cache WHERE namespace = ? "
+                    "ORDER BY (expires_at IS NOT NULL AND expires_at <= ?) DESC, accessed_at LIMIT ?)",
+                    (self.namespace, self.namespace, now, overflow)
+                )
+                self.evictions += overflow
+            self._conn.execute("COMMIT")
+        self._maybe_sweep()
+
+    def purge_expired(self) -> int:
+        removed = super().purge_expired()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (self.namespace, time.time())
+            )
+            removed += cursor.rowcount
+        return removed
+
+    def delete(self, key: str):
+        super().delete(key)
+        self._execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        super().clear()
+        self._execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        self._maybe_sweep()
+        (count,) = self._execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+        )[0]
+        return count
+
+    def __contains__(self, key: str) -> bool:
+        if self._get_local(key) is not _MISSING:
+            return True
+        rows = self._execute(
+            "SELECT expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        )
+        return bool(rows) and (rows[0][0] is None or rows[0][0] > time.time())
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["max_entries"] = self.disk_max_entries
+        stats["memory_entries"] = len(self._entries)
+        stats["path"] = os.path.abspath(self.path)
+        return stats
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+
+def create_cache(
+    backend: str = "memory",
+    namespace: str = "default",
+    max_entries: int = 1000,
+    ttl: Optional[float] = 3600.0,
+    path: str = None,
+    sweep_interval: Optional[float] = None
+) -> TTLCache:
+    """
+    创建缓存
+
+    Args:
+        backend: memory 或 sqlite
+        namespace: 缓存名称/命名空间
+        max_entries: 最大条目数
+        ttl: 默认过期秒数
+        path: SQLite数据库路径（仅sqlite后端）
+        sweep_interval: 主动清理过期条目的间隔秒数
+    """
+    if backend == "memory":
+        return TTLCache(max_entries=max_entries, ttl=ttl, name=namespace, sweep_interval=sweep_interval)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("SQLite cache requires a database path")
+        return SQLiteCache(
+            path, namespace=namespace, max_entries=max_entries, ttl=ttl, sweep_interval=sweep_interval
+        )
+    raise ValueError(f"Unsupported cache backend: {backend}")
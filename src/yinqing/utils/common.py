@@ -1,7 +1,5 @@
 from datetime import timedelta
 
-RETRY_TIMES = 3
-RETRY_DELAY = 1
 AGENT_CACHE_TTL = timedelta(minutes=10)
 
 def clean_response_str(s: str) -> str:
@@ -1,12 +1,23 @@
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field, replace
+from urllib.parse import parse_qsl, urlsplit
+from typing import Dict, List, Optional
+from yinqing.utils.common import AGENT_CACHE_TTL
 
 @dataclass
 class MCPServerConfig:
     host: str = "localhost"
     port: int = 8000
-    transport: str = "sse" # or stdio, http
+    transport: str = "sse" # or stdio, http (Streamable HTTP), inprocess
+    ping_interval: float = 30.0  # 共享会话的心跳间隔
+    connect_timeout: float = 10.0  # 等待会话建立/心跳响应的秒数
+    call_timeout: float = 60.0  # 单次工具调用超时
+    registry_ttl: float = 60.0  # 服务端不支持 registry_version 时注册表缓存的秒数
+    stdio_command: str = "python3 real_ecosystem/mcp_server/server.py --transport stdio"  # stdio 传输下启动服务端的命令
+    stdio_pool_size: int = 2  # stdio 传输下常驻的服务端子进程数
+    inprocess_module: str = "real_ecosystem.mcp_server.server"  # inprocess 传输下直接导入的注册中心模块
+    name: str = ""  # 联邦查询时的注册中心名称（用于日志和统计）
+    lookup_timeout: float = 10.0  # 联邦查询时等待该注册中心的秒数，超时则跳过
 
 def init_api_key():
     """Ensure OpenAI API Key is set for Qwen3-max."""
@@ -19,4 +30,276 @@ def get_mcp_server_config() -> MCPServerConfig:
     host = os.getenv("MCP_SERVER_HOST", "localhost")
     port = int(os.getenv("MCP_SERVER_PORT", "8000"))
     transport = os.getenv("MCP_SERVER_TRANSPORT", "sse")
-    return MCPServerConfig(host=host, port=port, transport=transport)
+    return MCPServerConfig(
+        host=host,
+        port=port,
+        transport=transport,
+        ping_interval=float(os.getenv("MCP_PING_INTERVAL", "30")),
+        connect_timeout=float(os.getenv("MCP_CONNECT_TIMEOUT", "10")),
+        call_timeout=float(os.getenv("MCP_CALL_TIMEOUT", "60")),
+        registry_ttl=float(os.getenv("MCP_REGISTRY_TTL", "60")),
+        stdio_command=os.getenv("MCP_STDIO_COMMAND", MCPServerConfig.stdio_command),
+        stdio_pool_size=int(os.getenv("MCP_STDIO_POOL_SIZE", "2")),
+        inprocess_module=os.getenv("MCP_INPROCESS_MODULE", MCPServerConfig.inprocess_module),
+        lookup_timeout=float(os.getenv("MCP_REGISTRY_TIMEOUT", "10")),
+    )
+
+def get_mcp_registry_configs() -> List[MCPServerConfig]:
+    """Get the list of agent registries to query.
+
+    MCP_REGISTRIES format: "sse://host-a:10000?name=team-a,http://host-b:10000?timeout=3,inprocess"
+    (transport://host:port, optional name/timeout query parameters; stdio/inprocess registries
+    also accept command=/module= to start or import a different registry). Unset means the single
+    registry from MCP_SERVER_HOST / MCP_SERVER_PORT / MCP_SERVER_TRANSPORT.
+    """
+    base = get_mcp_server_config()
+    specs = [item.strip() for item in os.getenv("MCP_REGISTRIES", "").split(",") if item.strip()]
+    if not specs:
+        return [base]
+
+    configs = []
+    for spec in specs:
+        if "://" not in spec:
+            transport, _, query = spec.partition("?")
+            spec = f"{transport}://" + (f"?{query}" if query else "")
+        parts = urlsplit(spec)
+        params = dict(parse_qsl(parts.query))
+        configs.append(replace(
+            base,
+            transport=parts.scheme,
+            host=parts.hostname or base.host,
+            port=parts.port or base.port,
+            name=params.get("name", spec.split("?")[0].rstrip(":/")),
+            lookup_timeout=float(params.get("timeout", base.lookup_timeout)),
+            stdio_command=params.get("command", base.stdio_command),
+            inprocess_module=params.get("module", base.inprocess_module),
+        ))
+    return configs
+
+@dataclass
+class AdmissionConfig:
+    max_in_flight: int = 8  # 每个Agent端点同时在途的请求上限
+    queue_timeout: float = 120.0  # 排队等待的最长秒数
+    policy: str = "fifo"  # or priority
+    overrides: Dict[str, int] = field(default_factory=dict)  # 按端点覆盖上限 {url: max_in_flight}
+
+def get_admission_config() -> AdmissionConfig:
+    """Get per-agent admission configuration from env or defaults.
+
+    AGENT_MAX_IN_FLIGHT_OVERRIDES format: "http://localhost:10002=2,http://localhost:10001=4"
+    """
+    overrides = {}
+    for item in os.getenv("AGENT_MAX_IN_FLIGHT_OVERRIDES", "").split(","):
+        if "=" in item:
+            url, limit = item.rsplit("=", 1)
+            overrides[url.strip().rstrip("/")] = int(limit)
+    return AdmissionConfig(
+        max_in_flight=int(os.getenv("AGENT_MAX_IN_FLIGHT", "8")),
+        queue_timeout=float(os.getenv("AGENT_QUEUE_TIMEOUT", "120")),
+        policy=os.getenv("AGENT_QUEUE_POLICY", "fifo"),
+        overrides=overrides,
+    )
+
+@dataclass
+class HTTPPoolConfig:
+    max_connections_per_host: int = 10  # 每个Agent端点的连接数上限
+    keepalive_expiry: float = 30.0  # 空闲连接保持的秒数
+    timeout: float = 60.0  # 单次Agent调用超时
+    http2: bool = False  # 需要安装 h2（pip install "httpx[http2]"）
+    prewarm: bool = True  # 匹配完成后提前建立到已分配Agent的连接
+    prewarm_timeout: float = 5.0
+
+def get_http_pool_config() -> HTTPPoolConfig:
+    """Get executor HTTP connection pool configuration from env or defaults."""
+    return HTTPPoolConfig(
+        max_connections_per_host=int(os.getenv("AGENT_HTTP_MAX_CONNECTIONS_PER_HOST", "10")),
+        keepalive_expiry=float(os.getenv("AGENT_HTTP_KEEPALIVE_EXPIRY", "30")),
+        timeout=float(os.getenv("AGENT_HTTP_TIMEOUT", "60")),
+        http2=os.getenv("AGENT_HTTP2", "false").lower() in ("1", "true", "yes"),
+        prewarm=os.getenv("AGENT_HTTP_PREWARM", "true").lower() in ("1", "true", "yes"),
+        prewarm_timeout=float(os.getenv("AGENT_HTTP_PREWARM_TIMEOUT", "5")),
+    )
+
+@dataclass
+class ResilienceConfig:
+    max_attempts: int = 3  # 单次逻辑调用的最大尝试次数（含首次）
+    base_delay: float = 0.5  # 指数退避的基础等待秒数
+    max_delay: float = 8.0  # 退避等待上限
+    jitter: bool = True  # full jitter: 在 [0, 退避时间] 内随机等待
+    budget_ratio: float = 0.2  # 窗口内重试数不超过请求数的该比例
+    budget_min_retries: int = 10  # 低流量时的保底重试数
+    budget_window: float = 10.0  # 重试预算的滑动窗口秒数
+    failure_threshold: int = 5  # 连续失败该次数后熔断端点
+    reset_timeout: float = 30.0  # 熔断后多少秒放行探测请求
+    half_open_max_calls: int = 1  # 半开状态同时放行的探测请求数
+
+def get_resilience_config() -> ResilienceConfig:
+    """Get retry / circuit breaker configuration from env or defaults."""
+    return ResilienceConfig(
+        max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("RETRY_MAX_DELAY", "8")),
+        jitter=os.getenv("RETRY_JITTER", "true").lower() in ("1", "true", "yes"),
+        budget_ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+        budget_min_retries=int(os.getenv("RETRY_BUDGET_MIN_RETRIES", "10")),
+        budget_window=float(os.getenv("RETRY_BUDGET_WINDOW", "10")),
+        failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30")),
+        half_open_max_calls=int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1")),
+    )
+
+@dataclass
+class BalancerConfig:
+    policy: str = "least_outstanding"  # or p2c: 随机取两个副本中较空闲的一个
+
+def get_balancer_config() -> BalancerConfig:
+    """Get agent replica load balancing configuration from env or defaults."""
+    return BalancerConfig(
+        policy=os.getenv("AGENT_LB_POLICY", "least_outstanding"),
+    )
+
+@dataclass
+class HealthConfig:
+    enabled: bool = True
+    interval: float = 10.0  # 轮询各Agent /health 的间隔秒数
+    timeout: float = 2.0  # 单次健康检查超时
+    path: str = "/health"
+    unhealthy_threshold: int = 2  # 连续失败该次数后标记为 down
+    healthy_threshold: int = 1  # down 状态下连续成功该次数后恢复
+
+def get_health_config() -> HealthConfig:
+    """Get background agent health monitoring configuration from env or defaults."""
+    return HealthConfig(
+        enabled=os.getenv("AGENT_HEALTH_ENABLED", "true").lower() in ("1", "true", "yes"),
+        interval=float(os.getenv("AGENT_HEALTH_INTERVAL", "10")),
+        timeout=float(os.getenv("AGENT_HEALTH_TIMEOUT", "2")),
+        path=os.getenv("AGENT_HEALTH_PATH", "/health"),
+        unhealthy_threshold=int(os.getenv("AGENT_HEALTH_UNHEALTHY_THRESHOLD", "2")),
+        healthy_threshold=int(os.getenv("AGENT_HEALTH_HEALTHY_THRESHOLD", "1")),
+    )
+
+@dataclass
+class SingleFlightConfig:
+    enabled: bool = True
+    disabled_agents: List[str] = field(default_factory=list)  # 不合并请求的Agent（名称或URL），用于需要每次独立生成的Agent
+
+def get_single_flight_config() -> SingleFlightConfig:
+    """Get in-flight request coalescing configuration from env or defaults.
+
+    AGENT_COALESCE_DISABLED_AGENTS format: "Writer Agent,http://localhost:10003"
+    """
+    disabled = [
+        item.strip().rstrip("/")
+        for item in os.getenv("AGENT_COALESCE_DISABLED_AGENTS", "").split(",")
+        if item.strip()
+    ]
+    return SingleFlightConfig(
+        enabled=os.getenv("AGENT_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        disabled_agents=disabled,
+    )
+
+@dataclass
+class StateStoreConfig:
+    backend: str = "sqlite"  # or memory
+    path: str = os.path.join(".yinqing", "state.db")  # SQLite数据库路径
+    max_finished: int = 1000  # 保留的失败/取消工作流数（用于恢复），成功完成的工作流结束即删除
+
+def get_state_store_config() -> StateStoreConfig:
+    """Get workflow state store configuration from env or defaults."""
+    return StateStoreConfig(
+        backend=os.getenv("WORKFLOW_STATE_BACKEND", "sqlite"),
+        path=os.getenv("WORKFLOW_STATE_DB", os.path.join(".yinqing", "state.db")),
+        max_finished=int(os.getenv("WORKFLOW_STATE_MAX_FINISHED", "1000")),
+    )
+
+@dataclass
+class ResultCacheConfig:
+    enabled: bool = True  # 总开关；只有显式声明为幂等的Agent才会缓存结果
+    backend: str = "sqlite"  # or memory
+    path: str = os.path.join(".yinqing", "cache.db")  # SQLite缓存路径
+    ttl: float = 86400.0  # 步骤结果缓存的过期秒数
+    max_entries: int = 10000
+    cached_agents: List[str] = field(default_factory=list)  # 允许缓存结果的幂等Agent（名称或URL，"*"表示全部），默认为空即不缓存
+    disabled_agents: List[str] = field(default_factory=list)  # 不缓存的Agent（名称或URL），优先于 cached_agents 和卡片声明
+
+def get_result_cache_config() -> ResultCacheConfig:
+    """Get step result cache configuration from env or defaults.
+
+    Caching is opt-in per agent: list idempotent agents in STEP_CACHE_AGENTS
+    or set config.cacheable=true in the agent card.
+
+    STEP_CACHE_AGENTS / STEP_CACHE_DISABLED_AGENTS format: "Researcher Agent,http://localhost:10003"
+    """
+    cached, disabled = (
+        [
+            item.strip().rstrip("/")
+            for item in os.getenv(name, "").split(",")
+            if item.strip()
+        ]
+        for name in ("STEP_CACHE_AGENTS", "STEP_CACHE_DISABLED_AGENTS")
+    )
+    return ResultCacheConfig(
+        enabled=os.getenv("STEP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        backend=os.getenv("STEP_CACHE_BACKEND", "sqlite"),
+        path=os.getenv("STEP_CACHE_DB", os.path.join(".yinqing", "cache.db")),
+        ttl=float(os.getenv("STEP_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("STEP_CACHE_MAX_ENTRIES", "10000")),
+        cached_agents=cached,
+        disabled_agents=disabled,
+    )
+
+@dataclass
+class PlanCacheConfig:
+    enabled: bool = True
+    backend: str = "sqlite"  # or memory
+    path: str = os.path.join(".yinqing", "cache.db")  # 与步骤结果缓存共用数据库，按命名空间区分
+    ttl: float = 7 * 86400.0  # 执行计划缓存的过期秒数
+    max_entries: int = 1000
+
+def get_plan_cache_config() -> PlanCacheConfig:
+    """Get parser plan cache configuration from env or defaults."""
+    return PlanCacheConfig(
+        enabled=os.getenv("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        backend=os.getenv("PLAN_CACHE_BACKEND", "sqlite"),
+        path=os.getenv("PLAN_CACHE_DB", os.path.join(".yinqing", "cache.db")),
+        ttl=float(os.getenv("PLAN_CACHE_TTL", str(7 * 86400))),
+        max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000")),
+    )
+
+@dataclass
+class MatcherConfig:
+    mode: str = "concurrent"  # or batch: 所有未缓存步骤合并为一次LLM调用
+    max_concurrency: int = 8  # 并发匹配的步骤数上限
+    local: bool = True  # 先用本地TF-IDF索引匹配，只有不确定时才调用LLM（需要numpy）
+    local_margin: float = 0.05  # 最高分领先次高分不足该值时交给LLM裁决
+    local_min_score: float = 0.1  # 最高分低于该值时交给LLM裁决
+
+def get_matcher_config() -> MatcherConfig:
+    """Get agent matcher configuration from env or defaults."""
+    return MatcherConfig(
+        mode=os.getenv("MATCH_MODE", "concurrent"),
+        max_concurrency=int(os.getenv("MATCH_MAX_CONCURRENCY", "8")),
+        local=os.getenv("MATCH_LOCAL", "true").lower() in ("1", "true", "yes"),
+        local_margin=float(os.getenv("MATCH_LOCAL_MARGIN", "0.05")),
+        local_min_score=float(os.getenv("MATCH_LOCAL_MIN_SCORE", "0.1")),
+    )
+
+@dataclass
+class MatchCacheConfig:
+    backend: str = "memory"  # or sqlite: 多个编排进程可共用同一个数据库文件
+    path: str = os.path.join(".yinqing", "cache.db")
+    ttl: float = 600.0  # 匹配结果的过期秒数（默认与 AGENT_CACHE_TTL 一致）
+    negative_ttl: float = 60.0  # 未找到Agent的描述的缓存秒数
+    max_entries: int = 2000
+    sweep_interval: float = 60.0  # 主动清理过期条目的间隔秒数
+
+def get_match_cache_config() -> MatchCacheConfig:
+    """Get agent match cache configuration from env or defaults."""
+    return MatchCacheConfig(
+        backend=os.getenv("MATCH_CACHE_BACKEND", "memory"),
+        path=os.getenv("MATCH_CACHE_DB", os.path.join(".yinqing", "cache.db")),
+        ttl=float(os.getenv("MATCH_CACHE_TTL", str(AGENT_CACHE_TTL.total_seconds()))),
+        negative_ttl=float(os.getenv("MATCH_CACHE_NEGATIVE_TTL", "60")),
+        max_entries=int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "2000")),
+        sweep_interval=float(os.getenv("MATCH_CACHE_SWEEP_INTERVAL", "60")),
+    )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试联邦注册中心：
+1. 多个注册中心的 Agent 按名称合并，同名时配置靠前的注册中心优先
+2. 检索结果按得分跨注册中心合并
+3. 某个注册中心不可用或超时时跳过并计数，全部不可用时报错
+"""
+import asyncio
+import copy
+import sys
+import time
+import types
+sys.path.insert(0, 'src')
+
+from yinqing.core.mcp_client import FederatedRegistry
+from yinqing.utils.config import MCPServerConfig
+
+
+def make_card(name: str, url: str, description: str) -> dict:
+    return {
+        "name": name,
+        "description": description,
+        "version": "1.0.0",
+        "url": url,
+        "capabilities": {"streaming": True},
+        "skills": [{"id": name.lower().replace(" ", "_"), "name": name, "description": description, "tags": []}],
+        "default_input_modes": ["text"],
+        "default_output_modes": ["text"],
+    }
+
+
+def make_registry_module(module_name: str, cards: list, scores: dict, delay: float = 0.0):
+    """构造一个进程内注册中心模块：scores 为 {查询: [(得分, Agent名称)]}"""
+    module = types.ModuleType(module_name)
+
+    def get_registry_version():
+        time.sleep(delay)
+        return {"version": module_name}
+
+    def load_agent_cards():
+        return copy.deepcopy(cards)
+
+    def load_agent_card_objects(factory):
+        return {card["name"]: factory(**card) for card in cards}
+
+    def search_agent_card_objects(queries, factory, top_k=1, min_score=1.0):
+        time.sleep(delay)
+        objects = load_agent_card_objects(factory)
+        return [
+            [(score, objects[name]) for score, name in scores.get(query, []) if score >= min_score][:top_k]
+            for query in queries
+        ]
+
+    module.get_registry_version = get_registry_version
+    module.load_agent_cards = load_agent_cards
+    module.load_agent_card_objects = load_agent_card_objects
+    module.search_agent_card_objects = search_agent_card_objects
+    sys.modules[module_name] = module
+    return module
+
+
+make_registry_module(
+    "team_b_registry",
+    cards=[
+        make_card("Writer Agent", "http://team-b:9002", "团队B的写作Agent"),
+        make_card("Legal Agent", "http://team-b:9010", "审查合同条款"),
+    ],
+    scores={"审查合同条款": [(9.0, "Legal Agent")], "写一篇文章": [(0.5, "Writer Agent")]},
+)
+make_registry_module("slow_registry", cards=[make_card("Slow Agent", "http://slow:9000", "很慢")],
+                     scores={}, delay=1.0)
+
+
+def inprocess(name: str, module: str, timeout: float = 5.0) -> MCPServerConfig:
+    return MCPServerConfig(name=name, transport="inprocess", inprocess_module=module, lookup_timeout=timeout)
+
+
+TEAM_A = inprocess("team-a", "real_ecosystem.mcp_server.server")
+TEAM_B = inprocess("team-b", "team_b_registry")
+DEAD = inprocess("dead", "no_such_registry_module")
+SLOW = inprocess("slow", "slow_registry", timeout=0.2)
+
+
+async def test_merge():
+    federation = FederatedRegistry([TEAM_A, TEAM_B])
+    agents = await federation.list_agents()
+    names = [agent["name"] for agent in agents]
+    assert len(names) == len(set(names)), f"同名Agent未去重: {names}"
+    assert "Legal Agent" in names and "Coder Agent" in names
+
+    writer = next(agent for agent in agents if agent["name"] == "Writer Agent")
+    assert writer["url"] == "http://localhost:10002", "同名Agent应以配置靠前的 team-a 为准"
+    assert federation.agent_card(writer).url == "http://localhost:10002"
+    legal = next(agent for agent in agents if agent["name"] == "Legal Agent")
+    assert federation.agent_card(legal).url == "http://team-b:9010"
+    print(f"1. 合并 {len(agents)} 个Agent，同名的 Writer Agent 来自 team-a")
+
+    found = await federation.find_agents(["审查合同条款", "写一篇文章"])
+    assert found["审查合同条款"].name == "Legal Agent", found
+    assert found["写一篇文章"].name == "Writer Agent", found
+    assert found["写一篇文章"].url == "http://localhost:10002", "team-a 的得分更高"
+
+    ranked = await federation.search_agents("写一篇文章", top_k=5, min_score=0.0)
+    scores = [score for score, _ in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert [card.name for _, card in ranked].count("Writer Agent") == 1
+    print(f"2. 按得分合并检索结果: {[(card.name, score) for score, card in ranked[:3]]}")
+    assert federation.failures == {"team-a": 0, "team-b": 0}
+
+
+async def test_degradation():
+    federation = FederatedRegistry([DEAD, TEAM_B, SLOW])
+    agents = await federation.list_agents()
+    assert sorted(agent["name"] for agent in agents) == ["Legal Agent", "Writer Agent"]
+
+    started = time.monotonic()
+    found = await federation.find_agents(["审查合同条款"])
+    elapsed = time.monotonic() - started
+    assert found["审查合同条款"].name == "Legal Agent"
+    assert elapsed < 0.9, f"应在 lookup_timeout 后跳过慢注册中心，实际耗时 {elapsed:.2f}s"
+    assert federation.failures["dead"] == 2 and federation.failures["slow"] == 2, federation.failures
+    assert federation.failures["team-b"] == 0
+    stats = {item["name"]: item for item in federation.get_stats()["registries"]}
+    assert stats["dead"]["failures"] == 2 and not stats["dead"]["connected"]
+    print(f"3. 跳过不可用/超时的注册中心: failures={federation.failures}")
+
+    try:
+        await FederatedRegistry([DEAD]).list_agents()
+        raise AssertionError("全部注册中心不可用时应报错")
+    except ConnectionError:
+        pass
+    print("4. 全部注册中心不可用时抛出 ConnectionError")
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("测试联邦注册中心 (合并 / 降级)")
+    print("=" * 70)
+    asyncio.run(test_merge())
+    asyncio.run(test_degradation())
+    print()
+    print("✅ 全部通过")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+测试调用弹性控制：错误分类、重试预算和熔断器状态变化
+"""
+import asyncio
+import sys
+import time
+sys.path.insert(0, 'src')
+
+import httpx
+
+from yinqing.core.admission import AdmissionTimeoutError
+from yinqing.core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilienceController,
+    RetryBudget,
+    counts_as_failure,
+    is_retryable,
+)
+from yinqing.utils.config import ResilienceConfig
+
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://agent.local/")
+    return httpx.HTTPStatusError(f"HTTP {code}", request=request, response=httpx.Response(code, request=request))
+
+
+def test_error_classification():
+    request = httpx.Request("POST", "http://agent.local/")
+    cases = [
+        (httpx.ConnectError("refused", request=request), True, True),
+        (httpx.ReadTimeout("timeout", request=request), True, True),
+        (asyncio.TimeoutError(), True, True),
+        (status_error(503), True, True),
+        (status_error(429), True, True),
+        (status_error(404), False, False),
+        (status_error(400), False, False),
+        (ValueError("bad payload"), False, False),
+        (CircuitOpenError("http://agent.local", 1.0), False, False),
+        (AdmissionTimeoutError("queue full"), False, False),
+    ]
+    for error, retryable, failure in cases:
+        assert is_retryable(error) is retryable, f"is_retryable({error!r})"
+        assert counts_as_failure(error) is failure, f"counts_as_failure({error!r})"
+    print(f"1. 错误分类: {len(cases)} 种错误判断正确")
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, min_retries=1, window=0.2)
+    for _ in range(2):
+        budget.record_request()
+    # 2 个请求 × 0.5 + 保底 1 = 最多 2 次重试
+    assert budget.try_acquire_retry()
+    assert budget.try_acquire_retry()
+    assert not budget.try_acquire_retry()
+    assert budget.exhausted == 1
+
+    # 窗口滑过后重新计算
+    time.sleep(0.25)
+    assert budget.try_acquire_retry()
+    print("2. 重试预算: 超出比例后拒绝，窗口滑过后恢复")
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker("http://agent.local", failure_threshold=2, reset_timeout=0.1, half_open_max_calls=1)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open" and breaker.opens == 1
+
+    try:
+        breaker.before_call()
+        raise AssertionError("熔断中的端点应直接拒绝")
+    except CircuitOpenError:
+        pass
+    assert breaker.rejected == 1
+
+    # 冷却后只放行一个探测请求
+    time.sleep(0.15)
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    try:
+        breaker.before_call()
+        raise AssertionError("半开状态只允许一个探测请求")
+    except CircuitOpenError:
+        pass
+
+    # 探测失败重新熔断，再次探测成功后关闭
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opens == 2
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
+    print("3. 熔断器: closed -> open -> half_open -> open -> half_open -> closed")
+
+
+async def test_controller():
+    config = ResilienceConfig(
+        max_attempts=3, base_delay=0.0, max_delay=0.0, jitter=False,
+        budget_ratio=1.0, budget_min_retries=10, failure_threshold=3, reset_timeout=60.0
+    )
+
+    # 暂时性错误重试后成功
+    controller = ResilienceController(config)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise status_error(503)
+        return "ok"
+
+    assert await controller.call(flaky, endpoint="http://flaky.local") == "ok"
+    assert len(attempts) == 3
+    assert controller.breaker("http://flaky.local").state == "closed"
+
+    # 不可重试的错误只调用一次
+    calls = []
+
+    async def bad_request():
+        calls.append(1)
+        raise status_error(400)
+
+    try:
+        await controller.call(bad_request, endpoint="http://bad.local")
+        raise AssertionError("400 应直接抛出")
+    except httpx.HTTPStatusError:
+        pass
+    assert len(calls) == 1
+
+    # 连续失败触发熔断后保留原始错误，之后的调用被直接拒绝
+    async def down():
+        raise httpx.ConnectError("refused", request=httpx.Request("POST", "http://down.local/"))
+
+    try:
+        await controller.call(down, endpoint="http://down.local")
+        raise AssertionError("应抛出原始连接错误")
+    except httpx.ConnectError:
+        pass
+    assert controller.is_open("http://down.local")
+    try:
+        await controller.call(down, endpoint="http://down.local")
+        raise AssertionError("熔断中应直接拒绝")
+    except CircuitOpenError:
+        pass
+
+    # 有多个副本时，重试换到未熔断的副本
+    used = []
+
+    async def on_replica(url):
+        used.append(url)
+        if url == "http://down.local":
+            raise httpx.ConnectError("refused", request=httpx.Request("POST", url))
+        return url
+
+    replicas = ["http://down.local", "http://up.local"]
+
+    def choose(failed):
+        return next(url for url in replicas if url not in failed and not controller.is_open(url))
+
+    assert await controller.call(on_replica, choose_endpoint=choose) == "http://up.local"
+    assert used == ["http://up.local"]
+    print("4. 控制器: 重试暂时性错误、不重试 4xx、熔断后快速失败并切换副本")
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("测试调用弹性控制 (重试 / 预算 / 熔断)")
+    print("=" * 70)
+    test_error_classification()
+    test_retry_budget()
+    test_circuit_breaker()
+    asyncio.run(test_controller())
+    print()
+    print("✅ 全部通过")
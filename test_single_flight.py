@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试相同请求合并 (Single Flight)：
+1. 并发的相同请求只发出一次，结果和异常由所有调用方共享
+2. 某个等待方被取消不影响其他等待方，在途请求继续执行
+"""
+import asyncio
+import sys
+sys.path.insert(0, 'src')
+
+from yinqing.core.singleflight import SingleFlight
+
+
+class FakeAgent:
+    """记录实际发出的请求，每次请求在 release 被设置后才返回"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def request(self, reply: str = "ok", error: Exception = None):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if error:
+            raise error
+        return reply
+
+
+async def test_coalescing():
+    flight = SingleFlight()
+    agent = FakeAgent()
+    callers = [
+        asyncio.create_task(flight.do("http://writer:10002/", "hash-a", agent.request))
+        for _ in range(5)
+    ]
+    other = asyncio.create_task(flight.do("http://writer:10002", "hash-b", lambda: agent.request("other")))
+    await asyncio.sleep(0)
+    assert flight.get_stats()["in_flight"] == 2
+
+    agent.release.set()
+    results = await asyncio.gather(*callers)
+    assert results == ["ok"] * 5 and await other == "other"
+    assert agent.calls == 2, f"相同请求应只发出一次: {agent.calls}"
+
+    stats = flight.get_stats()
+    assert stats["leaders"] == 2 and stats["coalesced"] == 4 and stats["in_flight"] == 0, stats
+    assert stats["agents"] == {"http://writer:10002": {"leaders": 2, "coalesced": 4}}, stats["agents"]
+    print(f"1. 5 个相同请求 + 1 个不同请求只发出 {agent.calls} 次: {stats['agents']}")
+
+    # 请求结束后不再合并，之后的调用重新发出
+    assert await flight.do("http://writer:10002", "hash-a", agent.request) == "ok"
+    assert agent.calls == 3
+    print("2. 在途请求结束后，相同请求会重新发出")
+
+
+async def test_shared_error():
+    flight = SingleFlight()
+    agent = FakeAgent()
+    callers = [
+        asyncio.create_task(flight.do("http://coder:10003", "hash", lambda: agent.request(error=ConnectionError("down"))))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    agent.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert agent.calls == 1
+    assert all(isinstance(result, ConnectionError) for result in results), results
+    print("3. 在途请求失败时，所有调用方收到同一个异常")
+
+
+async def test_cancellation_isolation():
+    flight = SingleFlight()
+    agent = FakeAgent()
+    leader = asyncio.create_task(flight.do("http://researcher:10001", "hash", agent.request))
+    waiter = asyncio.create_task(flight.do("http://researcher:10001", "hash", agent.request))
+    await asyncio.sleep(0)
+
+    # 取消发起请求的调用方：其他等待方和在途请求不受影响
+    leader.cancel()
+    await asyncio.sleep(0)
+    assert leader.cancelled()
+    assert not agent.cancelled and flight.get_stats()["in_flight"] == 1
+
+    late = asyncio.create_task(flight.do("http://researcher:10001", "hash", agent.request))
+    await asyncio.sleep(0)
+    agent.release.set()
+    assert await waiter == "ok" and await late == "ok"
+    assert agent.calls == 1
+    print("4. 取消一个调用方不影响其他等待方，在途请求继续执行")
+
+    # 所有调用方都被取消时，在途请求照常结束并移出在途表
+    agent = FakeAgent()
+    callers = [
+        asyncio.create_task(flight.do("http://researcher:10001", "hash-2", lambda: agent.request(error=ValueError("x"))))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    for caller in callers:
+        caller.cancel()
+    agent.release.set()
+    await asyncio.sleep(0.01)
+    assert not agent.cancelled and flight.get_stats()["in_flight"] == 0
+    print("5. 全部调用方取消后，在途请求结束并移出在途表")
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("测试相同请求合并 (Single Flight)")
+    print("=" * 70)
+    asyncio.run(test_coalescing())
+    asyncio.run(test_shared_error())
+    asyncio.run(test_cancellation_isolation())
+    print()
+    print("✅ 全部通过")
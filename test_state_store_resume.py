@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试 SQLite 状态存储的断点恢复：
+1. 进程崩溃后重新打开数据库，已成功的步骤不会重新调用 Agent
+2. 成功完成的工作流结束后删除其全部记录，失败的工作流按上限保留
+"""
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.insert(0, 'src')
+
+from yinqing.core.state_store import SQLiteStateBackend
+from yinqing.core.types import ExecutionPlan, ParallelConfig, TaskStep
+from yinqing.core.workflow import WorkflowEngine
+
+
+def build_plan(trace_id: str) -> ExecutionPlan:
+    """步骤1 -> 步骤2 -> 步骤3 的线性计划"""
+    plan = ExecutionPlan(
+        goal="写一篇关于好莱坞历史的文章",
+        trace_id=trace_id,
+        steps=[
+            TaskStep(step_id=1, name="收集资料", description="收集好莱坞历史资料", context_keys=[]),
+            TaskStep(step_id=2, name="撰写初稿", description="撰写文章初稿",
+                     context_keys=["step_1_output"], dependencies=[1]),
+            TaskStep(step_id=3, name="润色", description="润色文章",
+                     context_keys=["step_2_output"], dependencies=[2]),
+        ]
+    )
+    plan.init_dag()
+    return plan
+
+
+class FakeExecutor:
+    """记录调用过的步骤，不发出任何网络请求"""
+
+    def __init__(self):
+        self.calls = []
+
+    def prewarm(self, steps):
+        list(steps)
+
+    async def execute_step(self, step, context, trace_id):
+        self.calls.append(step.step_id)
+        step.status = "success"
+        step.result = f"Step {step.step_id} 的输出（输入: {sorted(context)}）"
+        return step, step.result
+
+
+def build_engine(store, output_dir: str) -> WorkflowEngine:
+    """只装配恢复执行用到的组件（恢复时跳过解析和匹配，不需要LLM）"""
+    engine = WorkflowEngine.__new__(WorkflowEngine)
+    engine.state_store = store
+    engine.executor = FakeExecutor()
+    engine.parallel_config = ParallelConfig(max_parallel=2)
+    engine.executions = {}
+    engine.output_dir = output_dir
+    return engine
+
+
+async def test_crash_resume(tmpdir: str):
+    db_path = os.path.join(tmpdir, "state.db")
+    trace_id = "trace-crash-resume"
+    query = "写一篇关于好莱坞历史的文章"
+
+    # 第一次运行：步骤1完成后进程崩溃（没有调用 mark_finished）
+    store = SQLiteStateBackend(db_path)
+    plan = build_plan(trace_id)
+    await store.asave_plan(trace_id, query, plan)
+    step1 = plan.step_map[1]
+    step1.status = "success"
+    await store.arecord_step(trace_id, step1, "步骤1的资料")
+    store.close()
+
+    # 重新打开数据库并恢复
+    store = SQLiteStateBackend(db_path)
+    saved = store.load(trace_id)
+    assert saved is not None and saved.status == "running"
+    assert saved.completed_steps == [1], saved.completed_steps
+    restored = saved.restore_plan()
+    assert restored.step_map[2].in_degree == 0, "步骤1已完成，步骤2应直接就绪"
+    print(f"1. 崩溃后加载状态: 已完成步骤 {saved.completed_steps}")
+
+    engine = build_engine(store, tmpdir)
+    events = [event async for event in engine.stream(query, trace_id=trace_id)]
+    assert events[-1]["is_complete"], events[-1]
+    assert engine.executor.calls == [2, 3], f"已完成的步骤被重新执行: {engine.executor.calls}"
+    print(f"2. 恢复执行只调用了步骤 {engine.executor.calls}")
+
+    # 成功完成后删除计划、步骤记录和快照
+    assert store.load(trace_id) is None, "成功完成的工作流应被删除"
+    rows = store._execute("SELECT COUNT(*) FROM step_log WHERE trace_id = ?", (trace_id,))
+    assert rows[0][0] == 0
+    print("3. 成功完成后状态记录已删除")
+    store.close()
+
+
+def test_failed_trace_limit(tmpdir: str):
+    store = SQLiteStateBackend(os.path.join(tmpdir, "limit.db"), max_finished=2)
+    for index in range(3):
+        trace_id = f"trace-failed-{index}"
+        store.save_plan(trace_id, "query", build_plan(trace_id))
+        store.save_snapshot(trace_id, f"{trace_id}-snap", 1, "{}")
+        store.mark_finished(trace_id, "failed")
+
+    remaining = sorted(t["trace_id"] for t in store.list_traces())
+    assert remaining == ["trace-failed-1", "trace-failed-2"], remaining
+    assert store.load_snapshots("trace-failed-0") == []
+    print(f"4. 失败的工作流只保留最近 2 个: {remaining}")
+    store.close()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("测试 SQLite 状态存储断点恢复")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        asyncio.run(test_crash_resume(tmpdir))
+        test_failed_trace_limit(tmpdir)
+    print()
+    print("✅ 全部通过")